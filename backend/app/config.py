@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from typing import List
@@ -11,15 +12,138 @@ class Settings(BaseSettings):
     weaviate_url: str = Field(default=os.getenv("WEAVIATE_URL", "http://localhost:8080"))
     weaviate_api_key: str = Field(default=os.getenv("WEAVIATE_API_KEY", ""))
     weaviate_class: str = Field(default=os.getenv("WEAVIATE_CLASS", "Documents"))
+    # weaviate | embedded | auto（Weaviate 不可达时退回进程内索引）
+    vector_backend: str = Field(default="auto")
+    # 向量库不可用时不长期缓存，至少间隔该秒数后重新连接
+    vector_backend_retry_seconds: float = Field(default=5.0)
+    embedded_index_path: str = Field(default="data/embedded_index")
+    embedded_ivf_min_rows: int = Field(default=20000)
+    embedded_ivf_nprobe: int = Field(default=8)
 
     siliconcloud_api_key: str = Field(default=os.getenv("SILICONCLOUD_API_KEY", ""))
     siliconcloud_base_url: str = Field(default=os.getenv("SILICONCLOUD_BASE_URL", "https://api.siliconflow.cn/v1"))
     siliconcloud_model: str = Field(default=os.getenv("SILICONCLOUD_MODEL", "Qwen/Qwen2.5-14B-Instruct"))
     siliconcloud_embed_model: str = Field(default=os.getenv("SILICONCLOUD_EMBED_MODEL", "Qwen/Qwen3-Embedding-8B"))
     llm_timeout_seconds: int = Field(default=60)  # 增加超时时间以避免ReadTimeout
+    llm_max_tokens: int = Field(default=512)
+    llm_temperature: float = Field(default=0.2)
+    # 模型分级：llm_small_purposes 中的分类调用（路由、相关性、合规）使用小模型与较小的 max_tokens，
+    # 生成与修订使用 siliconcloud_model；小模型为空时全部使用大模型
+    siliconcloud_small_model: str = Field(default=os.getenv("SILICONCLOUD_SMALL_MODEL", "Qwen/Qwen2.5-7B-Instruct"))
+    llm_small_max_tokens: int = Field(default=64)
+    llm_small_temperature: float = Field(default=0.0)
+    llm_small_purposes: str = Field(default="router,relevance,compliance")
+    # 小模型输出无法解析时改用大模型重试一次
+    llm_cascade_escalate: bool = Field(default=True)
+    # 同时在途的相同 prompt 只发起一次上游调用
+    llm_single_flight_enabled: bool = Field(default=True)
+    # 单次请求的总时间预算；非生成节点最多使用开始时剩余预算的 node_budget_share
+    request_budget_seconds: float = Field(default=90.0)
+    node_budget_share: float = Field(default=0.5)
+    embed_timeout_seconds: float = Field(default=15.0)
+    vector_search_timeout_seconds: float = Field(default=10.0)
+    # 每次上游调用的重试次数（full-jitter 指数退避）与按上游划分的熔断参数
+    upstream_retries: int = Field(default=2)
+    retry_backoff_base_ms: float = Field(default=100.0)
+    retry_backoff_max_ms: float = Field(default=2000.0)
+    breaker_fail_max: int = Field(default=5)
+    breaker_reset_seconds: float = Field(default=30.0)
+    # 调用超过近期 p95 延迟仍未返回时发起一次对冲请求，取先返回者
+    hedge_enabled: bool = Field(default=True)
+    hedge_quantile: float = Field(default=0.95)
+    hedge_min_samples: int = Field(default=20)
+    hedge_min_delay_ms: float = Field(default=50.0)
+    # 对话与向量化共享的 HTTP 连接池；读超时沿用 llm_timeout_seconds
+    http_max_connections: int = Field(default=100)
+    http_max_keepalive_connections: int = Field(default=20)
+    http_keepalive_expiry_seconds: float = Field(default=60.0)
+    http_connect_timeout_seconds: float = Field(default=5.0)
+    # 需要安装 h2，未安装时回退到 HTTP/1.1
+    http2_enabled: bool = Field(default=True)
+    # 启动时预先建立的连接数，0 表示不预热
+    http_prewarm_connections: int = Field(default=4)
+    # 启动预热：background（后台进行，/readyz 在完成前返回 503）| blocking（完成后才接收请求）| off（首个请求时初始化）
+    startup_warmup: str = Field(default="background")
+    # 预热失败的步骤按指数退避重试（首次间隔与上限，秒），0 表示不重试
+    warmup_retry_base_seconds: float = Field(default=1.0)
+    warmup_retry_max_seconds: float = Field(default=30.0)
 
     retrieval_top_k: int = Field(default=4)
+    # 检索 top_k × rerank_overfetch 个候选，本地按检索排名、BM25、词项覆盖率与来源多样性重排后取 top_k
+    rerank_enabled: bool = Field(default=True)
+    rerank_overfetch: int = Field(default=3)
+    rerank_weight_retrieval: float = Field(default=0.4)
+    rerank_weight_bm25: float = Field(default=0.35)
+    rerank_weight_coverage: float = Field(default=0.25)
+    rerank_diversity_penalty: float = Field(default=0.1)
+    # vector | bm25 | hybrid（向量与 BM25 并发检索后融合）
+    retrieval_mode: str = Field(default="vector")
+    hybrid_fusion: str = Field(default="rrf")  # rrf | weighted
+    hybrid_rrf_k: int = Field(default=60)
+    hybrid_vector_weight: float = Field(default=0.5)
+    hybrid_leg_multiplier: int = Field(default=2)
+    # 检索结果不相关时一次生成的改写数：各改写与原查询并发检索，RRF 融合去重后只再评估一次；<= 1 时逐次改写（最多两轮）
+    multi_query_count: int = Field(default=3)
+    chunk_size_tokens: int = Field(default=512)
+    chunk_overlap_tokens: int = Field(default=64)
+    # tiktoken 编码名；为空或编码不可用（如离线且未设置 TIKTOKEN_CACHE_DIR）时使用启发式估算
+    tokenizer_encoding: str = Field(default="cl100k_base")
+    embed_batch_size: int = Field(default=32)
+    # 并发的查询向量化在该时间窗内（毫秒）合并为一次批量调用；0 关闭
+    embed_microbatch_window_ms: float = Field(default=3.0)
+    embed_microbatch_max: int = Field(default=64)
+    # 后台入库任务：并发任务数、排队上限（超出返回 429）、阶段间队列容量、保留的任务记录数
+    ingest_workers: int = Field(default=2)
+    ingest_queue_size: int = Field(default=16)
+    ingest_stage_queue_size: int = Field(default=256)
+    ingest_job_history: int = Field(default=200)
+    # PDF/DOCX 在进程池中解析；0 表示使用全部 CPU 核，超时的解析会重启进程池
+    parse_workers: int = Field(default=0)
+    parse_timeout_seconds: float = Field(default=120.0)
+    # 上传文件的落盘目录，为空时使用系统临时目录
+    upload_spool_dir: str = Field(default="")
+    embedding_cache_enabled: bool = Field(default=True)
+    embedding_cache_path: str = Field(default="data/embedding_cache.sqlite3")
+    embedding_cache_size: int = Field(default=8192)
+    answer_cache_enabled: bool = Field(default=True)
+    answer_cache_size: int = Field(default=512)
+    answer_cache_ttl_seconds: int = Field(default=3600)
+    # 查询向量余弦相似度阈值，<=0 时仅做精确匹配
+    answer_cache_similarity: float = Field(default=0.95)
+    # 路由/改写期间并发检索原始查询；改写后查询与原查询相似度达到阈值时直接复用
+    speculative_retrieval_enabled: bool = Field(default=False)
+    speculative_reuse_similarity: float = Field(default=0.9)
+    # 本地路由：规则 + 字符 n-gram 朴素贝叶斯，置信度不足时才调用 LLM 路由
+    local_router_enabled: bool = Field(default=True)
+    local_router_threshold: float = Field(default=0.9)
+    local_router_log_path: str = Field(default="data/router_decisions.jsonl")
+    local_router_log_max_lines: int = Field(default=10000)
+    local_router_min_samples: int = Field(default=20)
+    # 相关性门控：分数/分差/词项覆盖率明确时跳过 LLM 相关性评估，仅中间区间升级给 LLM
+    relevance_gate_enabled: bool = Field(default=True)
+    relevance_score_high: float = Field(default=0.75)
+    relevance_score_low: float = Field(default=0.45)
+    relevance_score_gap: float = Field(default=0.15)
+    relevance_lexical_high: float = Field(default=0.6)
+    relevance_lexical_low: float = Field(default=0.15)
+    # 本地合规预筛：未命中词表的回答直接通过（PII 就地脱敏），命中时才交给 LLM 审核
+    compliance_screen_enabled: bool = Field(default=True)
+    compliance_lexicon_path: str = Field(default="")
+    compliance_redact_pii: bool = Field(default=True)
+    # 生成提示词的 token 预算（按 TOKENIZER_ENCODING 计数）：指令 + 历史 + 检索上下文
     max_context_tokens: int = Field(default=4096)
+    context_history_share: float = Field(default=0.25)
+    # 段落间 bigram Jaccard 相似度达到该值视为重复
+    context_duplicate_threshold: float = Field(default=0.8)
+    context_min_passage_tokens: int = Field(default=32)
+
+    # 会话存储：LRU 容量、空闲过期、历史上限（超出后旧消息压缩为滚动摘要，保留最近 N 条）
+    session_capacity: int = Field(default=10000)
+    session_ttl_seconds: float = Field(default=1800)
+    session_max_history: int = Field(default=20)
+    session_keep_recent: int = Field(default=8)
+    session_summary_chars: int = Field(default=2000)
+    session_lock_stripes: int = Field(default=16)
 
     enable_streaming: bool = Field(default=True)
     log_level: str = Field(default="INFO")
@@ -27,3 +151,9 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         extra = "ignore"
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Process-wide settings, read from the environment once."""
+    return Settings()
@@ -1,14 +1,18 @@
 import os
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 import time
 import logging
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import chat, upload, admin
+from .routers import chat, upload, admin, documents
 from .utils.logging import setup_logging
-from .config import Settings
-from .services.llm_siliconcloud import SiliconCloudLLM
+from .config import get_settings
+from .services.clients import get_client_registry
+from .services.warmup import get_warmup
+from .rag.document_loader import get_parser_pool
+from .utils.metrics import REQUEST_LATENCY, render_metrics
 
-settings = Settings()
+settings = get_settings()
 setup_logging(settings)
 
 app = FastAPI(
@@ -28,14 +32,30 @@ app.add_middleware(
 app.include_router(chat.router, prefix="/api")
 app.include_router(upload.router, prefix="/api")
 app.include_router(admin.router, prefix="/api")
+app.include_router(documents.router, prefix="/api")
 
 logger = logging.getLogger("request")
 
+def _route_template(request: Request) -> str:
+    # 使用路由模板而非原始路径，避免任务 ID 等参数造成标签基数膨胀
+    route = request.scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    # 子路由的模板可能不含 include_router 前缀，按段数从实际路径补回
+    parts = request.url.path.split("/")
+    prefix = "/".join(parts[:len(parts) - len(template.split("/")) + 1])
+    return prefix + template
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start = time.time()
     response = await call_next(request)
     elapsed = int((time.time() - start) * 1000)
+    REQUEST_LATENCY.labels(
+        method=request.method, path=_route_template(request), status=response.status_code
+    ).observe(time.time() - start)
     logger.info(f"{request.method} {request.url.path} {response.status_code} {elapsed}ms")
     return response
 
@@ -58,14 +78,42 @@ def healthz():
     return {"status": "ok"}
 
 
+@app.get("/livez")
+def livez():
+    # 进程存活即可，不依赖任何上游
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    report = get_warmup().report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.on_event("startup")
 async def startup_event():
-    # Initialize LLM and Embeddings globally
-    try:
-        SiliconCloudLLM(settings)
-        logger.info("SiliconCloud LLM and Embeddings initialized")
-    except Exception as e:
-        logger.error(f"Failed to initialize SiliconCloud LLM: {e}")
+    # Initialize the LLM, embeddings, vector store and pooled connections off the request path
+    warmup = get_warmup()
+    if settings.startup_warmup == "blocking":
+        # 首轮失败的步骤转入后台重试，/readyz 在其恢复前返回 503
+        if not await warmup.attempt():
+            warmup.start()
+    elif settings.startup_warmup == "background":
+        warmup.start()
+    else:
+        warmup.skip()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    get_parser_pool().shutdown()
+    await get_client_registry().aclose()
 
 
-# 如何推动冰雪经济?
\ No newline at end of file
+# 如何推动冰雪经济?
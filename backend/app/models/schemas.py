@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 
 
@@ -6,9 +6,15 @@ class ChatRequest(BaseModel):
     session_id: str
     query: str
     stream: bool = False
+    # 为空时使用 Settings.retrieval_mode
+    retrieval_mode: Optional[Literal["vector", "bm25", "hybrid"]] = None
 
 
 class ChatResponse(BaseModel):
     answer: str
     sources: List[str] = []
     latency_ms: int
+    cached: bool = False
+    compliance: Optional[str] = None
+    # 打包后的生成提示词 token 数
+    prompt_tokens: Optional[int] = None
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+from ..config import get_settings
+from .embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+_cache = None
+
+_TRAILING_PUNCT = " ?？。.!！~～"
+
+
+def normalize_query(query: str) -> str:
+    return normalize_text(query).lower().rstrip(_TRAILING_PUNCT)
+
+
+@dataclass
+class _Entry:
+    answer: str
+    sources: List[str]
+    vector: Optional[np.ndarray]
+    scope: str = ""
+    created: float = field(default_factory=time.time)
+
+
+class AnswerCache:
+    """TTL + LRU bounded cache of final answers.
+
+    Lookups match the normalized query exactly first, then fall back to the
+    nearest cached query embedding above ``similarity``. Entries only match
+    lookups with the same ``scope`` (e.g. retrieval mode). ``invalidate()`` bumps
+    a generation counter so that runs which started before a document change
+    cannot write stale answers back.
+    """
+
+    def __init__(self, capacity: int = 512, ttl_seconds: float = 3600, similarity: float = 0.95):
+        self.capacity = max(1, capacity)
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._generation = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self._matrix_scopes: List[str] = []
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, query: str, vector: Optional[List[float]] = None, scope: str = "") -> Optional[Dict]:
+        key = _key(query, scope)
+        with self._lock:
+            self._purge_expired()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["exact_hits"] += 1
+                return {"answer": entry.answer, "sources": list(entry.sources), "match": "exact"}
+            if vector is not None and self.similarity > 0:
+                best_key, score = self._nearest(_unit(vector), scope)
+                if best_key is not None and score >= self.similarity:
+                    entry = self._entries[best_key]
+                    self._entries.move_to_end(best_key)
+                    self._stats["semantic_hits"] += 1
+                    logger.info(f"Semantic answer cache hit ({score:.3f}): {query} ~ {best_key}")
+                    return {"answer": entry.answer, "sources": list(entry.sources), "match": "semantic"}
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, query: str, answer: str, sources: List[str], vector: Optional[List[float]] = None,
+            generation: Optional[int] = None, scope: str = ""):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            key = _key(query, scope)
+            self._entries[key] = _Entry(answer, list(sources), _unit(vector) if vector is not None else None, scope)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._generation += 1
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _nearest(self, vec: np.ndarray, scope: str):
+        if self._matrix is None:
+            keys = [k for k, e in self._entries.items() if e.vector is not None and e.vector.shape == vec.shape]
+            self._matrix_keys = keys
+            self._matrix_scopes = [self._entries[k].scope for k in keys]
+            self._matrix = np.stack([self._entries[k].vector for k in keys]) if keys else None
+        if self._matrix is None or self._matrix.shape[1] != vec.shape[0]:
+            return None, 0.0
+        scores = np.where(np.array(self._matrix_scopes) == scope, self._matrix @ vec, -np.inf)
+        i = int(np.argmax(scores))
+        return self._matrix_keys[i], float(scores[i])
+
+    def _purge_expired(self):
+        if self.ttl_seconds <= 0:
+            return
+        deadline = time.time() - self.ttl_seconds
+        expired = [k for k, e in self._entries.items() if e.created < deadline]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self._matrix = None
+
+
+def _key(query: str, scope: str) -> str:
+    key = normalize_query(query)
+    return f"{scope}\x00{key}" if scope else key
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    global _cache
+    if _cache:
+        return _cache
+    settings = get_settings()
+    if not settings.answer_cache_enabled:
+        return None
+    _cache = AnswerCache(
+        capacity=settings.answer_cache_size,
+        ttl_seconds=settings.answer_cache_ttl_seconds,
+        similarity=settings.answer_cache_similarity,
+    )
+    return _cache
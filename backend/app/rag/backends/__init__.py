@@ -0,0 +1,13 @@
+from .base import VectorBackend
+from .embedded import EmbeddedBackend
+
+__all__ = ["VectorBackend", "EmbeddedBackend", "WeaviateBackend", "async_client_factory", "connect_weaviate"]
+_WEAVIATE_EXPORTS = ("WeaviateBackend", "async_client_factory", "connect_weaviate")
+
+
+def __getattr__(name):
+    # weaviate 客户端导入较慢，仅在选用该后端时加载
+    if name in _WEAVIATE_EXPORTS:
+        from . import weaviate_backend
+        return getattr(weaviate_backend, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class VectorBackend:
+    """Storage/search interface behind :class:`~app.rag.vector_store.VectorStore`.
+
+    ``VectorStore`` owns embedding; backends only store objects with their
+    vectors and answer vector and keyword searches. Results are dicts with
+    ``id``, ``text``, ``source``, ``section``, ``chunk_index``, ``score``,
+    ``distance`` and ``score_type``. Async variants default to running the
+    sync method in a worker thread.
+    """
+
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def recreate(self):
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections; the default backend holds none."""
+
+    def insert(self, objects: List[Dict], vectors: List[Optional[List[float]]]):
+        raise NotImplementedError
+
+    def vector_search(self, vector: List[float], top_k: int) -> List[Dict]:
+        raise NotImplementedError
+
+    def ids_for_source(self, source: str) -> Set[str]:
+        """Ids of every stored chunk whose ``source`` equals ``source``."""
+        raise NotImplementedError
+
+    def delete_ids(self, ids: Iterable[str]) -> int:
+        raise NotImplementedError
+
+    def delete_source(self, source: str) -> int:
+        return self.delete_ids(self.ids_for_source(source))
+
+    def list_sources(self) -> Dict[str, int]:
+        """Map each stored source to its chunk count."""
+        raise NotImplementedError
+
+    def keyword_search(self, query: str, top_k: int) -> List[Dict]:
+        raise NotImplementedError
+
+    def text_search(self, query: str, top_k: int) -> List[Dict]:
+        """Search without a client-side query vector (server-side vectorizer)."""
+        return self.keyword_search(query, top_k)
+
+    async def avector_search(self, vector: List[float], top_k: int) -> List[Dict]:
+        return await asyncio.to_thread(self.vector_search, vector, top_k)
+
+    async def akeyword_search(self, query: str, top_k: int) -> List[Dict]:
+        return await asyncio.to_thread(self.keyword_search, query, top_k)
+
+    async def atext_search(self, query: str, top_k: int) -> List[Dict]:
+        return await asyncio.to_thread(self.text_search, query, top_k)
+
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+
+def result_item(oid, props: Dict, score, score_type: str, distance=None) -> Dict:
+    return {
+        "id": str(oid) if oid else None,
+        "text": props.get("text", ""),
+        "source": props.get("source", ""),
+        "section": props.get("section") or "",
+        "chunk_index": props.get("chunk_index"),
+        "score": score,
+        "distance": distance,
+        "score_type": score_type,
+    }
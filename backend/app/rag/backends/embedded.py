@@ -0,0 +1,585 @@
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from ..lexical import query_terms, terms
+from .base import VectorBackend, result_item
+
+logger = logging.getLogger(__name__)
+
+_OBJECTS_FILE = "objects.jsonl"
+# 旧版本的单文件向量矩阵，加载时视为基础段
+_VECTORS_FILE = "vectors.npy"
+_VECTORS_DIR = "vectors"
+# 删除记录文件前缀，文件名带所属基础段序号
+_TOMBSTONE_PREFIX = "deleted-"
+# 追加段总行数达到基础段行数（且不少于该值）时合并，摊还后写入量与语料规模成线性
+_COMPACT_MIN_ROWS = 65536
+# 分块扫描，避免大语料一次性生成 N×Q 的分数矩阵
+_SCAN_BLOCK_ROWS = 65536
+_PROPS = ("text", "source", "chunk_index", "start_offset", "end_offset", "section")
+
+
+class _BM25Index:
+    """In-memory inverted index over character-bigram terms."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.doc_len: Dict[int, int] = {}
+        self.total_len = 0
+
+    def add(self, idx: int, text: str):
+        toks = terms(text)
+        for t in toks:
+            posting = self.postings[t]
+            posting[idx] = posting.get(idx, 0) + 1
+        self.doc_len[idx] = len(toks)
+        self.total_len += len(toks)
+
+    def remove(self, idx: int, text: str):
+        for t in set(terms(text)):
+            posting = self.postings.get(t)
+            if posting is not None:
+                posting.pop(idx, None)
+                if not posting:
+                    del self.postings[t]
+        self.total_len -= self.doc_len.pop(idx, 0)
+
+    def search(self, query: str, top_k: int) -> List[tuple]:
+        n = len(self.doc_len)
+        if not n:
+            return []
+        avgdl = self.total_len / n or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for t in query_terms(query):
+            posting = self.postings.get(t)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for idx, tf in posting.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[idx] / avgdl)
+                scores[idx] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+
+
+class _IVFIndex:
+    """Coarse k-means quantizer restricting search to the nearest lists."""
+
+    def __init__(self, matrix: np.ndarray, nlist: int, iterations: int = 8, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        n = matrix.shape[0]
+        sample = matrix[rng.choice(n, size=min(n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+        labels = np.concatenate([
+            np.argmax(matrix[i:i + _SCAN_BLOCK_ROWS] @ centroids.T, axis=1)
+            for i in range(0, n, _SCAN_BLOCK_ROWS)
+        ])
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(labels == c) for c in range(nlist)]
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nearest = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate([self.lists[c] for c in nearest])
+
+
+class EmbeddedBackend(VectorBackend):
+    """In-process vector + BM25 index persisted under ``path``.
+
+    Unit-normalized vectors live in memory-mapped ``.npy`` files, so cosine
+    top-k is a blocked matrix multiply. Each insert writes its batch as a new
+    segment file (``vectors/seg-N.npy``); segments are merged into the base
+    file (``vectors/base-N.npy``, covering segments up to ``N``) once they
+    outgrow it. Deletes only record the deleted rows (``deleted-N.txt``, row
+    numbers relative to base ``N``); once they make up a quarter of the
+    index, a background compaction rewrites the base without them. Above
+    ``ivf_min_rows`` rows an IVF coarse quantizer is built lazily and only
+    ``ivf_nprobe`` lists are scanned. Object metadata is kept as JSON lines;
+    on load, objects and vectors are truncated to the shorter of the two if
+    a crash left them out of step.
+    """
+
+    name = "embedded"
+
+    def __init__(self, path: str, ivf_min_rows: int = 20000, ivf_nprobe: int = 8):
+        self.path = path
+        self.ivf_min_rows = ivf_min_rows
+        self.ivf_nprobe = ivf_nprobe
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._compactor: Optional[threading.Thread] = None
+        self._reset()
+        self._load()
+
+    def recreate(self):
+        with self._lock:
+            for name in (_OBJECTS_FILE, _VECTORS_FILE):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+            shutil.rmtree(os.path.join(self.path, _VECTORS_DIR), ignore_errors=True)
+            self._remove_tombstone_files(keep=None)
+            # 进行中的后台合并检测到代数变化后放弃安装
+            self._generation += 1
+            self._reset()
+
+    def insert(self, objects: List[Dict], vectors: List[Optional[List[float]]]):
+        if not objects:
+            return
+        with self._lock:
+            start = len(self._objects)
+            rows = []
+            for d in objects:
+                row = {"id": d.get("id") or str(uuid.uuid4())}
+                row.update({k: d[k] for k in _PROPS if k in d})
+                rows.append(row)
+            # 先写向量段再追加对象：中途崩溃时多出的向量行在加载时截掉
+            self._append_vectors(vectors, len(rows))
+            self._objects.extend(rows)
+            for i, row in enumerate(rows):
+                self._bm25.add(start + i, row.get("text", ""))
+            self._ivf = None
+            with open(os.path.join(self.path, _OBJECTS_FILE), "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._maybe_compact()
+
+    def vector_search(self, vector: List[float], top_k: int) -> List[Dict]:
+        return self.batch_vector_search([vector], top_k)[0]
+
+    def batch_vector_search(self, vectors: List[List[float]], top_k: int) -> List[List[Dict]]:
+        """Top-k cosine search for several query vectors in one pass over the matrix."""
+        with self._lock:
+            parts, objects, dim = self._parts(), self._objects, self._dim()
+            ivf = self._get_ivf()
+            dead = self._dead_rows()
+        if not parts or not vectors:
+            return [[] for _ in vectors]
+        queries = np.stack([_unit(v) for v in vectors])
+        if queries.shape[1] != dim:
+            logger.warning(f"query dim {queries.shape[1]} != index dim {dim}")
+            return [[] for _ in vectors]
+        results = []
+        if ivf is not None:
+            for q in queries:
+                cand = ivf.candidates(q, self.ivf_nprobe)
+                if len(dead):
+                    cand = cand[~np.isin(cand, dead)]
+                scores = _take(parts, cand, dim) @ q
+                order = _top(scores, top_k)
+                results.append([self._item(objects, int(cand[i]), float(scores[i])) for i in order])
+            return results
+        best_idx = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start, matrix in _blocks(parts):
+            block = np.asarray(matrix) @ queries.T
+            if len(dead):
+                hit = dead[(dead >= start) & (dead < start + len(block))]
+                block[hit - start] = -np.inf
+            idx = np.concatenate([best_idx, np.arange(start, start + len(block))[None, :].repeat(len(queries), 0)], 1)
+            scores = np.concatenate([best_scores, block.T], 1)
+            if scores.shape[1] > top_k:
+                part = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+                idx = np.take_along_axis(idx, part, 1)
+                scores = np.take_along_axis(scores, part, 1)
+            keep = np.argsort(-scores, axis=1)
+            best_idx = np.take_along_axis(idx, keep, 1)
+            best_scores = np.take_along_axis(scores, keep, 1)
+        for qi in range(len(queries)):
+            results.append([self._item(objects, int(i), float(s))
+                            for i, s in zip(best_idx[qi], best_scores[qi]) if s > -np.inf])
+        return results
+
+    def ids_for_source(self, source: str) -> Set[str]:
+        with self._lock:
+            return {o["id"] for i, o in enumerate(self._objects) if o.get("source") == source and i not in self._dead}
+
+    def delete_ids(self, ids: Iterable[str]) -> int:
+        ids = set(ids)
+        if not ids:
+            return 0
+        with self._lock:
+            rows = [i for i, o in enumerate(self._objects) if o["id"] in ids and i not in self._dead]
+            if not rows:
+                return 0
+            # 只记录删除的行号，由后台合并重写文件，删除开销与语料规模无关
+            with open(self._tombstone_path(self._base_seq), "a", encoding="utf-8") as f:
+                f.write("".join(f"{i}\n" for i in rows))
+            for i in rows:
+                self._bm25.remove(i, self._objects[i].get("text", ""))
+            self._dead.update(rows)
+            self._dead_array = None
+            self._maybe_compact()
+            return len(rows)
+
+    def list_sources(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(Counter(o.get("source", "") for i, o in enumerate(self._objects) if i not in self._dead))
+
+    def keyword_search(self, query: str, top_k: int) -> List[Dict]:
+        with self._lock:
+            hits = self._bm25.search(query, top_k)
+            objects = self._objects
+        return [result_item(objects[i]["id"], objects[i], score, "bm25") for i, score in hits]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "rows": len(self._objects) - len(self._dead),
+                "deleted": len(self._dead),
+                "dim": self._dim(),
+                "segments": len(self._segments),
+                "ivf": self._ivf is not None,
+            }
+
+    def compact(self):
+        """Merge the segments into a new base file and drop deleted rows.
+
+        The new files are written from a snapshot without holding the lock;
+        rows inserted or deleted in the meantime are carried over when the
+        result is installed.
+        """
+        with self._lock:
+            if not self._dead and not self._segments:
+                return
+            generation, n = self._generation, len(self._objects)
+            parts, dim, vector_rows = self._parts(merge_tail=False), self._dim(), self._vector_rows()
+            dead = set(self._dead)
+            objects = self._objects[:n]
+            # 预留一个序号：新基础段覆盖其之前的全部追加段，之后写入的追加段序号更大
+            seq = self._next_seq
+            self._next_seq += 1
+        alive = np.ones(n, dtype=bool)
+        alive[list(dead)] = False
+        keep = np.flatnonzero(alive)
+        kept = [objects[i] for i in keep]
+        base_tmp = self._build_base(parts, dim, keep, seq) if vector_rows else None
+        objects_tmp = os.path.join(self.path, _OBJECTS_FILE + ".tmp")
+        with open(objects_tmp, "w", encoding="utf-8") as f:
+            for row in kept:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        bm25 = _BM25Index()
+        for j, row in enumerate(kept):
+            bm25.add(j, row.get("text", ""))
+        with self._lock:
+            # 合并期间索引被重建，或首次写入向量（需要为旧行补零）时放弃本次合并
+            if self._generation != generation or (not vector_rows and self._vector_rows()):
+                for tmp in (base_tmp, objects_tmp):
+                    if tmp:
+                        os.remove(tmp)
+                return
+            tail = self._objects[n:]
+            new_index = np.full(n, -1, dtype=np.int64)
+            new_index[keep] = np.arange(len(keep))
+            shift = n - len(keep)
+            later_dead = {int(new_index[i]) if i < n else i - shift for i in self._dead - dead}
+            # 没有向量文件时基础段序号不变，删除记录沿用原文件名
+            if not base_tmp:
+                seq = self._base_seq
+            # 先写新基础段对应的删除记录，再替换对象与向量文件
+            with open(self._tombstone_path(seq), "w", encoding="utf-8") as f:
+                f.write("".join(f"{i}\n" for i in sorted(later_dead)))
+            with open(objects_tmp, "a", encoding="utf-8") as f:
+                for row in tail:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            if base_tmp:
+                self._install_base(base_tmp, seq)
+            os.replace(objects_tmp, os.path.join(self.path, _OBJECTS_FILE))
+            for j, row in enumerate(tail):
+                bm25.add(len(kept) + j, row.get("text", ""))
+            self._objects = kept + tail
+            for i in later_dead:
+                bm25.remove(i, self._objects[i].get("text", ""))
+            self._bm25 = bm25
+            self._dead = later_dead
+            self._dead_array = None
+            self._ivf = None
+            self._remove_tombstone_files(keep=seq)
+        logger.info(f"embedded index compacted: {len(dead)} deleted rows dropped, {len(self._objects)} rows")
+
+    def wait_for_compaction(self, timeout: Optional[float] = None):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join(timeout)
+
+    def _item(self, objects: List[Dict], idx: int, score: float) -> Dict:
+        return result_item(objects[idx]["id"], objects[idx], score, "vector", 1.0 - score)
+
+    def _reset(self):
+        self._objects: List[Dict] = []
+        self._bm25 = _BM25Index()
+        self._ivf: Optional[_IVFIndex] = None
+        # 已删除（待合并）的行号
+        self._dead: Set[int] = set()
+        self._dead_array: Optional[np.ndarray] = None
+        # 基础段与其后的追加段（均为内存映射），以及追加段合并后的搜索缓存
+        self._base: Optional[np.ndarray] = None
+        self._base_seq = 0
+        self._segments: List[Tuple[int, np.ndarray]] = []
+        self._next_seq = 1
+        self._tail: Optional[np.ndarray] = None
+
+    def _set_objects(self, objects: List[Dict]):
+        self._objects = objects
+        self._bm25 = _BM25Index()
+        for i, row in enumerate(objects):
+            if i not in self._dead:
+                self._bm25.add(i, row.get("text", ""))
+        self._ivf = None
+
+    def _write_objects(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, _OBJECTS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row in self._objects:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp, os.path.join(self.path, _OBJECTS_FILE))
+
+    def _dead_rows(self) -> np.ndarray:
+        if self._dead_array is None:
+            self._dead_array = np.array(sorted(self._dead), dtype=np.int64)
+        return self._dead_array
+
+    def _tombstone_path(self, seq: int) -> str:
+        return os.path.join(self.path, f"{_TOMBSTONE_PREFIX}{seq:08d}.txt")
+
+    def _remove_tombstone_files(self, keep: Optional[int]):
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if name.startswith(_TOMBSTONE_PREFIX) and (keep is None or _file_seq(name) != keep):
+                os.remove(os.path.join(self.path, name))
+
+    def _load_tombstones(self, rows: int):
+        path = self._tombstone_path(self._base_seq)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._dead = {int(line) for line in f if line.strip() and int(line) < rows}
+        self._remove_tombstone_files(keep=self._base_seq)
+
+    def _dim(self) -> int:
+        first = self._base if self._base is not None else (self._segments[0][1] if self._segments else None)
+        return 0 if first is None else int(first.shape[1])
+
+    def _vector_rows(self) -> int:
+        return (0 if self._base is None else len(self._base)) + sum(len(a) for _, a in self._segments)
+
+    def _parts(self, merge_tail: bool = True) -> List[Tuple[int, np.ndarray]]:
+        """``(first row, matrix)`` pairs covering every vector row in order.
+
+        For searching, the (small) segments are concatenated once and cached
+        until the next insert; ``merge_tail=False`` returns them one by one.
+        """
+        parts = []
+        offset = 0
+        if self._base is not None and len(self._base):
+            parts.append((0, self._base))
+            offset = len(self._base)
+        if not self._segments:
+            return parts
+        if not merge_tail:
+            for _, segment in self._segments:
+                parts.append((offset, segment))
+                offset += len(segment)
+            return parts
+        if self._tail is None:
+            self._tail = np.concatenate([a for _, a in self._segments])
+        parts.append((offset, self._tail))
+        return parts
+
+    def _vectors_dir(self) -> str:
+        return os.path.join(self.path, _VECTORS_DIR)
+
+    def _append_vectors(self, vectors: List[Optional[List[float]]], count: int):
+        dim = self._dim() or next((len(v) for v in vectors if v is not None and len(v)), 0)
+        os.makedirs(self.path, exist_ok=True)
+        if not dim:
+            return
+        # 之前没有向量的行补零，保持与对象列表对齐
+        missing = len(self._objects) - self._vector_rows()
+        block = np.zeros((missing + count, dim), dtype=np.float32)
+        for i in range(count):
+            vec = vectors[i] if i < len(vectors) else None
+            if vec is not None and len(vec) == dim:
+                block[missing + i] = _unit(vec)
+        os.makedirs(self._vectors_dir(), exist_ok=True)
+        seq = self._next_seq
+        final = os.path.join(self._vectors_dir(), f"seg-{seq:08d}.npy")
+        tmp = os.path.join(self._vectors_dir(), f".tmp-seg-{seq:08d}.npy")
+        np.save(tmp, block)
+        os.replace(tmp, final)
+        self._segments.append((seq, np.load(final, mmap_mode="r")))
+        self._next_seq = seq + 1
+        self._tail = None
+
+    def _maybe_compact(self):
+        tail_rows = sum(len(a) for _, a in self._segments)
+        base_rows = 0 if self._base is None else len(self._base)
+        if tail_rows >= max(_COMPACT_MIN_ROWS, base_rows) or (self._dead and len(self._dead) * 4 >= len(self._objects)):
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self._compact_quietly, name="embedded-compact", daemon=True)
+                self._compactor.start()
+
+    def _compact_quietly(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.warning(f"embedded index compaction failed: {e}")
+
+    def _build_base(self, parts: List[Tuple[int, np.ndarray]], dim: int, keep: np.ndarray, seq: int) -> str:
+        """Write the ``keep`` rows to a temporary base file and return its path.
+
+        Rows are copied block by block into a memory-mapped output, so the
+        matrix is never materialized as a whole.
+        """
+        os.makedirs(self._vectors_dir(), exist_ok=True)
+        tmp = os.path.join(self._vectors_dir(), f".tmp-base-{seq:08d}.npy")
+        if not len(keep):
+            np.save(tmp, np.zeros((0, dim), dtype=np.float32))
+            return tmp
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(len(keep), dim))
+        for start in range(0, len(keep), _SCAN_BLOCK_ROWS):
+            out[start:start + _SCAN_BLOCK_ROWS] = _take(parts, keep[start:start + _SCAN_BLOCK_ROWS], dim)
+        out.flush()
+        del out
+        return tmp
+
+    def _install_base(self, tmp: str, seq: int):
+        # 新基础段覆盖至 seq 号追加段；替换后再删除旧文件，崩溃时按序号忽略已合并的段
+        final = os.path.join(self._vectors_dir(), f"base-{seq:08d}.npy")
+        os.replace(tmp, final)
+        self._base = np.load(final, mmap_mode="r")
+        self._base_seq = seq
+        self._segments = [(s, a) for s, a in self._segments if s > seq]
+        self._tail = None
+        self._ivf = None
+        self._remove_stale_vector_files()
+
+    def _remove_stale_vector_files(self):
+        names = os.listdir(self._vectors_dir())
+        for name in names:
+            seq = _file_seq(name)
+            # 进行中的后台合并的临时文件不能删除
+            building = self._compactor is not None and self._compactor.is_alive() \
+                and threading.current_thread() is not self._compactor
+            stale = (name.startswith(".tmp-") and not building) \
+                or (name.startswith("seg-") and seq <= self._base_seq) \
+                or (name.startswith("base-") and seq != self._base_seq)
+            if stale:
+                os.remove(os.path.join(self._vectors_dir(), name))
+        legacy = os.path.join(self.path, _VECTORS_FILE)
+        if any(n.startswith("base-") for n in names) and os.path.exists(legacy):
+            os.remove(legacy)
+
+    def _get_ivf(self) -> Optional[_IVFIndex]:
+        rows = self._vector_rows()
+        if self._ivf is None and rows >= self.ivf_min_rows:
+            nlist = max(8, int(math.sqrt(rows)))
+            logger.info(f"building IVF index with {nlist} lists over {rows} rows")
+            self._ivf = _IVFIndex(np.concatenate([np.asarray(m) for _, m in self._parts()]), nlist)
+        return self._ivf
+
+    def _load_vectors(self):
+        vdir = self._vectors_dir()
+        names = os.listdir(vdir) if os.path.isdir(vdir) else []
+        bases = sorted(n for n in names if n.startswith("base-") and n.endswith(".npy"))
+        legacy = os.path.join(self.path, _VECTORS_FILE)
+        if bases:
+            self._base_seq = _file_seq(bases[-1])
+            self._base = np.load(os.path.join(vdir, bases[-1]), mmap_mode="r")
+        elif os.path.exists(legacy):
+            self._base = np.load(legacy, mmap_mode="r")
+        for name in sorted(n for n in names if n.startswith("seg-") and n.endswith(".npy")):
+            seq = _file_seq(name)
+            self._next_seq = max(self._next_seq, seq + 1)
+            if seq > self._base_seq:
+                self._segments.append((seq, np.load(os.path.join(vdir, name), mmap_mode="r")))
+        self._next_seq = max(self._next_seq, self._base_seq + 1)
+        if names:
+            self._remove_stale_vector_files()
+
+    def _load(self):
+        objects_path = os.path.join(self.path, _OBJECTS_FILE)
+        if not os.path.exists(objects_path):
+            return
+        objects = []
+        with open(objects_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    objects.append(json.loads(line))
+        self._objects = objects
+        self._load_vectors()
+        rows = self._vector_rows()
+        if rows and rows != len(objects):
+            # 崩溃导致对象与向量行数不一致时截断到较短的一方，而不是丢弃全部向量
+            logger.warning(f"embedded index has {len(objects)} objects but {rows} vectors, truncating")
+            if rows > len(objects):
+                seq = self._next_seq
+                self._next_seq += 1
+                tmp = self._build_base(self._parts(merge_tail=False), self._dim(),
+                                       np.arange(len(objects), dtype=np.int64), seq)
+                self._load_tombstones(len(objects))
+                # 删除记录按基础段序号保存，换用新基础段时一并迁移
+                with open(self._tombstone_path(seq), "w", encoding="utf-8") as f:
+                    f.write("".join(f"{i}\n" for i in sorted(self._dead)))
+                self._install_base(tmp, seq)
+                self._remove_tombstone_files(keep=seq)
+            else:
+                self._objects = objects[:rows]
+                self._write_objects()
+        self._load_tombstones(len(self._objects))
+        self._set_objects(self._objects)
+        logger.info(f"embedded index loaded {len(self._objects)} objects from {self.path}")
+
+
+def _file_seq(name: str) -> int:
+    try:
+        return int(name.split("-")[-1].split(".")[0])
+    except ValueError:
+        return 0
+
+
+def _blocks(parts: List[Tuple[int, np.ndarray]]):
+    """Yield ``(first row, block)`` slices of at most ``_SCAN_BLOCK_ROWS`` rows."""
+    for offset, matrix in parts:
+        for start in range(0, len(matrix), _SCAN_BLOCK_ROWS):
+            yield offset + start, matrix[start:start + _SCAN_BLOCK_ROWS]
+
+
+def _take(parts: List[Tuple[int, np.ndarray]], rows: np.ndarray, dim: int) -> np.ndarray:
+    """Gather global ``rows`` from the parts without concatenating them."""
+    out = np.empty((len(rows), dim), dtype=np.float32)
+    for offset, matrix in parts:
+        mask = (rows >= offset) & (rows < offset + len(matrix))
+        if mask.any():
+            out[mask] = matrix[rows[mask] - offset]
+    return out
+
+
+def _unit(vector) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) <= k:
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
@@ -0,0 +1,182 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ..config import Settings, get_settings
+from ..utils.tokens import count_tokens
+
+_HEADING_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+# 句子切分：中文句末标点（含后随引号/括号）、英文句点+空白、换行
+_SENTENCE_RE = re.compile(r".+?(?:[。！？!?；;…]+[”’」』）)\"']*|\.(?=\s)|\n|$)\s*", re.S)
+# 长时间没有段落边界（如无空行的 PDF 页）时，强制按行切出已缓冲的文本
+_MAX_BUFFER_CHARS = 64 * 1024
+
+
+@dataclass
+class _Unit:
+    text: str
+    start: int
+    tokens: int
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+
+class StreamingChunker:
+    """Incrementally split one document into token-bounded chunks.
+
+    Text may be fed piece by piece (e.g. one PDF page at a time). Complete
+    paragraphs are split on Markdown headings, paragraphs and sentences and
+    packed into chunks of at most ``chunk_size`` tokens, with ``overlap``
+    tokens of trailing sentences repeated at the start of the next chunk.
+    """
+
+    def __init__(self, source: str, chunk_size: int = 512, overlap: int = 64, encoding: str = ""):
+        self.source = source
+        self.chunk_size = max(1, chunk_size)
+        self.overlap = max(0, min(overlap, self.chunk_size // 2))
+        self.encoding = encoding
+        self._buffer = ""
+        self._offset = 0
+        self._units: List[_Unit] = []
+        self._tokens = 0
+        self._fresh = False
+        self._headings: List[Tuple[int, str]] = []
+        self._index = 0
+
+    @property
+    def section(self) -> str:
+        return " > ".join(title for _, title in self._headings)
+
+    def feed(self, text: str) -> Iterator[Dict]:
+        self._buffer += text
+        end = self._buffer.rfind("\n\n")
+        if end != -1:
+            end += 2
+        elif len(self._buffer) > _MAX_BUFFER_CHARS:
+            end = self._buffer.rfind("\n") + 1 or len(self._buffer)
+        else:
+            return
+        block, self._buffer = self._buffer[:end], self._buffer[end:]
+        yield from self._process(block)
+
+    def close(self) -> Iterator[Dict]:
+        block, self._buffer = self._buffer, ""
+        if block:
+            yield from self._process(block)
+        yield from self._flush()
+
+    def _process(self, block: str) -> Iterator[Dict]:
+        pos = self._offset
+        self._offset += len(block)
+        para, para_start = "", pos
+        for line in block.splitlines(keepends=True):
+            m = _HEADING_RE.match(line.rstrip("\r\n"))
+            if m:
+                yield from self._add_paragraph(para, para_start)
+                yield from self._flush()
+                level = len(m.group(1))
+                while self._headings and self._headings[-1][0] >= level:
+                    self._headings.pop()
+                self._headings.append((level, m.group(2).strip()))
+                yield from self._add_unit(_Unit(line, pos, self._count(line)))
+                para, para_start = "", pos + len(line)
+            elif not line.strip():
+                para += line
+                yield from self._add_paragraph(para, para_start)
+                para, para_start = "", pos + len(line)
+            else:
+                para += line
+            pos += len(line)
+        yield from self._add_paragraph(para, para_start)
+
+    def _add_paragraph(self, text: str, start: int) -> Iterator[Dict]:
+        if not text.strip():
+            return
+        tokens = self._count(text)
+        if tokens <= self.chunk_size:
+            yield from self._add_unit(_Unit(text, start, tokens))
+            return
+        for m in _SENTENCE_RE.finditer(text):
+            sentence = m.group(0)
+            if not sentence:
+                continue
+            s_tokens = self._count(sentence)
+            if s_tokens <= self.chunk_size:
+                yield from self._add_unit(_Unit(sentence, start + m.start(), s_tokens))
+                continue
+            # 超长句子按字符窗口硬切
+            width = max(1, len(sentence) * self.chunk_size // s_tokens)
+            for i in range(0, len(sentence), width):
+                piece = sentence[i:i + width]
+                yield from self._add_unit(_Unit(piece, start + m.start() + i, self._count(piece)))
+
+    def _add_unit(self, unit: _Unit) -> Iterator[Dict]:
+        if self._fresh and self._tokens + unit.tokens > self.chunk_size:
+            yield from self._emit()
+            self._carry_overlap()
+        while not self._fresh and self._units and self._tokens + unit.tokens > self.chunk_size:
+            self._tokens -= self._units.pop(0).tokens
+        self._units.append(unit)
+        self._tokens += unit.tokens
+        self._fresh = True
+
+    def _carry_overlap(self):
+        kept: List[_Unit] = []
+        total = 0
+        for unit in reversed(self._units[1:]):
+            if total + unit.tokens > self.overlap:
+                break
+            kept.insert(0, unit)
+            total += unit.tokens
+        self._units = kept
+        self._tokens = total
+        self._fresh = False
+
+    def _flush(self) -> Iterator[Dict]:
+        if self._fresh:
+            yield from self._emit()
+        self._units = []
+        self._tokens = 0
+        self._fresh = False
+
+    def _emit(self) -> Iterator[Dict]:
+        raw = "".join(u.text for u in self._units)
+        text = raw.strip()
+        if not text:
+            return
+        lead = len(raw) - len(raw.lstrip())
+        trail = len(raw) - len(raw.rstrip())
+        yield {
+            "text": text,
+            "source": self.source,
+            "chunk_index": self._index,
+            "start_offset": self._units[0].start + lead,
+            "end_offset": self._units[-1].end - trail,
+            "section": self.section,
+            "token_count": self._tokens,
+        }
+        self._index += 1
+
+    def _count(self, text: str) -> int:
+        return count_tokens(text, self.encoding)
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, keeping trailing punctuation and whitespace."""
+    return [m.group(0) for m in _SENTENCE_RE.finditer(text) if m.group(0).strip()]
+
+
+def iter_chunks(pieces: Iterable[str], source: str, settings: Optional[Settings] = None) -> Iterator[Dict]:
+    """Chunk one document given as an iterable of text pieces."""
+    settings = settings or get_settings()
+    chunker = StreamingChunker(
+        source,
+        chunk_size=settings.chunk_size_tokens,
+        overlap=settings.chunk_overlap_tokens,
+        encoding=settings.tokenizer_encoding,
+    )
+    for piece in pieces:
+        yield from chunker.feed(piece)
+    yield from chunker.close()
+
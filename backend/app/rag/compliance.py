@@ -0,0 +1,248 @@
+import logging
+import re
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from ..config import Settings
+
+logger = logging.getLogger(__name__)
+
+CLEAN, REDACTED, SUSPICIOUS = "clean", "redacted", "suspicious"
+
+# 默认词表只覆盖明确的高风险表述；部署时通过 COMPLIANCE_LEXICON_PATH 追加领域词表
+DEFAULT_LEXICON = (
+    "制造炸弹", "炸药配方", "自制炸药", "爆炸物制作", "恐怖袭击", "暴恐", "人体炸弹",
+    "贩毒", "制毒", "吸毒方法", "冰毒制作", "毒品交易",
+    "洗钱", "非法集资", "套现漏洞", "赌博网站", "网络赌博", "代开发票",
+    "买卖枪支", "枪支购买", "私造枪支", "自杀方法", "自残方法",
+    "颠覆国家政权", "分裂国家", "邪教",
+    "how to make a bomb", "buy a gun illegally", "money laundering",
+)
+
+_ID_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+_ID_CHECK = "10X98765432"
+
+
+# 可能出现在 PII（手机号、证件号、银行卡、邮箱）中的字符；其余字符可作为安全切分点
+_PII_CHARS = frozenset("0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ@._%+- ")
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher (case-insensitive) in a single pass over the text."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        self._size = 0
+        for p in patterns:
+            p = p.strip().lower()
+            if p:
+                self._add(p)
+        self._build()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def longest(self) -> int:
+        return max((len(p) for out in self._out for p in out), default=0)
+
+    def _add(self, pattern: str):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        if pattern not in self._out[node]:
+            self._out[node].append(pattern)
+            self._size += 1
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """Return ``(start, pattern)`` for every (possibly overlapping) occurrence."""
+        hits = []
+        node = 0
+        for i, ch in enumerate(text.lower()):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for p in self._out[node]:
+                hits.append((i - len(p) + 1, p))
+        return hits
+
+
+def _luhn_ok(digits: str) -> bool:
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        n = int(d)
+        if i % 2:
+            n = n * 2 - 9 if n > 4 else n * 2
+        total += n
+    return total % 10 == 0
+
+
+def _id_ok(number: str) -> bool:
+    number = number.upper()
+    return _ID_CHECK[sum(int(d) * w for d, w in zip(number[:17], _ID_WEIGHTS)) % 11] == number[17]
+
+
+def _mask(value: str, keep_head: int, keep_tail: int) -> str:
+    return value[:keep_head] + "*" * (len(value) - keep_head - keep_tail) + value[len(value) - keep_tail:]
+
+
+def _mask_email(value: str) -> str:
+    name, _, domain = value.partition("@")
+    return f"{name[:1]}***@{domain}"
+
+
+# (类型, 正则, 校验, 脱敏)；身份证与银行卡带校验位，降低误报
+_PII_RULES: List[Tuple[str, "re.Pattern", Optional[Callable[[str], bool]], Callable[[str], str]]] = [
+    ("id_card", re.compile(r"(?<![0-9A-Za-z])[1-9]\d{5}(?:18|19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])"
+                           r"\d{3}[0-9Xx](?![0-9A-Za-z])"), _id_ok, lambda v: _mask(v, 6, 4)),
+    ("bank_card", re.compile(r"(?<!\d)\d{16,19}(?!\d)"), _luhn_ok, lambda v: _mask(v, 0, 4)),
+    ("phone", re.compile(r"(?<!\d)(?:\+?86[- ]?)?1[3-9]\d[- ]?\d{4}[- ]?\d{4}(?!\d)"), None, lambda v: _mask(v, 3, 4)),
+    ("email", re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"), None, _mask_email),
+]
+
+
+@dataclass
+class ScreenResult:
+    verdict: str
+    text: str
+    terms: List[str] = field(default_factory=list)
+    redactions: Dict[str, int] = field(default_factory=dict)
+
+
+class ComplianceScreen:
+    """Local pre-screen in front of the LLM compliance auditor.
+
+    Lexicon hits make an answer ``suspicious`` (escalate to the LLM);
+    PII (phone, ID card, email, bank card) is masked locally and the
+    answer passes as ``redacted``; everything else passes as ``clean``.
+    """
+
+    def __init__(self, lexicon: Iterable[str] = DEFAULT_LEXICON, redact_pii: bool = True):
+        self.matcher = AhoCorasick(lexicon)
+        self.redact_pii = redact_pii
+        self._stats = Counter()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ComplianceScreen":
+        lexicon = list(DEFAULT_LEXICON)
+        if settings.compliance_lexicon_path:
+            try:
+                lexicon.extend(load_lexicon(settings.compliance_lexicon_path))
+            except OSError as e:
+                logger.warning(f"compliance lexicon unavailable, using defaults: {e}")
+        return cls(lexicon, redact_pii=settings.compliance_redact_pii)
+
+    def redact(self, text: str) -> Tuple[str, Dict[str, int]]:
+        counts: Dict[str, int] = {}
+        for kind, pattern, valid, mask in _PII_RULES:
+            def replace(m, kind=kind, valid=valid, mask=mask):
+                value = m.group(0)
+                if valid is not None and not valid(value):
+                    return value
+                counts[kind] = counts.get(kind, 0) + 1
+                return mask(value)
+            text = pattern.sub(replace, text)
+        return text, counts
+
+    def screen(self, answer: str) -> ScreenResult:
+        """Classify ``answer`` and count the verdict."""
+        text, redactions = self.redact(answer) if self.redact_pii else (answer, {})
+        terms = sorted({p for _, p in self.matcher.find_all(text)})
+        if terms:
+            verdict = SUSPICIOUS
+        elif redactions:
+            verdict = REDACTED
+        else:
+            verdict = CLEAN
+        self._stats[verdict] += 1
+        for kind, n in redactions.items():
+            self._stats[f"pii_{kind}"] += n
+        return ScreenResult(verdict, text, terms, redactions)
+
+    def stream(self) -> "StreamScreen":
+        return StreamScreen(self)
+
+    def stats(self) -> Dict:
+        stats = {k: self._stats.get(k, 0) for k in (CLEAN, REDACTED, SUSPICIOUS)}
+        stats["llm_calls_avoided"] = stats[CLEAN] + stats[REDACTED]
+        stats["pii_redacted"] = {k[4:]: v for k, v in self._stats.items() if k.startswith("pii_")}
+        stats["lexicon_terms"] = len(self.matcher)
+        return stats
+
+
+class StreamScreen:
+    """Screen a streamed answer before its text reaches the client.
+
+    Text is released only at points where no PII match can span the cut,
+    with PII masked, and the last ``longest lexicon term`` characters are
+    held back. Once a lexicon term appears, nothing more is released: the
+    full answer still goes through the compliance audit and the client gets
+    the final text in a ``replace`` event.
+    """
+
+    def __init__(self, screen: ComplianceScreen):
+        self.screen = screen
+        self.holdback = max(0, screen.matcher.longest - 1)
+        self.pending = ""
+        self.released = ""
+        self.held = False
+
+    def feed(self, token: str) -> str:
+        self.pending += token
+        if self._check():
+            return ""
+        return self._release(self._safe_cut(len(self.pending) - self.holdback))
+
+    def flush(self) -> str:
+        return "" if self._check() else self._release(len(self.pending))
+
+    def _check(self) -> bool:
+        # 与已发送文本的结尾拼接后再匹配，覆盖跨越切分点的词
+        if not self.held:
+            window = (self.released[-self.holdback:] if self.holdback else "") + self.pending
+            self.held = bool(self.screen.matcher.find_all(window))
+        return self.held
+
+    def _safe_cut(self, limit: int) -> int:
+        text = self.pending
+        for i in range(min(limit, len(text)), 0, -1):
+            if i == len(text) or text[i - 1] not in _PII_CHARS or text[i] not in _PII_CHARS:
+                return i
+            # 空格两侧都不是数字时也可切分（手机号分组之间的空格除外）
+            if text[i - 1] == " " and not text[i].isdigit() and (i < 2 or not text[i - 2].isdigit()):
+                return i
+        return 0
+
+    def _release(self, cut: int) -> str:
+        if cut <= 0:
+            return ""
+        text, self.pending = self.pending[:cut], self.pending[cut:]
+        self.released += text
+        return self.screen.redact(text)[0] if self.screen.redact_pii else text
+
+
+def load_lexicon(path: str) -> List[str]:
+    """One term per line; blank lines and ``#`` comments are ignored."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
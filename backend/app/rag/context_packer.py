@@ -0,0 +1,166 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+from ..config import Settings
+from ..utils.tokens import count_tokens, tokenizer_available
+from .chunker import split_sentences
+from .lexical import query_terms, terms
+
+
+@dataclass
+class PackedContext:
+    passages: List[Dict]
+    history: List[Dict]
+    instruction_tokens: int = 0
+    history_tokens: int = 0
+    context_tokens: int = 0
+    duplicates: int = 0
+    trimmed: int = 0
+    dropped: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.instruction_tokens + self.history_tokens + self.context_tokens
+
+    def report(self) -> Dict[str, int]:
+        return {
+            "total_tokens": self.total_tokens,
+            "instruction_tokens": self.instruction_tokens,
+            "history_tokens": self.history_tokens,
+            "context_tokens": self.context_tokens,
+            "passages": len(self.passages),
+            "duplicates": self.duplicates,
+            "trimmed": self.trimmed,
+            "dropped": self.dropped,
+        }
+
+
+@dataclass
+class _Candidate:
+    rank: int
+    doc: Dict
+    tokens: int
+    terms: Set[str] = field(default_factory=set)
+
+
+class ContextPacker:
+    """Fit instructions, history and retrieved passages into ``max_tokens``.
+
+    Instructions (template plus question) are always kept. History gets at
+    most ``history_share`` of the rest, newest messages first. Passages are
+    taken in rank order, skipping any whose bigram Jaccard similarity to an
+    already selected passage reaches ``duplicate_threshold``; the remaining
+    budget is shared max-min fairly, and passages over their share are cut
+    down to the sentences that best cover the query terms.
+    """
+
+    def __init__(self, max_tokens: int = 4096, history_share: float = 0.25, duplicate_threshold: float = 0.8,
+                 min_passage_tokens: int = 32, encoding: str = ""):
+        self.max_tokens = max_tokens
+        self.history_share = history_share
+        self.duplicate_threshold = duplicate_threshold
+        self.min_passage_tokens = min_passage_tokens
+        self.encoding = encoding
+        self._stats = Counter()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ContextPacker":
+        # 在构建管道（预热）时加载编码，避免首个请求承担下载/加载耗时
+        tokenizer_available(settings.tokenizer_encoding)
+        return cls(
+            max_tokens=settings.max_context_tokens,
+            history_share=settings.context_history_share,
+            duplicate_threshold=settings.context_duplicate_threshold,
+            min_passage_tokens=settings.context_min_passage_tokens,
+            encoding=settings.tokenizer_encoding,
+        )
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.encoding)
+
+    def pack(self, query: str, docs: List[Dict], history: List[Dict], instructions: str) -> PackedContext:
+        packed = PackedContext(passages=[], history=[], instruction_tokens=self.count(instructions))
+        remaining = max(0, self.max_tokens - packed.instruction_tokens)
+        packed.history, packed.history_tokens = self._pack_history(history, int(remaining * self.history_share))
+        self._pack_passages(query, docs, remaining - packed.history_tokens, packed)
+        self._stats["requests"] += 1
+        for key in ("total_tokens", "context_tokens", "history_tokens", "duplicates", "trimmed", "dropped"):
+            self._stats[key] += packed.report()[key]
+        return packed
+
+    def stats(self) -> Dict:
+        requests = self._stats["requests"]
+        return {
+            "requests": requests,
+            "avg_prompt_tokens": round(self._stats["total_tokens"] / requests, 1) if requests else 0.0,
+            "avg_context_tokens": round(self._stats["context_tokens"] / requests, 1) if requests else 0.0,
+            "duplicates_dropped": self._stats["duplicates"],
+            "passages_trimmed": self._stats["trimmed"],
+            "passages_dropped": self._stats["dropped"],
+        }
+
+    def _pack_history(self, history: List[Dict], budget: int):
+        kept, used = [], 0
+        for m in reversed(history):
+            tokens = self.count(f"{m['role']}: {m['content']}")
+            if used + tokens > budget:
+                break
+            kept.append(m)
+            used += tokens
+        return kept[::-1], used
+
+    def _pack_passages(self, query: str, docs: List[Dict], budget: int, packed: PackedContext):
+        selected: List[_Candidate] = []
+        for rank, d in enumerate(docs):
+            cand = _Candidate(rank, d, self.count(d.get("text", "")), set(terms(d.get("text", ""))))
+            if any(_jaccard(cand.terms, s.terms) >= self.duplicate_threshold for s in selected):
+                packed.duplicates += 1
+                continue
+            selected.append(cand)
+        # 最大最小公平分配：短段落全额保留，剩余预算均分给较长段落
+        shares: Dict[int, int] = {}
+        left = max(0, budget)
+        pending = sorted(selected, key=lambda c: c.tokens)
+        for i, cand in enumerate(pending):
+            share = min(cand.tokens, left // (len(pending) - i))
+            shares[cand.rank] = share
+            left -= share
+        q_terms = query_terms(query)
+        for cand in selected:
+            share = shares[cand.rank]
+            if share < min(cand.tokens, self.min_passage_tokens):
+                packed.dropped += 1
+                continue
+            text, tokens = cand.doc.get("text", ""), cand.tokens
+            if tokens > share:
+                text, tokens = self._trim(text, q_terms, share)
+                if not text:
+                    packed.dropped += 1
+                    continue
+                packed.trimmed += 1
+            packed.passages.append({**cand.doc, "text": text, "token_count": tokens})
+            packed.context_tokens += tokens
+
+    def _trim(self, text: str, q_terms: List[str], budget: int):
+        """Keep the highest-coverage sentences that fit ``budget``, in original order."""
+        sentences = split_sentences(text)
+        wanted = set(q_terms)
+        scored = []
+        for i, sent in enumerate(sentences):
+            hits = len(wanted.intersection(terms(sent)))
+            scored.append((hits, -i, i, sent))
+        keep, used = [], 0
+        for hits, _, i, sent in sorted(scored, reverse=True):
+            tokens = self.count(sent)
+            if used + tokens <= budget:
+                keep.append(i)
+                used += tokens
+        if not keep:
+            return "", 0
+        return "".join(sentences[i] for i in sorted(keep)).strip(), used
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
@@ -1,35 +1,200 @@
-from typing import List, Dict
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple, Union
 from fastapi import UploadFile, HTTPException
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+_settings = get_settings()
+
+SUPPORTED_EXTENSIONS = (".md", ".pdf", ".docx", ".txt")
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+_READ_BLOCK = 1024 * 1024
+_TEXT_BLOCK = 64 * 1024
+# 需要在子进程中解析的格式；纯文本直接流式读取
+_POOLED_EXTENSIONS = (".pdf", ".docx")
+
+Source = Union[str, BinaryIO]
+
+
+def spool_dir() -> str:
+    path = _settings.upload_spool_dir or os.path.join(tempfile.gettempdir(), "agenticrag-uploads")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+async def spool_upload(f: UploadFile) -> Tuple[str, str]:
+    """Validate one upload and stream it to a spool file; return ``(filename, path)``.
+
+    The size limit is checked while copying, so oversized uploads are
+    rejected without ever being held in memory.
+    """
+    filename = f.filename or "unknown"
+    if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="仅支持上传 md/pdf/docx/txt 文件")
+    path = os.path.join(spool_dir(), uuid.uuid4().hex + os.path.splitext(filename)[1].lower())
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                block = await f.read(_READ_BLOCK)
+                if not block:
+                    break
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail="文件过大（>10MB）")
+                out.write(block)
+    except BaseException:
+        remove_quietly(path)
+        raise
+    return filename, path
+
+
+def remove_quietly(path: Optional[str]):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def iter_text(filename: str, source: Source) -> Iterator[str]:
+    """Yield a document's text piece by piece: PDF per page, DOCX per paragraph.
+
+    ``source`` is a path or a binary file object. Unreadable PDF/DOCX files
+    raise :class:`ValueError`.
+    """
+    name = filename.lower()
+    if name.endswith(".md") or name.endswith(".txt"):
+        if isinstance(source, str):
+            with open(source, encoding="utf-8", errors="ignore") as fh:
+                while True:
+                    block = fh.read(_TEXT_BLOCK)
+                    if not block:
+                        return
+                    yield block
+        else:
+            yield source.read().decode("utf-8", errors="ignore")
+    elif name.endswith(".pdf"):
+        try:
+            from PyPDF2 import PdfReader
+            reader = PdfReader(source)
+            for page in reader.pages:
+                text = page.extract_text() or ""
+                if text:
+                    # 页与页之间视为段落边界，便于分块器增量切分
+                    yield text + "\n\n"
+        except Exception as e:
+            raise ValueError(f"failed to parse pdf {filename}: {e}") from e
+    elif name.endswith(".docx"):
+        try:
+            from docx import Document
+            doc = Document(source)
+            for p in doc.paragraphs:
+                yield p.text + "\n"
+        except Exception as e:
+            raise ValueError(f"failed to parse docx {filename}: {e}") from e
+
+
+def extract_to_file(filename: str, path: str) -> str:
+    """Extract ``path`` to a UTF-8 text file next to it and return its path.
+
+    Runs inside a parser process; only the output path crosses the process
+    boundary, never the document text.
+    """
+    out_path = path + ".txt"
+    try:
+        with open(out_path, "w", encoding="utf-8") as out:
+            for piece in iter_text(filename, path):
+                out.write(piece)
+    except BaseException:
+        remove_quietly(out_path)
+        raise
+    return out_path
+
+
+def needs_parser_process(filename: str) -> bool:
+    return filename.lower().endswith(_POOLED_EXTENSIONS)
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class ParserPool:
+    """Process pool for CPU-bound document parsing with a per-call timeout.
+
+    A timed-out call cannot be cancelled inside ``ProcessPoolExecutor``, so
+    the pool's processes are terminated and the pool is recreated; other
+    calls running at that moment fail and are reported as parse errors.
+    Workers are started with forkserver (spawn where unavailable): the pool
+    is created from the ingest loop thread, and forking a threaded process
+    can copy locks held by other threads into the child.
+    """
+
+    def __init__(self, workers: int = 0, timeout: float = 120.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.timeouts = 0
+
+    async def run(self, fn: Callable, *args):
+        pool = self._get_pool()
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(pool, fn, *args), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._restart(pool)
+            raise TimeoutError(f"parsing exceeded {self.timeout}s")
+        except BrokenProcessPool:
+            self._restart(pool)
+            raise
+
+    async def extract(self, filename: str, path: str) -> str:
+        """Return the path of a text file holding the document's text."""
+        if not needs_parser_process(filename):
+            return path
+        return await self.run(extract_to_file, filename, path)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+        return self._pool
+
+    def _restart(self, pool: ProcessPoolExecutor):
+        if self._pool is not pool:
+            return
+        for proc in list((getattr(pool, "_processes", None) or {}).values()):
+            proc.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+
+_parser_pool: Optional[ParserPool] = None
+
+
+def get_parser_pool() -> ParserPool:
+    global _parser_pool
+    if _parser_pool is None:
+        _parser_pool = ParserPool(_settings.parse_workers, _settings.parse_timeout_seconds)
+    return _parser_pool
+
+
+def iter_text_file(path: str) -> Iterator[str]:
+    """Stream an extracted UTF-8 text file in fixed-size pieces."""
+    yield from iter_text(".txt", path)
 
-async def parse_files(files: List[UploadFile]) -> List[Dict]:
-    docs = []
-    for f in files:
-        name = (f.filename or "unknown").lower()
-        if not (name.endswith(".md") or name.endswith(".pdf") or name.endswith(".docx") or name.endswith(".txt")):
-            raise HTTPException(status_code=400, detail="仅支持上传 md/pdf/docx/txt 文件")
-        content = await f.read()
-        if len(content) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=413, detail="文件过大（>10MB）")
-        text = ""
-        if name.endswith(".md") or name.endswith(".txt"):
-            text = content.decode("utf-8", errors="ignore")
-        elif name.endswith(".pdf"):
-            try:
-                import io
-                from PyPDF2 import PdfReader
-                reader = PdfReader(io.BytesIO(content))
-                for page in reader.pages:
-                    text += page.extract_text() or ""
-            except Exception:
-                text = ""
-        elif name.endswith(".docx"):
-            try:
-                import io
-                from docx import Document
-                doc = Document(io.BytesIO(content))
-                text = "\n".join([p.text for p in doc.paragraphs])
-            except Exception:
-                text = ""
-        if text.strip():
-            docs.append({"text": text, "source": f.filename or "unknown"})
-    return docs
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+_cache = None
+
+_WS_RE = re.compile(r"\s+")
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+AsyncEmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+def normalize_text(text: str) -> str:
+    return _WS_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an LRU tier and a SQLite tier.
+
+    Keys are ``sha256(model, kind, normalized text)`` so that switching the
+    embedding model never serves stale vectors. Vectors are stored on disk as
+    float32 blobs and survive restarts. The async methods run SQLite reads and
+    writes in a worker thread so they never block the event loop.
+    """
+
+    def __init__(self, model: str, path: str = "", capacity: int = 8192):
+        self.model = model
+        self.capacity = max(0, capacity)
+        self._lock = threading.Lock()
+        # SQLite 读写单独加锁，避免事件循环上的内存查找等待磁盘提交
+        self._db_lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vector BLOB)"
+                )
+                self._db.commit()
+            except Exception as e:
+                logger.warning(f"embedding cache disk tier disabled: {e}")
+                self._db = None
+
+    def key(self, text: str, kind: str = "text") -> str:
+        raw = f"{self.model}\x00{kind}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        missing = []
+        with self._lock:
+            for k in keys:
+                vec = self._memory.get(k)
+                if vec is None:
+                    missing.append(k)
+                    continue
+                self._memory.move_to_end(k)
+                found[k] = vec
+                self._stats["memory_hits"] += 1
+        rows = self._fetch(missing) if missing and self._db is not None else []
+        with self._lock:
+            for k, blob in rows:
+                vec = array("f", blob).tolist()
+                found[k] = vec
+                self._remember(k, vec)
+                self._stats["disk_hits"] += 1
+            self._stats["misses"] += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock:
+            for k, vec in items.items():
+                self._remember(k, vec)
+        self._write(items)
+
+    def embed_texts(self, texts: List[str], embed_fn: EmbedFn, kind: str = "text") -> List[List[float]]:
+        """Return embeddings for ``texts``, calling ``embed_fn`` only for misses."""
+        keys, found, pending = self._lookup(texts, kind)
+        if pending:
+            self._store(found, pending, embed_fn(list(pending.values())))
+        return [found[k] for k in keys]
+
+    async def aembed_texts(self, texts: List[str], embed_fn: AsyncEmbedFn, kind: str = "text") -> List[List[float]]:
+        keys, found, pending = await self._alookup(texts, kind)
+        if pending:
+            fresh = dict(zip(pending.keys(), await embed_fn(list(pending.values()))))
+            with self._lock:
+                for k, vec in fresh.items():
+                    self._remember(k, vec)
+            if fresh and self._db is not None:
+                await asyncio.to_thread(self._write, fresh)
+            found.update(fresh)
+        return [found[k] for k in keys]
+
+    def embed_query(self, query: str, embed_fn: Callable[[str], List[float]]) -> List[float]:
+        return self.embed_texts([query], lambda ts: [embed_fn(ts[0])], kind="query")[0]
+
+    async def aembed_query(self, query: str, embed_fn: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        async def batch_fn(ts: List[str]) -> List[List[float]]:
+            return [await embed_fn(ts[0])]
+        return (await self.aembed_texts([query], batch_fn, kind="query"))[0]
+
+    def _lookup(self, texts: List[str], kind: str):
+        keys = [self.key(t, kind) for t in texts]
+        found = self.get_many(keys)
+        pending: Dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in found and k not in pending:
+                pending[k] = t
+        return keys, found, pending
+
+    async def _alookup(self, texts: List[str], kind: str):
+        if self._db is None:
+            return self._lookup(texts, kind)
+        with self._lock:
+            in_memory = all(self.key(t, kind) in self._memory for t in texts)
+        # 全部命中内存时无需切换线程
+        return self._lookup(texts, kind) if in_memory else await asyncio.to_thread(self._lookup, texts, kind)
+
+    def _store(self, found: Dict[str, List[float]], pending: Dict[str, str], vectors: List[List[float]]):
+        fresh = dict(zip(pending.keys(), vectors))
+        self.put_many(fresh)
+        found.update(fresh)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _fetch(self, keys: List[str]):
+        rows = []
+        # SQLite 默认最多 999 个绑定参数
+        with self._db_lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                try:
+                    rows.extend(self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                    ).fetchall())
+                except Exception as e:
+                    logger.warning(f"embedding cache read failed: {e}")
+        return rows
+
+    def _write(self, items: Dict[str, List[float]]):
+        if self._db is None:
+            return
+        with self._db_lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                    [(k, len(v), array("f", v).tobytes()) for k, v in items.items()],
+                )
+                self._db.commit()
+            except Exception as e:
+                logger.warning(f"embedding cache write failed: {e}")
+
+    def _remember(self, key: str, vec: List[float]):
+        if not self.capacity:
+            return
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    global _cache
+    if _cache:
+        return _cache
+    settings = get_settings()
+    if not settings.embedding_cache_enabled:
+        return None
+    _cache = EmbeddingCache(
+        model=settings.siliconcloud_embed_model,
+        path=settings.embedding_cache_path,
+        capacity=settings.embedding_cache_size,
+    )
+    return _cache
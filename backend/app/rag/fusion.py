@@ -0,0 +1,37 @@
+from typing import Dict, List, Optional, Sequence
+
+
+def result_key(item: Dict) -> str:
+    """Deduplication key of a retrieval result: chunk id, else its text."""
+    return item.get("id") or item.get("text", "")
+
+
+def fuse_results(ranked_lists: Sequence[List[Dict]], top_k: int, method: str = "rrf",
+                 weights: Optional[Sequence[float]] = None, rrf_k: int = 60) -> List[Dict]:
+    """Fuse several ranked result lists into one deduplicated list.
+
+    ``rrf`` sums ``weight / (rrf_k + rank)`` per list; ``weighted`` sums
+    min-max normalized scores times the list weight. The first copy of each
+    result that carries a vector score is kept as representative, with the
+    fused value stored under ``fusion_score``.
+    """
+    weights = list(weights) if weights else [1.0] * len(ranked_lists)
+    fused: Dict[str, float] = {}
+    items: Dict[str, Dict] = {}
+    for items_list, weight in zip(ranked_lists, weights):
+        if not items_list:
+            continue
+        if method == "weighted":
+            scores = [float(r.get("score") or 0.0) for r in items_list]
+            lo, hi = min(scores), max(scores)
+            contrib = [(s - lo) / (hi - lo) if hi > lo else 1.0 for s in scores]
+        else:
+            contrib = [1.0 / (rrf_k + rank + 1) for rank in range(len(items_list))]
+        for item, value in zip(items_list, contrib):
+            key = result_key(item)
+            fused[key] = fused.get(key, 0.0) + weight * value
+            current = items.get(key)
+            if current is None or (current.get("score_type") != "vector" and item.get("score_type") == "vector"):
+                items[key] = item
+    ordered = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [{**items[k], "fusion_score": round(fused[k], 6)} for k in ordered]
@@ -0,0 +1,43 @@
+import re
+from typing import Iterable, List
+
+# 连续的中日韩字符段 / 英文数字词
+_TOKEN_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿]+|[A-Za-z0-9][A-Za-z0-9_.\-]*")
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿]")
+# 高频虚词，不参与词项覆盖率计算
+_STOP_TERMS = {
+    "什么", "怎么", "如何", "哪些", "是否", "可以", "一个", "这个", "那个", "我们", "你们", "他们",
+    "的", "了", "是", "在", "和", "与", "及", "或", "吗", "呢", "吧", "啊",
+    "the", "a", "an", "of", "to", "in", "and", "or", "is", "are", "what", "how",
+}
+
+
+def terms(text: str) -> List[str]:
+    """Tokenize into lowercase words and Chinese character bigrams."""
+    out: List[str] = []
+    for m in _TOKEN_RE.finditer(text.lower()):
+        tok = m.group(0)
+        if _CJK_RE.match(tok):
+            if len(tok) == 1:
+                out.append(tok)
+            else:
+                out.extend(tok[i:i + 2] for i in range(len(tok) - 1))
+        else:
+            out.append(tok)
+    return out
+
+
+def query_terms(text: str) -> List[str]:
+    """Distinct content terms of a query, in order of appearance."""
+    return [t for t in dict.fromkeys(terms(text)) if t not in _STOP_TERMS]
+
+
+def coverage(query: str, texts: Iterable[str]) -> float:
+    """Fraction of the query's content terms that occur in ``texts``."""
+    q_terms = query_terms(query)
+    if not q_terms:
+        return 0.0
+    seen = set()
+    for text in texts:
+        seen.update(terms(text))
+    return sum(1 for t in q_terms if t in seen) / len(q_terms)
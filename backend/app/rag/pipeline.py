@@ -1,14 +1,99 @@
+import asyncio
 import logging
-from typing import Dict, List, TypedDict, Any
-from langgraph.graph import StateGraph, END
-from ..config import Settings
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, TypedDict
+import numpy as np
+from ..config import get_settings
+from .answer_cache import get_answer_cache
+from .compliance import SUSPICIOUS, ComplianceScreen
+from .context_packer import ContextPacker
+from .fusion import fuse_results
+from .query_router import get_query_router
+from .relevance import RELEVANT, UNCERTAIN, RelevanceGate
+from .reranker import LexicalReranker
 from .vector_store import get_vector_store
-from ..services.llm_siliconcloud import SiliconCloudLLM
+from ..services.clients import get_llm
+from ..services.llm_siliconcloud import LARGE, SMALL, SiliconCloudLLM
+from ..utils.metrics import LLM_CALLS, RETRIES, timed_node
+from ..utils.retry import budgeted_node, deadline_scope
 
 logger = logging.getLogger(__name__)
-_settings = Settings()
+_settings = get_settings()
 _agent = None
 
+# 直接产出回答的节点可用完剩余预算，其余节点只能用其中一部分，为生成留出时间
+_ANSWER_NODES = {"direct_answer", "generate", "fix_generation", "knowledge_fallback"}
+
+_VARIANT_PREFIX = re.compile(r"^\s*(?:\d+[.、)）:：]|[-*•])\s*")
+_ERROR_ANSWER = "抱歉，生成回答时遇到错误。"
+_SAFE_ANSWER = "抱歉，无法提供该信息。"
+_GENERATE_TEMPLATE = (
+    "你是一个帮助用户检索与总结文档的智能助手。"
+    "\n对话历史：\n{history}\n"
+    "\n检索到的上下文：\n{context}\n"
+    "\n用户问题：{query}\n"
+    "要求：优先使用上下文，无法回答时明确说明。"
+)
+
+
+@dataclass
+class _RunContext:
+    """Per-run side channel shared by graph nodes (not part of graph state)."""
+    events: Optional[asyncio.Queue] = None
+    speculative: Optional[asyncio.Task] = None
+    retrieval_mode: Optional[str] = None
+    retrieval_stats: List[Dict] = field(default_factory=list)
+    streamed: List[str] = field(default_factory=list)
+
+
+_run_ctx: ContextVar[Optional[_RunContext]] = ContextVar("agent_run", default=None)
+
+
+def _emit(event: str, data: Dict):
+    ctx = _run_ctx.get()
+    if ctx is not None and ctx.events is not None:
+        ctx.events.put_nowait((event, data))
+
+
+def parse_query_variants(text: str, query: str, limit: int) -> List[str]:
+    """Split an LLM reply into at most ``limit`` distinct rewrites, one per line, excluding ``query``."""
+    variants: List[str] = []
+    seen = {query.strip()}
+    for line in text.splitlines():
+        line = _VARIANT_PREFIX.sub("", line).strip().strip("\"'“”")
+        if line and line not in seen:
+            seen.add(line)
+            variants.append(line)
+    return variants[:limit]
+
+
+def parse_route(text: str) -> Optional[str]:
+    """``direct``/``rewrite`` when exactly one of them is named, else ``None``."""
+    lowered = text.lower()
+    found = [d for d in ("direct", "rewrite") if d in lowered]
+    return found[0] if len(found) == 1 else None
+
+
+def parse_relevance(text: str) -> Optional[bool]:
+    lowered = text.lower()
+    if "irrelevant" in lowered:
+        return False
+    return True if "relevant" in lowered else None
+
+
+def parse_compliance(text: str) -> Optional[List[str]]:
+    """Issue list (empty when compliant), or ``None`` when the verdict is missing."""
+    lowered = text.lower()
+    if "violation" in lowered or "non-compliant" in lowered:
+        issues = [s.strip() for s in text.replace("violation:", "").split(";") if s.strip()]
+        return issues or ["Unknown compliance issue"]
+    return [] if "compliant" in lowered else None
+
+
 class AgentState(TypedDict):
     query: str
     context: List[Dict]
@@ -18,20 +103,48 @@ class AgentState(TypedDict):
     decision: str
     # New fields for optimization
     retrieve_count: int
+    query_variants: List[str]
     generate_count: int
     is_relevant: bool
     compliance_issues: List[str]
+    compliance_screen: str
+    packing: Dict
 
 class AgentPipeline:
     def __init__(self, llm: SiliconCloudLLM):
         self.llm = llm
-        self.vs = get_vector_store()
+        self.local_router = get_query_router()
+        self.relevance_gate = RelevanceGate.from_settings(_settings) if _settings.relevance_gate_enabled else None
+        self.compliance_screen = (
+            ComplianceScreen.from_settings(_settings) if _settings.compliance_screen_enabled else None
+        )
+        self.packer = ContextPacker.from_settings(_settings)
+        self.reranker = LexicalReranker.from_settings(_settings) if _settings.rerank_enabled else None
+        self.multi_query = _settings.multi_query_count > 1
+        self.multi_query_stats = Counter()
+        self.cascade_stats = Counter()
         self.app = self._build_graph()
+        self.speculation_stats = {
+            "launched": 0, "reused": 0, "merged": 0, "fallback": 0, "discarded": 0, "failed": 0,
+        }
+
+    @property
+    def vs(self):
+        # 每次取当前实例：启动时不可用的向量库恢复后自动生效
+        return get_vector_store()
 
-    def _router(self, state: AgentState):
+    async def _router(self, state: AgentState):
+        _emit("stage", {"stage": "routing"})
         query = state["query"]
         logger.info(f"Routing query: {query}")
-        
+        reset = {"retrieve_count": 0, "generate_count": 0, "compliance_issues": [], "query_variants": []}
+
+        if self.local_router is not None:
+            local, confidence, tier = self.local_router.classify(query)
+            if local is not None:
+                logger.info(f"Routing decision: {local} (local {tier}, confidence {confidence:.2f})")
+                return {"decision": local, **reset}
+
         prompt = (
             "你是一个智能查询路由助手。请根据用户的查询内容，决定下一步的操作。\n"
             f"用户查询：{query}\n\n"
@@ -42,21 +155,24 @@ class AgentPipeline:
         )
         
         try:
-            decision = self.llm.complete(prompt).strip().lower()
+            decision, raw = await self._classify(prompt, "router", parse_route)
+            # 仅记录模型给出的明确决策，作为本地路由的训练样本
+            if self.local_router is not None and decision is not None \
+                    and raw.lower().strip("\"'. ") == decision:
+                await self.local_router.arecord(query, decision)
             # Simple fallback
-            if "rewrite" in decision:
-                decision = "rewrite"
-            else:
-                decision = "direct"
+            if decision is None:
+                decision = "rewrite" if "rewrite" in raw.lower() else "direct"
         except Exception as e:
             logger.error(f"Routing failed: {e}")
             decision = "direct" # Default to direct on error
             
         logger.info(f"Routing decision: {decision}")
         # Reset counters
-        return {"decision": decision, "retrieve_count": 0, "generate_count": 0, "compliance_issues": []}
+        return {"decision": decision, **reset}
 
-    def _rewrite(self, state: AgentState):
+    async def _rewrite(self, state: AgentState):
+        _emit("stage", {"stage": "rewriting"})
         query = state["query"]
         logger.info(f"Rewriting query: {query}")
         
@@ -68,7 +184,7 @@ class AgentPipeline:
         )
         
         try:
-            new_query = self.llm.complete(prompt).strip()
+            new_query = (await self.llm.acomplete(prompt, purpose="rewrite")).strip()
             logger.info(f"Rewritten query: {new_query}")
         except Exception as e:
             logger.error(f"Rewriting failed: {e}")
@@ -76,7 +192,8 @@ class AgentPipeline:
             
         return {"query": new_query}
 
-    def _direct_answer(self, state: AgentState):
+    async def _direct_answer(self, state: AgentState):
+        _emit("stage", {"stage": "generating"})
         query = state["query"]
         history = state.get("history", [])
         
@@ -90,25 +207,129 @@ class AgentPipeline:
         )
         
         try:
-            answer = self.llm.complete(prompt)
+            answer = await self._complete_streaming(prompt, purpose="direct_answer")
         except Exception as e:
             logger.error(f"Direct answer failed: {e}")
-            answer = "抱歉，生成回答时遇到错误。"
+            answer = _ERROR_ANSWER
             
         return {"answer": answer, "sources": []}
 
-    def _retrieve(self, state: AgentState):
+    async def _retrieve(self, state: AgentState):
+        _emit("stage", {"stage": "retrieving"})
         query = state["query"]
         logger.info(f"Retrieving for query: {query}")
+        ctx = _run_ctx.get()
+        if ctx is not None and ctx.speculative is not None and state.get("retrieve_count", 0) == 0:
+            task, ctx.speculative = ctx.speculative, None
+            speculated = await self._use_speculation(task, query)
+            if speculated is not None:
+                return {"context": speculated}
+        variants = state.get("query_variants") or []
+        if variants:
+            return {"context": await self._multi_search(query, variants)}
         # Retrieve documents
         try:
-            retrieved = self.vs.query(query, top_k=_settings.retrieval_top_k)
+            retrieved = await self._search(query)
         except Exception as e:
             logger.error(f"Retrieval failed: {e}")
             retrieved = []
         return {"context": retrieved}
 
-    def _evaluate_relevance(self, state: AgentState):
+    async def _search(self, query: str) -> List[Dict]:
+        ctx = _run_ctx.get()
+        mode = ctx.retrieval_mode if ctx is not None else None
+        top_k = _settings.retrieval_top_k
+        fetch_k = top_k * max(1, _settings.rerank_overfetch) if self.reranker is not None else top_k
+        items, stats = await self.vs.aquery_with_stats(query, top_k=fetch_k, mode=mode)
+        if self.reranker is not None:
+            start = time.perf_counter()
+            items = self.reranker.rerank(query, items, top_k)
+            stats["rerank_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        logger.info(f"Retrieval stats: {stats}")
+        if ctx is not None:
+            ctx.retrieval_stats.append(stats)
+        return items
+
+    async def _multi_search(self, query: str, variants: List[str]) -> List[Dict]:
+        """Retrieve for ``query`` and its rewrites concurrently and fuse them into one deduplicated list."""
+        queries = [query] + variants
+        results = await asyncio.gather(*(self._search(q) for q in queries), return_exceptions=True)
+        lists = []
+        for q, result in zip(queries, results):
+            if isinstance(result, Exception):
+                logger.error(f"Retrieval failed for {q!r}: {result}")
+                self.multi_query_stats["failed_legs"] += 1
+            else:
+                lists.append(result)
+        fused = fuse_results(lists, _settings.retrieval_top_k, method="rrf", rrf_k=_settings.hybrid_rrf_k)
+        self.multi_query_stats["fanouts"] += 1
+        self.multi_query_stats["queries"] += len(queries)
+        self.multi_query_stats["candidates"] += sum(len(items) for items in lists)
+        self.multi_query_stats["results"] += len(fused)
+        return fused
+
+    def multi_query_report(self) -> Dict:
+        stats = self.multi_query_stats
+        fanouts = stats["fanouts"]
+        return {
+            "enabled": self.multi_query,
+            "fanouts": fanouts,
+            "avg_queries": round(stats["queries"] / fanouts, 2) if fanouts else 0.0,
+            # 融合前后的结果数之比，反映各改写检索结果的重叠程度
+            "dedup_ratio": round(1 - stats["results"] / stats["candidates"], 3) if stats["candidates"] else 0.0,
+            "failed_legs": stats["failed_legs"],
+        }
+
+    async def _speculate(self, query: str) -> Tuple[List[Dict], Optional[List[float]]]:
+        """Retrieve for the raw query while routing/rewriting are still in flight."""
+        try:
+            vector = await self.vs.aembed_query(query)
+        except Exception:
+            vector = None
+        return await self._search(query), vector
+
+    async def _use_speculation(self, task: asyncio.Task, query: str) -> Optional[List[Dict]]:
+        """Reuse or merge speculative results for the rewritten ``query``.
+
+        Returns ``None`` when the speculative retrieval failed, in which case
+        the caller retrieves normally.
+        """
+        try:
+            docs, spec_vec = await task
+        except Exception as e:
+            logger.warning(f"Speculative retrieval failed: {e}")
+            self.speculation_stats["failed"] += 1
+            return None
+        similarity = 0.0
+        if spec_vec is not None:
+            try:
+                similarity = _cosine(spec_vec, await self.vs.aembed_query(query))
+            except Exception as e:
+                logger.debug(f"Speculative similarity unavailable: {e}")
+        if similarity >= _settings.speculative_reuse_similarity:
+            logger.info(f"Reusing speculative retrieval (similarity {similarity:.3f})")
+            self.speculation_stats["reused"] += 1
+            return docs
+        try:
+            fresh = await self._search(query)
+        except Exception as e:
+            # 改写后的检索失败时退回推测检索的结果，而不是让整个请求失败
+            logger.error(f"Retrieval failed, using speculative results: {e}")
+            self.speculation_stats["fallback"] += 1
+            return docs
+        seen = {d["text"] for d in fresh}
+        merged = fresh + [d for d in docs if d["text"] not in seen]
+        self.speculation_stats["merged"] += 1
+        return merged[:_settings.retrieval_top_k]
+
+    def speculation_report(self) -> Dict:
+        stats = dict(self.speculation_stats)
+        settled = stats["reused"] + stats["merged"] + stats["fallback"] + stats["discarded"] + stats["failed"]
+        stats["hit_rate"] = round(stats["reused"] / settled, 4) if settled else 0.0
+        return stats
+
+    async def _evaluate_relevance(self, state: AgentState):
+        _emit("stage", {"stage": "evaluating_relevance"})
         query = state["query"]
         context_docs = state["context"]
         
@@ -116,6 +337,13 @@ class AgentPipeline:
             logger.info("No context docs to evaluate.")
             return {"is_relevant": False}
 
+        if self.relevance_gate is not None:
+            verdict, reason = self.relevance_gate.judge(query, context_docs)
+            if verdict != UNCERTAIN:
+                logger.info(f"Relevance gate: {verdict} ({reason})")
+                return {"is_relevant": verdict == RELEVANT}
+            logger.info(f"Relevance gate uncertain ({reason}), escalating to LLM")
+
         # Use LLM to evaluate relevance
         context_text = "\n".join([f"- {r['text'][:200]}..." for r in context_docs[:3]]) # Check top 3
         prompt = (
@@ -128,8 +356,8 @@ class AgentPipeline:
         )
         
         try:
-            result = self.llm.complete(prompt).strip().lower()
-            is_relevant = "relevant" in result and "irrelevant" not in result
+            is_relevant, _ = await self._classify(prompt, "relevance", parse_relevance)
+            is_relevant = bool(is_relevant)
         except Exception as e:
             logger.error(f"Relevance evaluation failed: {e}")
             is_relevant = True # Default to relevant to avoid loop
@@ -137,11 +365,15 @@ class AgentPipeline:
         logger.info(f"Relevance evaluation: {is_relevant}")
         return {"is_relevant": is_relevant}
 
-    def _rewrite_relevance(self, state: AgentState):
+    async def _rewrite_relevance(self, state: AgentState):
+        _emit("stage", {"stage": "rewriting"})
         query = state["query"]
         retry_count = state.get("retrieve_count", 0) + 1
+        RETRIES.labels(kind="relevance").inc()
         logger.info(f"Rewriting for relevance (attempt {retry_count}): {query}")
-        
+        if self.multi_query:
+            return await self._expand_relevance(query, retry_count)
+
         prompt = (
             "你是一个搜索专家。用户的原始查询没有检索到相关文档。\n"
             "请重写查询以提高检索相关性。你可以：\n"
@@ -154,7 +386,7 @@ class AgentPipeline:
         )
         
         try:
-            new_query = self.llm.complete(prompt).strip()
+            new_query = (await self.llm.acomplete(prompt, purpose="rewrite_relevance")).strip()
             logger.info(f"Expanded query: {new_query}")
         except Exception as e:
             logger.error(f"Relevance rewrite failed: {e}")
@@ -162,9 +394,45 @@ class AgentPipeline:
             
         return {"query": new_query, "retrieve_count": retry_count}
 
-    def _evaluate_compliance(self, state: AgentState):
+    async def _expand_relevance(self, query: str, retry_count: int):
+        # 一次调用生成多个改写，由 _retrieve 并发检索后融合；查询本身保持不变，供评估与生成使用
+        n = _settings.multi_query_count
+        prompt = (
+            "你是一个搜索专家。用户的原始查询没有检索到相关文档。\n"
+            f"请从不同角度给出 {n} 个重写后的查询以提高检索相关性，可以：\n"
+            "1. 使用同义词替换\n"
+            "2. 补充领域术语\n"
+            "3. 展开缩写\n"
+            f"原始查询：{query}\n\n"
+            "如果查询过短（少于4个字），请尝试添加上下文约束。\n"
+            "每行输出一个查询，不要包含编号或解释。"
+        )
+        try:
+            reply = await self.llm.acomplete(prompt, purpose="rewrite_relevance")
+            variants = [] if self.llm.is_degraded(reply) else parse_query_variants(reply, query, n)
+            logger.info(f"Query variants: {variants}")
+        except Exception as e:
+            logger.error(f"Relevance rewrite failed: {e}")
+            variants = []
+        return {"query_variants": variants, "retrieve_count": retry_count}
+
+    async def _evaluate_compliance(self, state: AgentState):
+        _emit("stage", {"stage": "checking_compliance"})
         answer = state["answer"]
-        
+        update: Dict[str, Any] = {}
+
+        if self.compliance_screen is not None:
+            screened = self.compliance_screen.screen(answer)
+            update["compliance_screen"] = screened.verdict
+            if screened.redactions:
+                logger.info(f"Compliance screen redacted PII: {screened.redactions}")
+                answer = update["answer"] = screened.text
+            # 修订后的回答仍交给 LLM 复核，不因本地预筛直接放行
+            if screened.verdict != SUSPICIOUS and not state.get("generate_count"):
+                return {**update, "compliance_issues": []}
+            if screened.terms:
+                logger.info(f"Compliance screen matched {screened.terms}, escalating to LLM")
+
         prompt = (
             "你是一个内容合规审核员。请检查以下回答是否符合安全规范。\n"
             "检查维度：\n"
@@ -178,24 +446,24 @@ class AgentPipeline:
         )
         
         try:
-            result = self.llm.complete(prompt).strip()
-            if "compliant" in result.lower() and "non-compliant" not in result.lower() and "violation" not in result.lower():
-                return {"compliance_issues": []}
-            else:
-                # Extract issues
-                issues = [s.strip() for s in result.replace("violation:", "").split(";") if s.strip()]
-                if not issues: issues = ["Unknown compliance issue"]
+            issues, result = await self._classify(prompt, "compliance", parse_compliance)
+            if issues is None:
+                # 无法识别结论时按违规处理，整段输出作为问题描述
+                issues = [s.strip() for s in result.split(";") if s.strip()] or ["Unknown compliance issue"]
+            if issues:
                 logger.info(f"Compliance issues found: {issues}")
-                return {"compliance_issues": issues}
+            return {**update, "compliance_issues": issues}
         except Exception as e:
             logger.error(f"Compliance evaluation failed: {e}")
-            return {"compliance_issues": []} # Default to pass on error
+            return {**update, "compliance_issues": []} # Default to pass on error
 
-    def _fix_generation(self, state: AgentState):
+    async def _fix_generation(self, state: AgentState):
+        _emit("stage", {"stage": "revising"})
         answer = state["answer"]
         issues = state.get("compliance_issues", [])
         retry_count = state.get("generate_count", 0) + 1
-        
+        RETRIES.labels(kind="compliance").inc()
+
         prompt = (
             f"上一版回答因以下原因未通过审核：{'; '.join(issues)}。\n"
             "请修改回答，删除敏感表述，补充缺失信息，并控制字数在 300 字以内。\n"
@@ -204,73 +472,137 @@ class AgentPipeline:
         )
         
         try:
-            new_answer = self.llm.complete(prompt)
+            new_answer = await self.llm.acomplete(prompt, purpose="fix")
         except Exception as e:
             logger.error(f"Fix generation failed: {e}")
             new_answer = answer
             
         return {"answer": new_answer, "generate_count": retry_count}
 
-    def _fallback_safe(self, state: AgentState):
+    async def _classify(self, prompt: str, purpose: str, parse: Callable[[str], Any]) -> Tuple[Any, str]:
+        """Ask the model tier configured for ``purpose`` and parse the reply.
+
+        When a small-model reply cannot be parsed (``parse`` returns ``None``)
+        and escalation is enabled, the prompt is retried once on the large
+        model. Returns the parsed value (possibly ``None``) and the raw reply.
+        """
+        tier = self.llm.tier_for(purpose)
+        raw = (await self.llm.acomplete(prompt, purpose=purpose)).strip()
+        value = parse(raw)
+        if tier != SMALL:
+            return value, raw
+        self.cascade_stats[f"{purpose}_small"] += 1
+        if value is None and _settings.llm_cascade_escalate and not self.llm.is_degraded(raw):
+            logger.info(f"Unparseable {purpose} reply from small model ({raw[:50]!r}), escalating")
+            self.cascade_stats[f"{purpose}_escalated"] += 1
+            LLM_CALLS.labels(purpose=purpose, outcome="escalated").inc()
+            raw = (await self.llm.acomplete(prompt, purpose=purpose, tier=LARGE)).strip()
+            value = parse(raw)
+        return value, raw
+
+    def cascade_report(self) -> Dict:
+        report = {}
+        for purpose in sorted(self.llm.small_purposes):
+            small = self.cascade_stats[f"{purpose}_small"]
+            escalated = self.cascade_stats[f"{purpose}_escalated"]
+            report[purpose] = {
+                "small_calls": small,
+                "escalated": escalated,
+                "escalation_rate": round(escalated / small, 4) if small else 0.0,
+            }
+        return report
+
+    async def _fallback_safe(self, state: AgentState):
         logger.warning("Max generation retries reached. Falling back to safe response.")
-        return {"answer": "抱歉，无法提供该信息。"}
+        return {"answer": _SAFE_ANSWER}
 
-    def _knowledge_fallback(self, state: AgentState):
+    async def _knowledge_fallback(self, state: AgentState):
         query = state["query"]
         logger.warning(f"Knowledge base missing for query: {query}")
         return {"answer": "抱歉，知识库中未找到相关信息，无法回答您的问题。", "sources": []}
 
-    def _generate(self, state: AgentState):
+    async def _generate(self, state: AgentState):
+        _emit("stage", {"stage": "generating"})
         query = state["query"]
         context_docs = state["context"]
         history = state.get("history", [])
-        
+
+        # 按 max_context_tokens 分配历史与上下文预算
+        instructions = _GENERATE_TEMPLATE.format(history="", context="", query=query)
+        packed = self.packer.pack(query, context_docs, history, instructions)
+        packing = packed.report()
+        logger.info(f"Context packing: {packing}")
+        _emit("stage", {"stage": "packed", **packing})
+
         # Format context
-        if context_docs:
-            context_str = "\n\n".join([f"- {r['text']}" for r in context_docs])
+        if packed.passages:
+            context_str = "\n\n".join([f"- {r['text']}" for r in packed.passages])
         else:
             context_str = "无检索结果。"
-        
-        # Format history (last 4 messages)
-        history_str = "\n".join([f"{m['role']}: {m['content']}" for m in history[-4:]])
-        
-        prompt = (
-            "你是一个帮助用户检索与总结文档的智能助手。"
-            f"\n对话历史：\n{history_str}\n"
-            f"\n检索到的上下文：\n{context_str}\n"
-            f"\n用户问题：{query}\n"
-            "要求：优先使用上下文，无法回答时明确说明。"
-        )
+        history_str = "\n".join([f"{m['role']}: {m['content']}" for m in packed.history])
+        prompt = _GENERATE_TEMPLATE.format(history=history_str, context=context_str, query=query)
         
         try:
-            answer = self.llm.complete(prompt)
+            answer = await self._complete_streaming(prompt, purpose="generate")
         except Exception as e:
             logger.error(f"Generation failed: {e}")
-            answer = "抱歉，生成回答时遇到错误。"
+            answer = _ERROR_ANSWER
             
-        sources = [r["source"] for r in context_docs] if context_docs else []
-        return {"answer": answer, "sources": sources}
+        # 多个分块可能来自同一文件，按出现顺序去重
+        # 只引用实际放入提示词的段落，被打包器丢弃的文档不计入来源
+        sources = list(dict.fromkeys(r["source"] for r in packed.passages))
+        return {"answer": answer, "sources": sources, "packing": packing}
+
+    async def _complete_streaming(self, prompt: str, purpose: str = "generate") -> str:
+        """Complete ``prompt``, emitting token events when a stream consumer is attached."""
+        ctx = _run_ctx.get()
+        if ctx is None or ctx.events is None:
+            return await self.llm.acomplete(prompt, purpose=purpose)
+        # 生成的回答要经过合规审查：先过流式筛查再发给客户端
+        screen = self.compliance_screen.stream() if purpose == "generate" and self.compliance_screen else None
+        parts = []
+        async for token in self.llm.astream(prompt, purpose=purpose):
+            if token:
+                parts.append(token)
+                self._emit_token(ctx, screen.feed(token) if screen else token)
+        if screen is not None:
+            self._emit_token(ctx, screen.flush())
+        return "".join(parts)
+
+    @staticmethod
+    def _emit_token(ctx: _RunContext, text: str):
+        if text:
+            ctx.streamed.append(text)
+            _emit("token", {"text": text})
 
     def _route_decision(self, state: AgentState):
         return state.get("decision", "direct")
 
+    @staticmethod
+    def _node(name: str, fn):
+        share = 1.0 if name in _ANSWER_NODES else _settings.node_budget_share
+        return timed_node(name, budgeted_node(fn, share))
+
     def _build_graph(self):
         """Build the LangGraph workflow"""
+        # langgraph 导入耗时较长，推迟到首次构建管道（启动预热）时
+        from langgraph.graph import StateGraph, END
+
         # Define the graph
         workflow = StateGraph(AgentState)
-        workflow.add_node("router", self._router)
-        workflow.add_node("rewrite", self._rewrite)
-        workflow.add_node("direct_answer", self._direct_answer)
-        workflow.add_node("retrieve", self._retrieve)
-        workflow.add_node("generate", self._generate)
+        workflow.add_node("router", self._node("router", self._router))
+        workflow.add_node("rewrite", self._node("rewrite", self._rewrite))
+        workflow.add_node("direct_answer", self._node("direct_answer", self._direct_answer))
+        workflow.add_node("retrieve", self._node("retrieve", self._retrieve))
+        workflow.add_node("generate", self._node("generate", self._generate))
         
         # New nodes
-        workflow.add_node("evaluate_relevance", self._evaluate_relevance)
-        workflow.add_node("rewrite_relevance", self._rewrite_relevance)
-        workflow.add_node("evaluate_compliance", self._evaluate_compliance)
-        workflow.add_node("fix_generation", self._fix_generation)
-        workflow.add_node("fallback_safe", self._fallback_safe)
-        workflow.add_node("knowledge_fallback", self._knowledge_fallback)
+        workflow.add_node("evaluate_relevance", self._node("evaluate_relevance", self._evaluate_relevance))
+        workflow.add_node("rewrite_relevance", self._node("rewrite_relevance", self._rewrite_relevance))
+        workflow.add_node("evaluate_compliance", self._node("evaluate_compliance", self._evaluate_compliance))
+        workflow.add_node("fix_generation", self._node("fix_generation", self._fix_generation))
+        workflow.add_node("fallback_safe", self._node("fallback_safe", self._fallback_safe))
+        workflow.add_node("knowledge_fallback", self._node("knowledge_fallback", self._knowledge_fallback))
         
         # Define edges
         workflow.set_entry_point("router")
@@ -290,7 +622,8 @@ class AgentPipeline:
         def check_relevance(state: AgentState):
             if state.get("is_relevant", False):
                 return "generate"
-            elif state.get("retrieve_count", 0) < 2:
+            # 多查询模式一次并发扇出即覆盖多轮串行改写，不再重复
+            elif state.get("retrieve_count", 0) < (1 if self.multi_query else 2):
                 return "rewrite_relevance"
             else:
                 return "knowledge_fallback"
@@ -334,8 +667,87 @@ class AgentPipeline:
         
         return workflow.compile()
 
+    async def _cache_lookup(self, query: str, scope: str):
+        """Return (cached result, query vector, cache generation)."""
+        cache = get_answer_cache()
+        if cache is None:
+            return None, None, None
+        generation = cache.generation
+        try:
+            vector = await self.vs.aembed_query(query) if cache.similarity > 0 else None
+        except Exception as e:
+            logger.debug(f"Answer cache embedding unavailable: {e}")
+            vector = None
+        try:
+            return cache.get(query, vector, scope), vector, generation
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None, None, generation
+
+    def _cacheable(self, result: Dict) -> bool:
+        answer = result.get("answer", "")
+        if not answer or result.get("compliance_issues"):
+            return False
+        if answer in (_ERROR_ANSWER, _SAFE_ANSWER):
+            return False
+        return not self.llm.is_degraded(answer)
+
     def run(self, query: str, session) -> Dict:
-        """Execute the agent workflow"""
+        """Synchronous wrapper around :meth:`arun` for scripts and tests."""
+        return asyncio.run(self.arun(query, session))
+
+    async def astream(self, query: str, session, retrieval_mode: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """Run the workflow, yielding ``(event, data)`` pairs as it progresses.
+
+        Emits ``stage`` events when graph nodes start, ``token`` events for
+        answer generation, a ``replace`` event when the screened answer differs
+        from the streamed tokens, and a closing ``final`` event with the full result.
+        """
+        start = time.time()
+        queue: asyncio.Queue = asyncio.Queue()
+        ctx = _RunContext(events=queue)
+        token = _run_ctx.set(ctx)
+        try:
+            task = asyncio.create_task(self.arun(query, session, retrieval_mode=retrieval_mode))
+        finally:
+            _run_ctx.reset(token)
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+            result = task.result()
+            if ctx.streamed and "".join(ctx.streamed) != result.get("answer"):
+                yield "replace", {"text": result.get("answer", "")}
+            yield "final", {**result, "latency_ms": int((time.time() - start) * 1000)}
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def arun(self, query: str, session, retrieval_mode: Optional[str] = None) -> Dict:
+        """Execute the agent workflow within the request budget (``REQUEST_BUDGET_SECONDS``)."""
+        with deadline_scope(_settings.request_budget_seconds):
+            return await self._arun(query, session, retrieval_mode)
+
+    async def _arun(self, query: str, session, retrieval_mode: Optional[str]) -> Dict:
+        # 缓存按检索模式区分；多轮对话的回答依赖历史，不读写缓存
+        scope = retrieval_mode or _settings.retrieval_mode
+        use_cache = not session.history
+        cached, query_vec, generation = await self._cache_lookup(query, scope) if use_cache else (None, None, None)
+        if cached:
+            session.history.append({"role": "user", "content": query})
+            session.history.append({"role": "assistant", "content": cached["answer"]})
+            return {"answer": cached["answer"], "sources": cached["sources"], "cached": True, "compliance": "cached"}
+
+        ctx = _run_ctx.get() or _RunContext()
+        ctx.retrieval_mode = retrieval_mode
+        token = _run_ctx.set(ctx)
+        if _settings.speculative_retrieval_enabled:
+            ctx.speculative = asyncio.create_task(self._speculate(query))
+            self.speculation_stats["launched"] += 1
+
         # Prepare initial state
         initial_state = {
             "query": query,
@@ -348,7 +760,7 @@ class AgentPipeline:
         
         # Run the graph
         try:
-            result = self.app.invoke(initial_state)
+            result = await self.app.ainvoke(initial_state)
             
             # Extract results
             answer = result.get("answer", "")
@@ -357,19 +769,68 @@ class AgentPipeline:
             # Update session history
             session.history.append({"role": "user", "content": query})
             session.history.append({"role": "assistant", "content": answer})
+
+            if generation is not None and self._cacheable(result):
+                get_answer_cache().put(query, answer, sources, query_vec, generation, scope)
             
             return {
                 "answer": answer,
-                "sources": sources
+                "sources": sources,
+                "compliance": _compliance_verdict(result),
+                "retrieval": ctx.retrieval_stats,
+                "packing": result.get("packing"),
             }
         except Exception as e:
             logger.error(f"Pipeline execution failed: {e}")
             raise e
+        finally:
+            # 路由为 direct（或执行异常）时未被消费的推测检索直接丢弃
+            if ctx.speculative is not None:
+                ctx.speculative.cancel()
+                ctx.speculative = None
+                self.speculation_stats["discarded"] += 1
+            _run_ctx.reset(token)
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    va = np.asarray(a, dtype=np.float32)
+    vb = np.asarray(b, dtype=np.float32)
+    denom = float(np.linalg.norm(va) * np.linalg.norm(vb))
+    return float(va @ vb) / denom if denom else 0.0
+
+
+def _compliance_verdict(result: Dict) -> str:
+    if result.get("answer") == _SAFE_ANSWER:
+        return "blocked"
+    if result.get("generate_count", 0) > 0:
+        return "revised"
+    if result.get("compliance_screen") == "redacted":
+        return "redacted"
+    if result.get("decision") == "rewrite" and result.get("is_relevant"):
+        return "pass"
+    # 直答与知识库兜底路径不经过合规审核
+    return "unchecked"
+
+
+def pipeline_stats() -> Optional[Dict]:
+    """Runtime counters of the shared pipeline, if it has been created."""
+    if _agent is None:
+        return None
+    return {
+        "speculative_retrieval": _agent.speculation_report(),
+        "local_router": _agent.local_router.stats() if _agent.local_router else None,
+        "relevance_gate": _agent.relevance_gate.stats() if _agent.relevance_gate else None,
+        "compliance_screen": _agent.compliance_screen.stats() if _agent.compliance_screen else None,
+        "context_packer": _agent.packer.stats(),
+        "reranker": _agent.reranker.stats() if _agent.reranker else None,
+        "multi_query": _agent.multi_query_report(),
+        "model_cascade": _agent.cascade_report(),
+    }
+
 
 def get_agent_pipeline() -> AgentPipeline:
     global _agent
     if _agent:
         return _agent
-    llm = SiliconCloudLLM(_settings)
-    _agent = AgentPipeline(llm)
+    _agent = AgentPipeline(get_llm())
     return _agent
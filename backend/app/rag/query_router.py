@@ -0,0 +1,228 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from ..config import Settings, get_settings
+from .answer_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+_router = None
+
+DECISIONS = ("direct", "rewrite")
+
+_GREETING_RE = re.compile(
+    r"^(你好|您好|hi|hello|hey|嗨|哈喽|早上好|中午好|下午好|晚上好|早安|晚安|谢谢|多谢|感谢|再见|拜拜|在吗|在不在"
+    r"|你是谁|你叫什么|你叫什么名字|你能做什么|你会什么|介绍一下你自己|ok|好的|嗯|哦)"
+    r"[\s,，!！。.?？~～呀啊呢吧]*$"
+)
+_ARITHMETIC_RE = re.compile(r"^[\d\s.+\-*/×÷()（）=^%]+(等于几|等于多少|是多少|是几|=)?[?？]*$")
+_KNOWLEDGE_CUES = (
+    "文档", "资料", "知识库", "上传", "文件", "报告", "手册", "政策", "规定", "条款", "标准", "规范",
+    "参数", "型号", "规格", "合规", "根据", "文中", "材料", "方案", "措施", "数据", "统计",
+)
+
+
+def _ngrams(text: str, n_max: int = 3) -> List[str]:
+    text = f"^{text}$"
+    return [text[i:i + n] for n in range(1, n_max + 1) for i in range(len(text) - n + 1)]
+
+
+class LocalQueryRouter:
+    """Cheap local tier in front of the routing LLM call.
+
+    Rules catch greetings, arithmetic and obvious knowledge-base questions;
+    everything else goes through a character n-gram naive Bayes model trained
+    on decisions previously made by the LLM router. ``classify`` returns a
+    decision only when the confidence reaches ``threshold``. Once the decision
+    log exceeds ``log_max_lines`` it is rewritten with the newest half.
+    """
+
+    def __init__(self, threshold: float = 0.9, log_path: str = "", min_samples: int = 20,
+                 log_max_lines: int = 10000):
+        self.threshold = threshold
+        self.log_path = log_path
+        self.min_samples = min_samples
+        self.log_max_lines = max(2, log_max_lines)
+        self._log_lines = 0
+        self._lock = threading.Lock()
+        # 日志文件单独加锁，写盘/压缩期间不阻塞分类与训练
+        self._log_lock = threading.Lock()
+        self._class_counts: Counter = Counter()
+        self._gram_counts: Dict[str, Counter] = {d: Counter() for d in DECISIONS}
+        self._gram_totals: Counter = Counter()
+        self._vocab: set = set()
+        self._stats = Counter()
+        if log_path and os.path.exists(log_path):
+            samples = _read_jsonl(log_path)
+            self.train(samples)
+            self._log_lines = len(samples)
+            if self._log_lines > self.log_max_lines:
+                with self._log_lock:
+                    self._compact_log()
+
+    def classify(self, query: str) -> Tuple[Optional[str], float, str]:
+        """Return ``(decision, confidence, tier)``; decision is ``None`` when unsure."""
+        decision, confidence, tier = self.predict(query)
+        if decision is not None and confidence >= self.threshold:
+            self._stats[f"{tier}_decisions"] += 1
+            return decision, confidence, tier
+        return None, confidence, tier
+
+    def predict(self, query: str) -> Tuple[Optional[str], float, str]:
+        q = normalize_query(query)
+        if not q:
+            return "direct", 1.0, "rule"
+        if _GREETING_RE.match(q):
+            return "direct", 0.99, "rule"
+        if _ARITHMETIC_RE.match(q) and re.search(r"\d", q):
+            return "direct", 0.97, "rule"
+        if any(cue in q for cue in _KNOWLEDGE_CUES):
+            return "rewrite", 0.95, "rule"
+        return self._predict_model(q)
+
+    def record(self, query: str, decision: str):
+        """Learn from an LLM routing decision and append it to the log."""
+        if self._learn(query, decision):
+            self._append(query, decision)
+
+    async def arecord(self, query: str, decision: str):
+        """Like ``record``, with the log file I/O in a worker thread."""
+        if self._learn(query, decision):
+            await asyncio.to_thread(self._append, query, decision)
+
+    def _learn(self, query: str, decision: str) -> bool:
+        if decision not in DECISIONS:
+            return False
+        self._stats["llm_decisions"] += 1
+        self.train([{"query": query, "decision": decision}])
+        return bool(self.log_path)
+
+    def _append(self, query: str, decision: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with self._log_lock:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"query": query, "decision": decision}, ensure_ascii=False) + "\n")
+                self._log_lines += 1
+                if self._log_lines > self.log_max_lines:
+                    self._compact_log()
+        except Exception as e:
+            logger.warning(f"failed to log routing decision: {e}")
+
+    def train(self, samples: Iterable[Dict]):
+        with self._lock:
+            for s in samples:
+                decision = s.get("decision")
+                if decision not in DECISIONS:
+                    continue
+                grams = _ngrams(normalize_query(s.get("query", "")))
+                self._class_counts[decision] += 1
+                self._gram_counts[decision].update(grams)
+                self._gram_totals[decision] += len(grams)
+                self._vocab.update(grams)
+
+    def evaluate(self, samples: Iterable[Dict]) -> Dict:
+        """Offline evaluation against labeled ``{"query", "decision"}`` samples."""
+        total = confident = confident_correct = correct = 0
+        for s in samples:
+            if s.get("decision") not in DECISIONS:
+                continue
+            total += 1
+            decision, confidence, _ = self.predict(s["query"])
+            correct += decision == s["decision"]
+            if decision is not None and confidence >= self.threshold:
+                confident += 1
+                confident_correct += decision == s["decision"]
+        return {
+            "samples": total,
+            "accuracy": round(correct / total, 4) if total else 0.0,
+            "coverage": round(confident / total, 4) if total else 0.0,
+            "confident_accuracy": round(confident_correct / confident, 4) if confident else 0.0,
+            "threshold": self.threshold,
+        }
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats["llm_calls_avoided"] = stats.get("rule_decisions", 0) + stats.get("model_decisions", 0)
+        stats["training_samples"] = sum(self._class_counts.values())
+        return stats
+
+    def _compact_log(self):
+        # 保留最新的一半，避免每次追加都重写文件；模型已在内存中学过全部样本
+        samples = _read_jsonl(self.log_path)[-(self.log_max_lines // 2):]
+        tmp_path = self.log_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for sample in samples:
+                f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.log_path)
+        self._log_lines = len(samples)
+        self._stats["log_compactions"] += 1
+
+    def _predict_model(self, q: str) -> Tuple[Optional[str], float, str]:
+        if min(self._class_counts[d] for d in DECISIONS) < self.min_samples:
+            return None, 0.0, "model"
+        grams = _ngrams(q)
+        total_docs = sum(self._class_counts.values())
+        vocab = len(self._vocab) + 1
+        scores = {}
+        for d in DECISIONS:
+            counts, denom = self._gram_counts[d], self._gram_totals[d] + vocab
+            score = math.log(self._class_counts[d] / total_docs)
+            for g in grams:
+                score += math.log((counts[g] + 1) / denom)
+            scores[d] = score
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        confidence = 1.0 / sum(math.exp(v - top) for v in scores.values())
+        return best, confidence, "model"
+
+
+def _read_jsonl(path: str) -> List[Dict]:
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                samples.append(json.loads(line))
+            except ValueError:
+                continue
+    return samples
+
+
+def get_query_router() -> Optional[LocalQueryRouter]:
+    global _router
+    if _router:
+        return _router
+    settings = get_settings()
+    if not settings.local_router_enabled:
+        return None
+    _router = LocalQueryRouter(
+        threshold=settings.local_router_threshold,
+        log_path=settings.local_router_log_path,
+        min_samples=settings.local_router_min_samples,
+        log_max_lines=settings.local_router_log_max_lines,
+    )
+    return _router
+
+
+if __name__ == "__main__":
+    # 离线评估：python -m app.rag.query_router labeled.jsonl
+    if len(sys.argv) < 2:
+        print("usage: python -m app.rag.query_router LABELED.jsonl [TRAIN.jsonl]")
+        sys.exit(1)
+    _settings = Settings()
+    train_path = sys.argv[2] if len(sys.argv) > 2 else _settings.local_router_log_path
+    evaluator = LocalQueryRouter(
+        threshold=_settings.local_router_threshold,
+        log_path=train_path,
+        min_samples=_settings.local_router_min_samples,
+    )
+    print(json.dumps(evaluator.evaluate(_read_jsonl(sys.argv[1])), ensure_ascii=False, indent=2))
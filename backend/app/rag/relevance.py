@@ -0,0 +1,123 @@
+import json
+import sys
+from collections import Counter
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Tuple
+from ..config import Settings
+from .lexical import coverage
+
+RELEVANT, IRRELEVANT, UNCERTAIN = "relevant", "irrelevant", "uncertain"
+
+
+class RelevanceGate:
+    """Decide retrieval relevance from scores and lexical overlap.
+
+    Vector results are judged on the top similarity, its gap to the rest of
+    the list and query-term coverage of the top snippets; keyword-only
+    results on coverage alone. Anything in between the thresholds is
+    ``uncertain`` and should be escalated to the LLM judge.
+    """
+
+    def __init__(self, score_high: float = 0.75, score_low: float = 0.45, score_gap: float = 0.15,
+                 lexical_high: float = 0.6, lexical_low: float = 0.15, top_n: int = 3):
+        self.score_high = score_high
+        self.score_low = score_low
+        self.score_gap = score_gap
+        self.lexical_high = lexical_high
+        self.lexical_low = lexical_low
+        self.top_n = top_n
+        self._stats = Counter()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "RelevanceGate":
+        return cls(
+            score_high=settings.relevance_score_high,
+            score_low=settings.relevance_score_low,
+            score_gap=settings.relevance_score_gap,
+            lexical_high=settings.relevance_lexical_high,
+            lexical_low=settings.relevance_lexical_low,
+        )
+
+    def judge(self, query: str, docs: List[Dict]) -> Tuple[str, str]:
+        """Return ``(verdict, reason)`` and count the verdict."""
+        verdict, reason = self.decide(query, docs)
+        self._stats[verdict] += 1
+        return verdict, reason
+
+    def decide(self, query: str, docs: List[Dict]) -> Tuple[str, str]:
+        if not docs:
+            return IRRELEVANT, "no documents"
+        top = docs[:self.top_n]
+        lexical = coverage(query, (d.get("text", "") for d in top))
+        # 重排后列表不一定按向量分数有序
+        scores = sorted((d["score"] for d in docs if d.get("score_type") == "vector" and d.get("score") is not None),
+                        reverse=True)
+        if not scores:
+            if lexical >= self.lexical_high:
+                return RELEVANT, f"lexical {lexical:.2f}"
+            if lexical < self.lexical_low:
+                return IRRELEVANT, f"lexical {lexical:.2f}"
+            return UNCERTAIN, f"lexical {lexical:.2f}"
+        best = scores[0]
+        rest = scores[1:]
+        gap = best - sum(rest) / len(rest) if rest else 0.0
+        reason = f"score {best:.3f}, gap {gap:.3f}, lexical {lexical:.2f}"
+        if best >= self.score_high and lexical >= self.lexical_low:
+            return RELEVANT, reason
+        if best < self.score_low and lexical < self.lexical_high:
+            return IRRELEVANT, reason
+        if gap >= self.score_gap and best >= (self.score_low + self.score_high) / 2:
+            return RELEVANT, reason
+        if lexical >= self.lexical_high and best >= self.score_low:
+            return RELEVANT, reason
+        return UNCERTAIN, reason
+
+    def evaluate(self, samples: Iterable[Dict]) -> Dict:
+        """Score the gate on ``{"query", "docs", "relevant"}`` samples."""
+        total = decided = correct = 0
+        for s in samples:
+            total += 1
+            verdict, _ = self.decide(s["query"], s.get("docs", []))
+            if verdict == UNCERTAIN:
+                continue
+            decided += 1
+            correct += (verdict == RELEVANT) == bool(s["relevant"])
+        return {
+            "samples": total,
+            "escalation_rate": round(1 - decided / total, 4) if total else 0.0,
+            "decided_accuracy": round(correct / decided, 4) if decided else 0.0,
+        }
+
+    def stats(self) -> Dict:
+        stats = {k: self._stats.get(k, 0) for k in (RELEVANT, IRRELEVANT, UNCERTAIN)}
+        stats["llm_calls_avoided"] = stats[RELEVANT] + stats[IRRELEVANT]
+        return stats
+
+
+def calibrate(samples: List[Dict], min_accuracy: float = 0.95) -> Optional[Dict]:
+    """Grid-search score thresholds minimizing escalations at ``min_accuracy``."""
+    best = None
+    grid = [round(0.05 * i, 2) for i in range(4, 20)]
+    for low, high in product(grid, grid):
+        if low >= high:
+            continue
+        report = RelevanceGate(score_high=high, score_low=low).evaluate(samples)
+        if report["decided_accuracy"] < min_accuracy:
+            continue
+        if best is None or report["escalation_rate"] < best["escalation_rate"]:
+            best = {"score_low": low, "score_high": high, **report}
+    return best
+
+
+if __name__ == "__main__":
+    # 离线标定：python -m app.rag.relevance labeled.jsonl
+    if len(sys.argv) < 2:
+        print("usage: python -m app.rag.relevance LABELED.jsonl [MIN_ACCURACY]")
+        sys.exit(1)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        labeled = [json.loads(line) for line in f if line.strip()]
+    target = float(sys.argv[2]) if len(sys.argv) > 2 else 0.95
+    print(json.dumps({
+        "current": RelevanceGate.from_settings(Settings()).evaluate(labeled),
+        "calibrated": calibrate(labeled, target),
+    }, ensure_ascii=False, indent=2))
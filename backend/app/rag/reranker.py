@@ -0,0 +1,90 @@
+from collections import Counter
+from typing import Dict, List
+import numpy as np
+from ..config import Settings
+from .lexical import query_terms, terms
+
+
+class LexicalReranker:
+    """Rescore over-fetched retrieval candidates on CPU and keep the best ``top_k``.
+
+    Each candidate gets a weighted sum of its retriever rank prior, BM25
+    over the candidate set (character-bigram terms, see ``lexical.terms``)
+    and query-term coverage, all scaled to [0, 1]. Selection is greedy with
+    a penalty per already selected chunk from the same source, so one long
+    document cannot crowd out the others.
+    """
+
+    def __init__(self, weight_retrieval: float = 0.4, weight_bm25: float = 0.35, weight_coverage: float = 0.25,
+                 diversity_penalty: float = 0.1, k1: float = 1.5, b: float = 0.75):
+        self.weights = np.array([weight_retrieval, weight_bm25, weight_coverage], dtype=np.float32)
+        self.diversity_penalty = diversity_penalty
+        self.k1 = k1
+        self.b = b
+        self._stats = Counter()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "LexicalReranker":
+        return cls(
+            weight_retrieval=settings.rerank_weight_retrieval,
+            weight_bm25=settings.rerank_weight_bm25,
+            weight_coverage=settings.rerank_weight_coverage,
+            diversity_penalty=settings.rerank_diversity_penalty,
+        )
+
+    def features(self, query: str, docs: List[Dict]) -> np.ndarray:
+        """``(n, 3)`` matrix of rank prior, normalized BM25 and coverage per candidate."""
+        n = len(docs)
+        # 检索排名只作弱先验：从 1 线性降到约 0.5，避免压过词法证据
+        prior = 1.0 - np.arange(n, dtype=np.float32) / (2 * n)
+        q_terms = query_terms(query)
+        if not q_terms:
+            return np.stack([prior, np.zeros(n, np.float32), np.zeros(n, np.float32)], axis=1)
+        tf = np.zeros((n, len(q_terms)), dtype=np.float32)
+        lengths = np.zeros(n, dtype=np.float32)
+        for i, d in enumerate(docs):
+            counts = Counter(terms(d.get("text", "")))
+            lengths[i] = sum(counts.values())
+            tf[i] = [counts.get(t, 0) for t in q_terms]
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(float(lengths.mean()), 1.0))
+        bm25 = (idf * tf * (self.k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+        top = float(bm25.max())
+        bm25 = bm25 / top if top > 0 else bm25
+        coverage = (tf > 0).sum(axis=1) / len(q_terms)
+        return np.stack([prior, bm25, coverage.astype(np.float32)], axis=1)
+
+    def rerank(self, query: str, docs: List[Dict], top_k: int) -> List[Dict]:
+        self._stats["calls"] += 1
+        self._stats["candidates"] += len(docs)
+        if len(docs) <= 1:
+            return docs[:top_k]
+        scores = self.features(query, docs) @ self.weights
+        sources = [d.get("source") for d in docs]
+        chosen: List[int] = []
+        picked = Counter()
+        remaining = np.ones(len(docs), dtype=bool)
+        while len(chosen) < min(top_k, len(docs)):
+            penalty = np.array([picked[s] for s in sources], dtype=np.float32) * self.diversity_penalty
+            adjusted = np.where(remaining, scores - penalty, -np.inf)
+            best = int(adjusted.argmax())
+            chosen.append(best)
+            picked[sources[best]] += 1
+            remaining[best] = False
+        if not chosen:
+            return []
+        if chosen[0] != 0:
+            self._stats["top1_changed"] += 1
+        self._stats["promoted"] += sum(1 for i in chosen if i >= top_k)
+        return [{**docs[i], "rerank_score": round(float(scores[i]), 4)} for i in chosen]
+
+    def stats(self) -> Dict:
+        calls = self._stats["calls"]
+        return {
+            "calls": calls,
+            "avg_candidates": round(self._stats["candidates"] / calls, 2) if calls else 0.0,
+            "top1_changed": self._stats["top1_changed"],
+            # 原本排在 top_k 之外、经重排进入结果的候选数
+            "promoted": self._stats["promoted"],
+        }
@@ -1,133 +1,379 @@
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict
-from llama_index.core import Settings as LlamaSettings
-from ..config import Settings
-
-try:
-    import weaviate
-    from weaviate.auth import AuthApiKey
-    from weaviate.classes.config import Property, DataType, Configure
-except Exception:
-    try:
-        # Fallback for older versions or different structure
-        import weaviate
-        from weaviate.classes.init import AuthApiKey
-        from weaviate.classes.config import Property, DataType, Configure
-    except Exception:
-        weaviate = None
+import sys
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from ..config import Settings, get_settings
+from ..services.dispatch import MicroBatcher
+from .backends import EmbeddedBackend, VectorBackend
+from .embedding_cache import get_embedding_cache
+from .fusion import fuse_results
+from ..utils.metrics import EMBED_LATENCY, SEARCH_LATENCY, observe
+from ..utils.retry import call_upstream, call_upstream_sync
 
 logger = logging.getLogger(__name__)
 _vs = None
-_settings = Settings()
+_vs_retry_at = 0.0
+_vs_lock = threading.Lock()
+_reconnect_thread: Optional[threading.Thread] = None
+_settings = get_settings()
+_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "agenticrag/chunks")
+
+
+class EmbeddingError(RuntimeError):
+    """A batch of document embeddings could not be produced."""
+
+
+def chunk_id(source: str, text: str, embedded: bool = True) -> str:
+    """Deterministic chunk id: uuid5 over the source and a SHA-256 of the text.
+
+    Chunks stored without a vector (no embedding model configured) get a
+    distinct id, so the next ingest with a model re-embeds them and drops
+    the vectorless copies as stale.
+    """
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    name = f"{source}\n{digest}" if embedded else f"{source}\n{digest}\nunembedded"
+    return str(uuid.uuid5(_ID_NAMESPACE, name))
+
+
+async def _timed(coro: Awaitable, stats: Dict, key: str):
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        elapsed = time.perf_counter() - start
+        stats[key] = round(elapsed * 1000, 2)
+        SEARCH_LATENCY.labels(leg=key[:-len("_ms")]).observe(elapsed)
+
+
+def _embed_model():
+    # 直接读取已配置的模型，避免触发 LlamaIndex 默认 OpenAI 模型的解析；
+    # llama_index 尚未导入时不可能已配置模型，也无需为此导入它
+    llama = sys.modules.get("llama_index.core")
+    return getattr(llama.Settings, "_embed_model", None) if llama else None
+
+
+class IngestSession:
+    """Skip/delete bookkeeping for one incremental ingestion run.
+
+    :meth:`admit` assigns the chunk id and returns ``None`` for chunks that
+    are already stored (or repeated within the run); :meth:`finish` deletes
+    chunks of the touched sources that were not seen again, except for
+    sources marked :meth:`incomplete` (e.g. a batch failed to embed), whose
+    previous chunks are kept.
+    """
+
+    def __init__(self, backend: VectorBackend, embedded: bool = True):
+        self.backend = backend
+        self.embedded = embedded
+        self.existing: Dict[str, Set[str]] = {}
+        self.seen: Set[str] = set()
+        self.incomplete_sources: Set[str] = set()
+        self.report = {"inserted": 0, "skipped": 0, "deleted": 0, "sources": 0}
+
+    def load_source(self, source: str):
+        if source not in self.existing:
+            self.existing[source] = self.backend.ids_for_source(source)
+
+    def admit(self, d: Dict) -> Optional[Dict]:
+        source = d.get("source", "")
+        self.load_source(source)
+        oid = chunk_id(source, d["text"], self.embedded)
+        if oid in self.seen:
+            return None
+        self.seen.add(oid)
+        if oid in self.existing[source]:
+            self.report["skipped"] += 1
+            return None
+        return {**d, "id": oid}
+
+    def incomplete(self, source: str):
+        self.incomplete_sources.add(source)
+
+    def finish(self) -> Dict[str, int]:
+        for source, ids in self.existing.items():
+            if source in self.incomplete_sources:
+                continue
+            stale = ids - self.seen
+            if stale:
+                self.report["deleted"] += self.backend.delete_ids(stale)
+        self.report["sources"] = len(self.existing)
+        return self.report
 
 
 class VectorStore:
-    def __init__(self, client, class_name: str):
-        self.client = client
-        self.class_name = class_name
+    """Embeds text and delegates storage/search to a :class:`VectorBackend`."""
+
+    def __init__(self, backend: VectorBackend):
+        self.backend = backend
+        self.query_batcher = MicroBatcher(
+            self._aembed_batch, _settings.embed_microbatch_window_ms, _settings.embed_microbatch_max
+        )
 
     def recreate_schema(self):
-        if self.client is None:
-            return
+        self.backend.recreate()
+
+    def close(self):
+        self.backend.close()
+
+    def upsert_documents(self, docs: Iterable[Dict]) -> Dict[str, int]:
+        """Incrementally ingest chunk dicts, grouped by ``source``.
+
+        Each chunk gets a deterministic id from its source and content hash.
+        Chunks already stored under that id are skipped without embedding,
+        new ones are embedded and inserted in batches of ``embed_batch_size``,
+        and chunks of a re-ingested source that no longer appear are deleted.
+        Returns ``inserted``/``skipped``/``deleted``/``sources`` counts.
+        """
+        session = IngestSession(self.backend, embedded=self.can_embed)
+        if not self.backend.available:
+            return session.report
+        pending: List[Dict] = []
+        batch_size = max(1, _settings.embed_batch_size)
+        for d in docs:
+            d = session.admit(d)
+            if d is None:
+                continue
+            pending.append(d)
+            if len(pending) >= batch_size:
+                session.report["inserted"] += self.insert(pending, self.embed_texts([p["text"] for p in pending]))
+                pending = []
+        if pending:
+            session.report["inserted"] += self.insert(pending, self.embed_texts([p["text"] for p in pending]))
+        return session.finish()
+
+    def insert(self, group: List[Dict], vectors: List[List[float]]) -> int:
+        self.backend.insert(group, vectors)
+        return len(group)
+
+    def list_sources(self) -> Dict[str, int]:
+        return self.backend.list_sources() if self.backend.available else {}
+
+    def delete_source(self, source: str) -> int:
+        return self.backend.delete_source(source) if self.backend.available else 0
+
+    @property
+    def can_embed(self) -> bool:
+        return _embed_model() is not None
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed document chunks; ``[]`` when no embedding model is configured.
+
+        Raises :class:`EmbeddingError` when the model fails, so callers never
+        store chunks with missing vectors under their embedded id.
+        """
+        model = _embed_model()
+        if not model:
+            return []
+        with observe(EMBED_LATENCY, kind="document"):
+            vectors = self._embed_texts(model, texts)
+        if len(vectors) != len(texts):
+            raise EmbeddingError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+        return vectors
+
+    def _embed_texts(self, model, texts: List[str]) -> List[List[float]]:
         try:
-            if self.client.collections.exists(self.class_name):
-                self.client.collections.delete(self.class_name)
-            self.client.collections.create(
-                self.class_name,
-                # Use none for now if inference service is missing, or user needs to start docker compose
-                vectorizer_config=Configure.Vectorizer.none(),
-                properties=[
-                    Property(name="text", data_type=DataType.TEXT),
-                    Property(name="source", data_type=DataType.TEXT),
-                ],
-            )
+            def embed(batch: List[str]) -> List[List[float]]:
+                return call_upstream_sync("embeddings", lambda: model.get_text_embedding_batch(batch))
+
+            cache = get_embedding_cache()
+            if cache is None:
+                return embed(texts)
+            return cache.embed_texts(texts, embed)
         except Exception as e:
-            logger.warning(f"failed to recreate schema: {e}")
+            logger.error(f"Failed to generate embeddings: {e}")
+            raise EmbeddingError(str(e) or type(e).__name__) from e
 
-    def upsert_documents(self, docs: List[Dict]):
-        if self.client is None:
-            return
-        
-        # Generate embeddings if model is available
-        vectors = []
-        if LlamaSettings.embed_model:
+    def embed_query(self, query: str) -> List[float]:
+        model = _embed_model()
+        if not model:
+            raise RuntimeError("embedding model is not configured")
+        def embed(text: str) -> List[float]:
+            return call_upstream_sync("embeddings", lambda: model.get_query_embedding(text))
+
+        cache = get_embedding_cache()
+        with observe(EMBED_LATENCY, kind="query"):
+            if cache is None:
+                return embed(query)
+            return cache.embed_query(query, embed)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        model = _embed_model()
+        if not model:
+            raise RuntimeError("embedding model is not configured")
+        # 并发查询合并为批量调用；窗口为 0 时逐条请求
+        async def embed_fn(text: str) -> List[float]:
+            return await call_upstream(
+                "embeddings", lambda: model.aget_query_embedding(text), _settings.embed_timeout_seconds
+            )
+
+        if _settings.embed_microbatch_window_ms > 0:
+            embed_fn = self.query_batcher.submit
+        cache = get_embedding_cache()
+        with observe(EMBED_LATENCY, kind="query"):
+            if cache is None:
+                return await embed_fn(query)
+            return await cache.aembed_query(query, embed_fn)
+
+    async def _aembed_batch(self, queries: List[str]) -> List[List[float]]:
+        model = _embed_model()
+        if not model:
+            raise RuntimeError("embedding model is not configured")
+        return await call_upstream(
+            "embeddings", lambda: model.aget_text_embedding_batch(queries), _settings.embed_timeout_seconds
+        )
+
+    async def _asearch(self, fn: Callable[[], Awaitable[List[Dict]]]) -> List[Dict]:
+        # 远程 Weaviate 走熔断/超时/重试/对冲；进程内索引直接调用
+        if self.backend.name != "weaviate":
+            return await fn()
+        return await call_upstream("weaviate", fn, _settings.vector_search_timeout_seconds)
+
+    def query(self, query: str, top_k: int, mode: Optional[str] = None) -> List[Dict]:
+        if not self.backend.available:
+            return []
+        mode = mode or _settings.retrieval_mode
+        if mode == "bm25":
+            return self.backend.keyword_search(query, top_k)
+        if mode == "hybrid":
+            leg_k = top_k * max(1, _settings.hybrid_leg_multiplier)
             try:
-                texts = [d["text"] for d in docs]
-                # Use batch embedding generation
-                vectors = LlamaSettings.embed_model.get_text_embedding_batch(texts)
+                vector_items = self._vector_leg(query, leg_k)
             except Exception as e:
-                logger.error(f"Failed to generate embeddings: {e}")
-        
-        coll = self.client.collections.get(self.class_name)
-        # Use batch insertion for efficiency
-        with self.client.batch.dynamic() as batch:
-            for i, d in enumerate(docs):
-                vec = vectors[i] if i < len(vectors) else None
-                batch.add_object(
-                    properties={"text": d["text"], "source": d.get("source", "")},
-                    vector=vec,
-                    collection=self.class_name
-                )
-                # Fallback to single insert if batch fails? No, batch handles it usually.
-                # If using loop:
-                # coll.data.insert({"text": d["text"], "source": d.get("source", "")}, vector=vec)
-
-    def query(self, query: str, top_k: int) -> List[Dict]:
-        if self.client is None:
-            return []
-        coll = self.client.collections.get(self.class_name)
+                logger.warning(f"Hybrid vector leg failed: {e}")
+                vector_items = []
+            return self._fuse(vector_items, self.backend.keyword_search(query, leg_k), top_k)
         try:
-            if LlamaSettings.embed_model:
-                query_vec = LlamaSettings.embed_model.get_query_embedding(query)
-                res = coll.query.near_vector(near_vector=query_vec, limit=top_k)
-            else:
-                res = coll.query.near_text(query=query, limit=top_k)
+            return self._vector_leg(query, top_k)
         except Exception as e:
             # Fallback to BM25 if vector search failed
             logger.warning(f"Vector search failed, falling back to BM25: {e}")
-            res = coll.query.bm25(query=query, limit=top_k)
-            
-        items = []
-        for o in res.objects:
-            props = o.properties
-            items.append({"text": props.get("text", ""), "source": props.get("source", "")})
+            return self.backend.keyword_search(query, top_k)
+
+    async def aquery(self, query: str, top_k: int, mode: Optional[str] = None) -> List[Dict]:
+        """Async variant of :meth:`query`."""
+        items, _ = await self.aquery_with_stats(query, top_k, mode)
         return items
 
+    async def aquery_with_stats(self, query: str, top_k: int, mode: Optional[str] = None) -> Tuple[List[Dict], Dict]:
+        """Search and also return per-leg latencies in milliseconds.
 
-def get_vector_store() -> VectorStore:
-    global _vs
-    if _vs:
-        return _vs
-    client = None
-    if weaviate:
+        ``mode`` is ``vector``, ``bm25`` or ``hybrid``; hybrid issues both legs
+        concurrently and fuses them (see :func:`~app.rag.fusion.fuse_results`).
+        """
+        mode = mode or _settings.retrieval_mode
+        stats: Dict = {"mode": mode}
+        if not self.backend.available:
+            return [], stats
+        if mode == "bm25":
+            return await _timed(self._akeyword_leg(query, top_k), stats, "bm25_ms"), stats
+        if mode == "hybrid":
+            leg_k = top_k * max(1, _settings.hybrid_leg_multiplier)
+            vector_items, keyword_items = await asyncio.gather(
+                _timed(self._avector_leg(query, leg_k), stats, "vector_ms"),
+                _timed(self._akeyword_leg(query, leg_k), stats, "bm25_ms"),
+                return_exceptions=True,
+            )
+            for leg, res in (("vector", vector_items), ("bm25", keyword_items)):
+                if isinstance(res, Exception):
+                    logger.warning(f"Hybrid {leg} leg failed: {res}")
+            return self._fuse(
+                [] if isinstance(vector_items, Exception) else vector_items,
+                [] if isinstance(keyword_items, Exception) else keyword_items,
+                top_k,
+            ), stats
         try:
-            # Weaviate v4 client connection logic
-            # For v4, WeaviateClient is internal, use connect_to_local or connect_to_custom
-            if "localhost" in _settings.weaviate_url:
-                 client = weaviate.connect_to_local(
-                    port=8080,
-                    grpc_port=50051,
-                 )
-            else:
-                auth = AuthApiKey(_settings.weaviate_api_key) if _settings.weaviate_api_key else None
-                client = weaviate.connect_to_custom(
-                    http_host=_settings.weaviate_url.replace("http://", "").replace("https://", ""),
-                    http_port=443 if _settings.weaviate_url.startswith("https") else 80,
-                    http_secure=_settings.weaviate_url.startswith("https"),
-                    auth_credentials=auth,
-                    skip_init_checks=True,
-                )
+            return await _timed(self._avector_leg(query, top_k), stats, "vector_ms"), stats
         except Exception as e:
-            logger.warning(f"weaviate client init failed: {e}")
-            # Fallback for some v3/v4 hybrid scenarios or different connection patterns
-            try:
-                auth = AuthApiKey(_settings.weaviate_api_key) if _settings.weaviate_api_key else None
-                client = weaviate.WeaviateClient(
-                    connection_params=None, # Not standard v4 way but let's try to avoid direct instantiation errors
-                    auth_client_secret=auth
-                )
-            except:
-                pass
-
-    _vs = VectorStore(client, _settings.weaviate_class)
-    return _vs
+            logger.warning(f"Vector search failed, falling back to BM25: {e}")
+            return await _timed(self._akeyword_leg(query, top_k), stats, "bm25_ms"), stats
+
+    def _vector_leg(self, query: str, top_k: int) -> List[Dict]:
+        if _embed_model():
+            return self.backend.vector_search(self.embed_query(query), top_k)
+        return self.backend.text_search(query, top_k)
+
+    async def _avector_leg(self, query: str, top_k: int) -> List[Dict]:
+        if _embed_model():
+            vector = await self.aembed_query(query)
+            return await self._asearch(lambda: self.backend.avector_search(vector, top_k))
+        return await self._asearch(lambda: self.backend.atext_search(query, top_k))
+
+    async def _akeyword_leg(self, query: str, top_k: int) -> List[Dict]:
+        return await self._asearch(lambda: self.backend.akeyword_search(query, top_k))
+
+    @staticmethod
+    def _fuse(vector_items: List[Dict], keyword_items: List[Dict], top_k: int) -> List[Dict]:
+        weight = _settings.hybrid_vector_weight
+        return fuse_results(
+            [vector_items, keyword_items],
+            top_k,
+            method=_settings.hybrid_fusion,
+            weights=[weight, 1.0 - weight],
+            rrf_k=_settings.hybrid_rrf_k,
+        )
+
+    def stats(self) -> Dict:
+        return self.backend.stats()
+
+
+def _create_backend(settings: Settings) -> VectorBackend:
+    mode = settings.vector_backend
+    if mode in ("weaviate", "auto"):
+        from .backends import WeaviateBackend, async_client_factory, connect_weaviate
+        client = connect_weaviate(settings, require_ready=mode == "auto")
+        if client is not None or mode == "weaviate":
+            return WeaviateBackend(client, settings.weaviate_class, async_client_factory(settings) if client else None)
+        logger.warning("Weaviate unreachable, using embedded vector index")
+    return EmbeddedBackend(
+        settings.embedded_index_path,
+        ivf_min_rows=settings.embedded_ivf_min_rows,
+        ivf_nprobe=settings.embedded_ivf_nprobe,
+    )
+
+
+def get_vector_store() -> VectorStore:
+    global _vs, _vs_retry_at
+    with _vs_lock:
+        if _vs is None:
+            _vs = VectorStore(_create_backend(_settings))
+            if not _vs.backend.available:
+                _vs_retry_at = time.monotonic() + _settings.vector_backend_retry_seconds
+            return _vs
+        vs = _vs
+    # 不可用的后端（如启动时 Weaviate 尚未就绪）只短暂缓存，之后在后台线程重新连接，
+    # 避免同步连接阻塞调用方（通常是事件循环）
+    if not vs.backend.available and time.monotonic() >= _vs_retry_at:
+        _start_reconnect()
+    return vs
+
+
+def _start_reconnect():
+    global _reconnect_thread
+    with _vs_lock:
+        if _reconnect_thread is not None and _reconnect_thread.is_alive():
+            return
+        _reconnect_thread = threading.Thread(target=_reconnect, name="vector-reconnect", daemon=True)
+        _reconnect_thread.start()
+
+
+def _reconnect():
+    global _vs, _vs_retry_at
+    try:
+        backend = _create_backend(_settings)
+    except Exception as e:
+        logger.warning(f"vector backend reconnect failed: {e}")
+        backend = None
+    if backend is None or not backend.available:
+        if backend is not None:
+            backend.close()
+        _vs_retry_at = time.monotonic() + _settings.vector_backend_retry_seconds
+        return
+    with _vs_lock:
+        old, _vs = _vs, VectorStore(backend)
+    logger.info(f"{backend.name} vector backend connected")
+    if old is not None:
+        old.close()
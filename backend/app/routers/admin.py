@@ -1,5 +1,12 @@
 from fastapi import APIRouter
+from ..rag.answer_cache import get_answer_cache
+from ..rag.embedding_cache import get_embedding_cache
+from ..rag.pipeline import pipeline_stats
 from ..rag.vector_store import get_vector_store
+from ..services.clients import get_client_registry
+from ..services.ingest import get_ingestion_queue
+from ..services.llm_siliconcloud import single_flight_stats
+from ..services.session import get_session_store
 
 router = APIRouter(tags=["admin"])
 
@@ -8,4 +15,26 @@ router = APIRouter(tags=["admin"])
 def reindex():
     vs = get_vector_store()
     vs.recreate_schema()
+    cache = get_answer_cache()
+    if cache:
+        cache.invalidate()
     return {"status": "ok"}
+
+
+@router.get("/admin/stats")
+def stats():
+    embedding_cache = get_embedding_cache()
+    answer_cache = get_answer_cache()
+    return {
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "vector_store": get_vector_store().stats(),
+        "pipeline": pipeline_stats(),
+        "ingestion": get_ingestion_queue().stats(),
+        "sessions": get_session_store().stats(),
+        "dispatch": {
+            "llm_single_flight": single_flight_stats(),
+            "query_embedding_batches": get_vector_store().query_batcher.stats(),
+            "http": get_client_registry().stats(),
+        },
+    }
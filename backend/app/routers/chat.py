@@ -1,26 +1,53 @@
+import json
+import logging
 import time
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
+from ..config import get_settings
 from ..models.schemas import ChatRequest, ChatResponse
 from ..services.session import get_session_store
 from ..rag.pipeline import get_agent_pipeline
-from ..utils.retry import with_retry_circuit
 
 router = APIRouter(tags=["chat"])
+logger = logging.getLogger(__name__)
+_settings = get_settings()
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_events(agent, req: ChatRequest, session):
+    try:
+        async for event, data in agent.astream(req.query, session, retrieval_mode=req.retrieval_mode):
+            yield _sse(event, data)
+    except Exception as e:
+        logger.error(f"Streaming chat failed: {e}")
+        yield _sse("error", {"detail": str(e)})
 
 
 @router.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest, session_store=Depends(get_session_store)):
+async def chat(req: ChatRequest, session_store=Depends(get_session_store)):
     start = time.time()
     session = session_store.get_or_create(req.session_id)
     agent = get_agent_pipeline()
+    if req.stream and _settings.enable_streaming:
+        return StreamingResponse(
+            _stream_events(agent, req, session),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     try:
-        result = with_retry_circuit(agent.run)(query=req.query, session=session)
+        # 重试、超时与熔断在每次上游调用内处理，不再整体重跑管道
+        result = await agent.arun(query=req.query, session=session, retrieval_mode=req.retrieval_mode)
         elapsed = time.time() - start
         return ChatResponse(
             answer=result["answer"],
             sources=result.get("sources", []),
             latency_ms=int(elapsed * 1000),
+            cached=result.get("cached", False),
+            compliance=result.get("compliance"),
+            prompt_tokens=(result.get("packing") or {}).get("total_tokens"),
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, HTTPException, Query
+from ..rag.answer_cache import get_answer_cache
+from ..rag.vector_store import get_vector_store
+
+router = APIRouter(tags=["documents"])
+
+
+@router.get("/documents")
+def list_documents():
+    sources = get_vector_store().list_sources()
+    return {"documents": [{"source": s, "chunks": n} for s, n in sorted(sources.items())]}
+
+
+@router.delete("/documents")
+def delete_document(source: str = Query(..., min_length=1)):
+    deleted = get_vector_store().delete_source(source)
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"no chunks for source {source!r}")
+    cache = get_answer_cache()
+    if cache:
+        cache.invalidate()
+    return {"status": "ok", "source": source, "deleted": deleted}
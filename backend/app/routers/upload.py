@@ -1,17 +1,35 @@
 from typing import List
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from ..rag.document_loader import parse_files
-from ..rag.vector_store import get_vector_store
+from ..rag.document_loader import remove_quietly, spool_upload
+from ..services.ingest import QueueFullError, get_ingestion_queue
 
 router = APIRouter(tags=["upload"])
 
 
-@router.post("/upload")
+@router.post("/upload", status_code=202)
 async def upload(files: List[UploadFile] = File(...)):
+    payload = []
     try:
-        docs = await parse_files(files)
-        vs = get_vector_store()
-        vs.upsert_documents(docs)
-        return {"status": "ok", "count": len(docs)}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        for f in files:
+            payload.append(await spool_upload(f))
+        job = get_ingestion_queue().submit(payload)
+    except QueueFullError as e:
+        _discard(payload)
+        raise HTTPException(status_code=429, detail=str(e))
+    except BaseException:
+        _discard(payload)
+        raise
+    return {"status": "queued", "job_id": job.id, "count": len(payload)}
+
+
+def _discard(payload):
+    for _, path in payload:
+        remove_quietly(path)
+
+
+@router.get("/upload/jobs/{job_id}")
+def upload_job(job_id: str):
+    job = get_ingestion_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job.to_dict()
@@ -0,0 +1,111 @@
+import asyncio
+import importlib.util
+import logging
+import threading
+from typing import Dict, Optional
+import httpx
+from ..config import Settings, get_settings
+from .llm_siliconcloud import SiliconCloudLLM
+
+logger = logging.getLogger(__name__)
+_registry = None
+_llm: Optional[SiliconCloudLLM] = None
+_lock = threading.Lock()
+
+
+class ClientRegistry:
+    """Process-wide pooled HTTP clients shared by chat and embedding calls.
+
+    The sync client serves thread-pool callers (ingestion embeddings); the
+    async client serves the server event loop. Both keep connections alive
+    so pipeline stages reuse warm TCP/TLS sessions instead of opening new ones.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.http2 = settings.http2_enabled and importlib.util.find_spec("h2") is not None
+        if settings.http2_enabled and not self.http2:
+            logger.info("h2 is not installed, falling back to HTTP/1.1")
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._warmed = 0
+
+    def _options(self) -> Dict:
+        s = self.settings
+        return {
+            "http2": self.http2,
+            "limits": httpx.Limits(
+                max_connections=s.http_max_connections,
+                max_keepalive_connections=s.http_max_keepalive_connections,
+                keepalive_expiry=s.http_keepalive_expiry_seconds,
+            ),
+            "timeout": httpx.Timeout(s.llm_timeout_seconds, connect=s.http_connect_timeout_seconds),
+        }
+
+    @property
+    def http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(**self._options())
+        return self._http_client
+
+    @property
+    def http_async_client(self) -> httpx.AsyncClient:
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(**self._options())
+        return self._http_async_client
+
+    async def prewarm(self) -> int:
+        """Open up to ``http_prewarm_connections`` pooled connections to the LLM API."""
+        count = self.settings.http_prewarm_connections
+        if count <= 0 or not self.settings.siliconcloud_api_key:
+            return 0
+        url = f"{SiliconCloudLLM.api_base_url(self.settings)}/models"
+        headers = {"Authorization": f"Bearer {self.settings.siliconcloud_api_key}"}
+
+        async def touch():
+            # 只为建立连接，响应状态无关紧要
+            await self.http_async_client.get(url, headers=headers)
+
+        # HTTP/2 在单个连接上多路复用，一个请求即可
+        jobs = [touch() for _ in range(1 if self.http2 else count)]
+        jobs.append(asyncio.to_thread(self.http_client.get, url, headers=headers))
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            logger.warning(f"connection prewarm failed for {len(errors)}/{len(results)} requests: {errors[0]}")
+        self._warmed += len(results) - len(errors)
+        return len(results) - len(errors)
+
+    async def aclose(self):
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_async_client = None
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+
+    def stats(self) -> Dict:
+        return {
+            "http2": self.http2,
+            "max_connections": self.settings.http_max_connections,
+            "max_keepalive_connections": self.settings.http_max_keepalive_connections,
+            "prewarmed": self._warmed,
+        }
+
+
+def get_client_registry() -> ClientRegistry:
+    global _registry
+    with _lock:
+        if _registry is None:
+            _registry = ClientRegistry(get_settings())
+        return _registry
+
+
+def get_llm() -> SiliconCloudLLM:
+    """The process-wide LLM; also configures the LlamaIndex embedding model once."""
+    global _llm
+    registry = get_client_registry()
+    with _lock:
+        if _llm is None:
+            _llm = SiliconCloudLLM(registry.settings, registry.http_client, registry.http_async_client)
+        return _llm
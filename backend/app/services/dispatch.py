@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one upstream call.
+
+    The first caller starts the call as its own task; later callers with the
+    same key await the same result until it completes. Callers are shielded
+    from each other, so one disconnecting client does not cancel the call
+    for the rest. Calls are only shared within one event loop.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._stats = Counter()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return ``(result, shared)``; ``shared`` is true for coalesced callers."""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), hashlib.sha256(key.encode("utf-8")).hexdigest())
+        task = self._inflight.get(flight_key)
+        shared = task is not None and task.get_loop() is loop
+        if shared:
+            self._stats["coalesced"] += 1
+        else:
+            task = loop.create_task(fn())
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+            self._stats["calls"] += 1
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> Dict:
+        calls, coalesced = self._stats["calls"], self._stats["coalesced"]
+        total = calls + coalesced
+        return {"upstream_calls": calls, "coalesced": coalesced,
+                "coalesce_rate": round(coalesced / total, 4) if total else 0.0}
+
+
+class MicroBatcher:
+    """Gather concurrent single-item requests into batched upstream calls.
+
+    The first request of a batch opens a ``window_ms`` window; everything
+    submitted on the same event loop before it closes (or until
+    ``max_batch`` items) is sent as one ``batch_fn`` call, with duplicate
+    items sent once.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Awaitable[List[Any]]], window_ms: float = 5.0,
+                 max_batch: int = 64):
+        self.batch_fn = batch_fn
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending: Dict[asyncio.AbstractEventLoop, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[asyncio.AbstractEventLoop, asyncio.TimerHandle] = {}
+        self._tasks = set()
+        self._stats = Counter()
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(loop, [])
+        batch.append((item, future))
+        self._stats["requests"] += 1
+        if len(batch) >= self.max_batch:
+            self._flush(loop)
+        elif len(batch) == 1:
+            self._timers[loop] = loop.call_later(self.window, self._flush, loop)
+        return await future
+
+    def stats(self) -> Dict:
+        batches = self._stats["batches"]
+        return {
+            "requests": self._stats["requests"],
+            "batches": batches,
+            "avg_batch_size": round(self._stats["batched_items"] / batches, 2) if batches else 0.0,
+        }
+
+    def _flush(self, loop: asyncio.AbstractEventLoop):
+        timer = self._timers.pop(loop, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(loop, [])
+        if batch:
+            task = loop.create_task(self._run(batch))
+            # 保留任务引用，避免执行中被垃圾回收
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        unique = list(dict.fromkeys(item for item, _ in batch))
+        self._stats["batches"] += 1
+        self._stats["batched_items"] += len(unique)
+        try:
+            values = list(await self.batch_fn(unique))
+            if len(values) != len(unique):
+                raise ValueError(f"batch call returned {len(values)} results for {len(unique)} items")
+            results = dict(zip(unique, values))
+            for item, future in batch:
+                if not future.done():
+                    future.set_result(results[item])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # 批处理任务被取消等情况下，不能让等待方永远挂起
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from ..config import get_settings
+from ..rag.answer_cache import get_answer_cache
+from ..rag.chunker import iter_chunks
+from ..rag.document_loader import get_parser_pool, iter_text_file, remove_quietly
+from ..rag.vector_store import EmbeddingError, IngestSession, get_vector_store
+
+logger = logging.getLogger(__name__)
+_settings = get_settings()
+_DONE = object()
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+@dataclass
+class IngestJob:
+    id: str
+    # (文件名, 落盘的上传文件路径)
+    files: List[Tuple[str, str]]
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    files_parsed: int = 0
+    chunks_admitted: int = 0
+    chunks_embedded: int = 0
+    report: Dict[str, int] = field(default_factory=lambda: {"inserted": 0, "skipped": 0, "deleted": 0, "sources": 0})
+    errors: List[Dict] = field(default_factory=list)
+    finished: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> Dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "progress": {
+                "files": {"total": len(self.files), "parsed": self.files_parsed},
+                "chunks": {"admitted": self.chunks_admitted, "embedded": self.chunks_embedded, **self.report},
+            },
+            "throughput_chunks_per_second": round(self.report["inserted"] / elapsed, 2) if elapsed else 0.0,
+            "errors": self.errors,
+        }
+
+
+class IngestionQueue:
+    """Bounded background ingestion queue.
+
+    Jobs run on a dedicated event-loop thread so parsing and embedding never
+    block request handling. Each of ``workers`` workers takes one job at a
+    time and runs parse/chunk -> embed -> insert as three concurrent stages
+    connected by bounded queues, so a slow stage throttles the ones before
+    it. Submitting while ``queue_size`` jobs are waiting raises
+    :class:`QueueFullError`.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 16, stage_queue_size: int = 256, history: int = 200):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.stage_queue_size = max(1, stage_queue_size)
+        self.history = history
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._ready = threading.Event()
+
+    def submit(self, files: List[Tuple[str, str]]) -> IngestJob:
+        """Queue spooled ``(filename, path)`` files; the job removes them when done."""
+        self._ensure_started()
+        job = IngestJob(id=uuid.uuid4().hex, files=files)
+        accepted = asyncio.run_coroutine_threadsafe(self._enqueue(job), self._loop).result()
+        if not accepted:
+            raise QueueFullError(f"ingestion queue is full ({self.queue_size} jobs waiting)")
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.status in (QUEUED, RUNNING):
+                    break
+                self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[IngestJob]:
+        """Block until the job has finished (or ``timeout`` elapses) and return it."""
+        job = self.get(job_id)
+        if job is not None:
+            job.finished.wait(timeout)
+        return job
+
+    def stats(self) -> Dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {s: sum(1 for j in jobs if j.status == s) for s in (QUEUED, RUNNING, DONE, FAILED)}
+        return {"workers": self.workers, "queue_size": self.queue_size, **counts}
+
+    async def _enqueue(self, job: IngestJob) -> bool:
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is None:
+                threading.Thread(target=self._serve, name="ingest-loop", daemon=True).start()
+                self._ready.wait()
+
+    def _serve(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        for _ in range(self.workers):
+            loop.create_task(self._worker())
+        self._loop = loop
+        self._ready.set()
+        loop.run_forever()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                await self._run(job)
+                job.status = DONE
+            except Exception as e:
+                logger.exception(f"ingestion job {job.id} failed")
+                job.errors.append({"stage": "job", "error": str(e)})
+                job.status = FAILED
+            finally:
+                job.finished_at = time.time()
+                for _, path in job.files:
+                    remove_quietly(path)
+                job.finished.set()
+                self._queue.task_done()
+
+    async def _run(self, job: IngestJob):
+        vs = get_vector_store()
+        session = IngestSession(vs.backend, embedded=vs.can_embed)
+        job.report = session.report
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=self.stage_queue_size)
+        batches: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.stage_queue_size // max(1, _settings.embed_batch_size)))
+        stages = [
+            asyncio.create_task(self._parse_stage(job, session, chunks)),
+            asyncio.create_task(self._embed_stage(job, vs, session, chunks, batches)),
+            asyncio.create_task(self._insert_stage(job, vs, batches)),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except Exception:
+            for t in stages:
+                t.cancel()
+            raise
+        job.report = await asyncio.to_thread(session.finish)
+        if job.report["inserted"] or job.report["deleted"]:
+            cache = get_answer_cache()
+            if cache:
+                cache.invalidate()
+
+    async def _parse_stage(self, job: IngestJob, session: IngestSession, out: asyncio.Queue):
+        # 所有文件并发提交给解析进程池，再按顺序流式分块
+        pool = get_parser_pool()
+        extractions = [asyncio.ensure_future(pool.extract(name, path)) for name, path in job.files]
+        try:
+            for (name, path), extraction in zip(job.files, extractions):
+                try:
+                    text_path = await extraction
+                except Exception as e:
+                    job.errors.append({"stage": "parse", "file": name, "error": str(e) or type(e).__name__})
+                    continue
+                produced = 0
+                try:
+                    for i, chunk in enumerate(iter_chunks(iter_text_file(text_path), name, _settings)):
+                        if not produced:
+                            # 产出首个分块后才登记来源：空文件或解析失败不会删除已有分块
+                            await asyncio.to_thread(session.load_source, name)
+                        produced += 1
+                        chunk = session.admit(chunk)
+                        if chunk is not None:
+                            job.chunks_admitted += 1
+                            await out.put(chunk)
+                        elif i % 64 == 0:
+                            # 大量未变化分块时让出事件循环
+                            await asyncio.sleep(0)
+                finally:
+                    if text_path != path:
+                        remove_quietly(text_path)
+                if not produced:
+                    job.errors.append({"stage": "parse", "file": name, "error": "no text extracted"})
+                    continue
+                job.files_parsed += 1
+        finally:
+            for extraction in extractions:
+                extraction.cancel()
+        await out.put(_DONE)
+
+    async def _embed_stage(self, job: IngestJob, vs, session: IngestSession, inp: asyncio.Queue, out: asyncio.Queue):
+        batch_size = max(1, _settings.embed_batch_size)
+        done = False
+        while not done:
+            group = []
+            while len(group) < batch_size:
+                item = await inp.get()
+                if item is _DONE:
+                    done = True
+                    break
+                group.append(item)
+            if group:
+                try:
+                    vectors = await asyncio.to_thread(vs.embed_texts, [d["text"] for d in group])
+                except EmbeddingError as e:
+                    # 该批不写入，下次上传同一文件时会重新嵌入；涉及的来源保留旧分块，不做过期删除
+                    sources = sorted({d.get("source", "") for d in group})
+                    for source in sources:
+                        session.incomplete(source)
+                    job.errors.append({"stage": "embed", "chunks": len(group), "sources": sources, "error": str(e)})
+                    continue
+                job.chunks_embedded += len(group)
+                await out.put((group, vectors))
+        await out.put(_DONE)
+
+    async def _insert_stage(self, job: IngestJob, vs, inp: asyncio.Queue):
+        while True:
+            item = await inp.get()
+            if item is _DONE:
+                return
+            group, vectors = item
+            job.report["inserted"] += await asyncio.to_thread(vs.insert, group, vectors)
+
+
+_queue: Optional[IngestionQueue] = None
+
+
+def get_ingestion_queue() -> IngestionQueue:
+    global _queue
+    if _queue is None:
+        _queue = IngestionQueue(
+            workers=_settings.ingest_workers,
+            queue_size=_settings.ingest_queue_size,
+            stage_queue_size=_settings.ingest_stage_queue_size,
+            history=_settings.ingest_job_history,
+        )
+    return _queue
@@ -0,0 +1,54 @@
+import logging
+from typing import Any
+from llama_index.core.llms import (
+    CustomLLM, CompletionResponse, CompletionResponseAsyncGen, CompletionResponseGen, LLMMetadata
+)
+from langchain_core.messages import HumanMessage
+
+logger = logging.getLogger(__name__)
+
+
+class SimpleLangChainAdapter(CustomLLM):
+    _lc_model: Any = None
+
+    def __init__(self, lc_model: Any):
+        super().__init__()
+        self._lc_model = lc_model
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata()
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        try:
+            msg = HumanMessage(content=prompt)
+            out = self._lc_model.invoke([msg])
+            return CompletionResponse(text=str(out.content), raw=out)
+        except Exception as e:
+            logger.error(f"LangChain invoke error: {e}")
+            raise e
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        try:
+            msg = HumanMessage(content=prompt)
+            out = await self._lc_model.ainvoke([msg])
+            return CompletionResponse(text=str(out.content), raw=out)
+        except Exception as e:
+            logger.error(f"LangChain ainvoke error: {e}")
+            raise e
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        msg = HumanMessage(content=prompt)
+        for chunk in self._lc_model.stream([msg]):
+            yield CompletionResponse(text=str(chunk.content), delta=str(chunk.content))
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        msg = HumanMessage(content=prompt)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            text = ""
+            async for chunk in self._lc_model.astream([msg]):
+                text += str(chunk.content)
+                yield CompletionResponse(text=text, delta=str(chunk.content))
+
+        return gen()
@@ -1,69 +1,71 @@
 import logging
-from typing import Any
+import time
+from typing import Any, AsyncIterator, Dict
 from ..config import Settings
-from langchain.chat_models import init_chat_model
-from langchain_openai import OpenAIEmbeddings
-from llama_index.embeddings.langchain import LangchainEmbedding
-from llama_index.core.llms import CustomLLM, CompletionResponse, CompletionResponseGen, LLMMetadata
-from llama_index.core import Settings as LlamaSettings
-from langchain_core.messages import HumanMessage
+from .dispatch import SingleFlight
+from ..utils.metrics import LLM_CALLS, LLM_LATENCY, record_llm_tokens
+from ..utils.retry import call_upstream, call_upstream_sync
+from ..utils.tokens import count_tokens
 
 logger = logging.getLogger(__name__)
+# 进程内共享，所有实例合并相同的在途 prompt
+_flight = SingleFlight()
 
+LARGE, SMALL = "large", "small"
 
-class SimpleLangChainAdapter(CustomLLM):
-    _lc_model: Any = None
 
-    def __init__(self, lc_model: Any):
-        super().__init__()
-        self._lc_model = lc_model
-
-    @property
-    def metadata(self) -> LLMMetadata:
-        return LLMMetadata()
-
-    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
-        try:
-            msg = HumanMessage(content=prompt)
-            out = self._lc_model.invoke([msg])
-            return CompletionResponse(text=str(out.content))
-        except Exception as e:
-            logger.error(f"LangChain invoke error: {e}")
-            raise e
-
-    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
-        msg = HumanMessage(content=prompt)
-        for chunk in self._lc_model.stream([msg]):
-            yield CompletionResponse(text=str(chunk.content), delta=str(chunk.content))
+def single_flight_stats() -> dict:
+    return _flight.stats()
 
 
 class SiliconCloudLLM:
-    def __init__(self, settings: Settings):
+    MOCK_PREFIX = "【提示】未配置硅基流动API密钥或初始化失败，返回模拟回答：\n"
+    FAILURE_ANSWER = "LLM调用失败，已触发降级回答。"
+
+    def __init__(self, settings: Settings, http_client: Any = None, http_async_client: Any = None):
+        """``http_client``/``http_async_client`` are shared httpx pools; see ``services.clients``."""
         self.settings = settings
         self._adapter = None
+        # 按模型档位区分的适配器；LARGE 即 self._adapter，SMALL 仅在配置小模型时存在
+        self._adapters: Dict[str, Any] = {}
+        self.small_purposes = {p.strip() for p in settings.llm_small_purposes.split(",") if p.strip()}
 
         if self.settings.siliconcloud_api_key:
             try:
-                # Initialize LangChain Chat Model (OpenAI compatible)
-                # Note: config.py default base_url already includes /v1 if using default
-                # But if user overrides it, we need to be careful.
-                # Common practice: ensure it ends with /v1
-                base_url = self.settings.siliconcloud_base_url
-                if not base_url.endswith("/v1"):
-                     base_url = f"{base_url}/v1"
-
-                chat_model = init_chat_model(
-                    model=self.settings.siliconcloud_model,
-                    model_provider="openai",
-                    api_key=self.settings.siliconcloud_api_key,
-                    base_url=base_url,
-                    temperature=0.2,
-                    max_tokens=512,
-                    timeout=self.settings.llm_timeout_seconds,
-                )
+                # langchain/llama_index 导入耗时较长，只在真正需要客户端时加载
+                from langchain.chat_models import init_chat_model
+                from langchain_openai import OpenAIEmbeddings
+                from llama_index.core import Settings as LlamaSettings
+                from llama_index.embeddings.langchain import LangchainEmbedding
+                from .llm_adapter import SimpleLangChainAdapter
+
+                base_url = self.api_base_url(self.settings)
+
+                def chat_model(model: str, temperature: float, max_tokens: int):
+                    return init_chat_model(
+                        model=model,
+                        model_provider="openai",
+                        api_key=self.settings.siliconcloud_api_key,
+                        base_url=base_url,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        timeout=self.settings.llm_timeout_seconds,
+                        # 重试由 utils.retry 按调用统一处理，避免 SDK 内部重试叠加
+                        max_retries=0,
+                        http_client=http_client,
+                        http_async_client=http_async_client,
+                    )
 
                 # Use our custom adapter which inherits from CustomLLM to provide default implementations
-                self._adapter = SimpleLangChainAdapter(lc_model=chat_model)
+                self._adapter = SimpleLangChainAdapter(lc_model=chat_model(
+                    self.settings.siliconcloud_model, self.settings.llm_temperature, self.settings.llm_max_tokens
+                ))
+                self._adapters[LARGE] = self._adapter
+                if self.settings.siliconcloud_small_model:
+                    self._adapters[SMALL] = SimpleLangChainAdapter(lc_model=chat_model(
+                        self.settings.siliconcloud_small_model, self.settings.llm_small_temperature,
+                        self.settings.llm_small_max_tokens,
+                    ))
 
                 # Update global LlamaIndex settings
                 LlamaSettings.llm = self._adapter
@@ -74,7 +76,10 @@ class SiliconCloudLLM:
                         model=self.settings.siliconcloud_embed_model,
                         openai_api_key=self.settings.siliconcloud_api_key,
                         openai_api_base=base_url,
-                        check_embedding_ctx_length=False
+                        check_embedding_ctx_length=False,
+                        max_retries=0,
+                        http_client=http_client,
+                        http_async_client=http_async_client,
                     )
                     LlamaSettings.embed_model = LangchainEmbedding(langchain_embeddings=embeddings_model)
 
@@ -82,12 +87,108 @@ class SiliconCloudLLM:
                 logger.error(f"Failed to initialize SiliconCloud LLM: {e}")
                 self._adapter = None
 
+    @staticmethod
+    def api_base_url(settings: Settings) -> str:
+        # 默认地址已包含 /v1，用户覆盖时补齐
+        base_url = settings.siliconcloud_base_url.rstrip("/")
+        return base_url if base_url.endswith("/v1") else f"{base_url}/v1"
+
     def complete(self, prompt: str) -> str:
         if not self._adapter:
-            return "【提示】未配置硅基流动API密钥或初始化失败，返回模拟回答：\n" + prompt[:200]
+            return self.MOCK_PREFIX + prompt[:200]
         try:
-            response = self._adapter.complete(prompt)
+            response = call_upstream_sync("chat", lambda: self._adapter.complete(prompt))
             return response.text
         except Exception as e:
             logger.warning(f"siliconcloud api error: {e}")
-            return "LLM调用失败，已触发降级回答。"
+            return self.FAILURE_ANSWER
+
+    def tier_for(self, purpose: str) -> str:
+        """Model tier serving ``purpose``: ``small`` for configured classification calls, else ``large``."""
+        return SMALL if purpose in self.small_purposes and SMALL in self._adapters else LARGE
+
+    async def acomplete(self, prompt: str, purpose: str = "other", tier: str = None) -> str:
+        """Complete ``prompt``; ``purpose`` labels the call in latency/token metrics and picks the model tier.
+
+        ``tier`` overrides the tier (e.g. to escalate to ``large``). Identical
+        prompts already in flight on the same tier share one upstream call.
+        """
+        if not self._adapter:
+            LLM_CALLS.labels(purpose=purpose, outcome="mock").inc()
+            return self.MOCK_PREFIX + prompt[:200]
+        tier = tier or self.tier_for(purpose)
+        adapter = self._adapters.get(tier, self._adapter)
+        if not self.settings.llm_single_flight_enabled:
+            return await self._acomplete(prompt, purpose, tier, adapter)
+        start = time.perf_counter()
+        text, shared = await _flight.do(f"{tier}:{prompt}", lambda: self._acomplete(prompt, purpose, tier, adapter))
+        if shared:
+            LLM_CALLS.labels(purpose=purpose, outcome="coalesced").inc()
+            LLM_LATENCY.labels(purpose=purpose).observe(time.perf_counter() - start)
+        return text
+
+    async def _acomplete(self, prompt: str, purpose: str, tier: str, adapter: Any) -> str:
+        start = time.perf_counter()
+        try:
+            response = await call_upstream(
+                "chat", lambda: adapter.acomplete(prompt), self.settings.llm_timeout_seconds,
+                kind=f"{tier}:{purpose}",
+            )
+        except Exception as e:
+            logger.warning(f"siliconcloud api error: {e}")
+            LLM_CALLS.labels(purpose=purpose, outcome="error").inc()
+            return self.FAILURE_ANSWER
+        finally:
+            LLM_LATENCY.labels(purpose=purpose).observe(time.perf_counter() - start)
+        LLM_CALLS.labels(purpose=purpose, outcome="ok").inc()
+        self._record_usage(purpose, prompt, response.text, getattr(response.raw, "usage_metadata", None))
+        return response.text
+
+    async def astream(self, prompt: str, purpose: str = "other") -> AsyncIterator[str]:
+        """Yield completion deltas for ``prompt`` as they arrive."""
+        if not self._adapter:
+            LLM_CALLS.labels(purpose=purpose, outcome="mock").inc()
+            yield self.MOCK_PREFIX + prompt[:200]
+            return
+        async def open_stream():
+            stream = await self._adapter.astream_complete(prompt)
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+
+        produced = False
+        parts = []
+        start = time.perf_counter()
+        try:
+            # 首个 token 之前可安全重试；生成提示较长，不做对冲以免重复计费
+            stream, first = await call_upstream("chat", open_stream, self.settings.llm_timeout_seconds, hedge=False)
+            if first is not None:
+                produced = True
+                parts.append(first.delta or "")
+                yield first.delta or ""
+                async for response in stream:
+                    parts.append(response.delta or "")
+                    yield response.delta or ""
+        except Exception as e:
+            logger.warning(f"siliconcloud stream error: {e}")
+            LLM_CALLS.labels(purpose=purpose, outcome="error").inc()
+            if not produced:
+                yield self.FAILURE_ANSWER
+            return
+        finally:
+            LLM_LATENCY.labels(purpose=purpose).observe(time.perf_counter() - start)
+        LLM_CALLS.labels(purpose=purpose, outcome="ok").inc()
+        self._record_usage(purpose, prompt, "".join(parts), None)
+
+    def _record_usage(self, purpose: str, prompt: str, completion: str, usage):
+        # 优先使用接口返回的用量，流式或缺失时按本地分词估算
+        if usage and usage.get("input_tokens") is not None:
+            record_llm_tokens(purpose, usage["input_tokens"], usage.get("output_tokens") or 0)
+        else:
+            encoding = self.settings.tokenizer_encoding
+            record_llm_tokens(purpose, count_tokens(prompt, encoding), count_tokens(completion, encoding))
+
+    def is_degraded(self, text: str) -> bool:
+        """Whether ``text`` is a mock/fallback answer rather than real model output."""
+        return text.startswith(self.MOCK_PREFIX) or text == self.FAILURE_ANSWER
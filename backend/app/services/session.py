@@ -1,6 +1,14 @@
-from typing import Dict
+from typing import Dict, List, Optional
+from collections import Counter, OrderedDict
 from dataclasses import dataclass, field
 import threading
+import time
+from ..config import Settings, get_settings
+
+SUMMARY_ROLE = "system"
+_SUMMARY_PREFIX = "早前对话摘要："
+# 摘要中每条旧消息保留的字符数
+_SUMMARY_SNIPPET_CHARS = 120
 
 
 @dataclass
@@ -8,21 +16,144 @@ class Session:
     id: str
     history: list = field(default_factory=list)
     metadata: dict = field(default_factory=dict)
+    summary: str = ""
+    last_access: float = field(default_factory=time.monotonic)
 
 
-class SessionStore:
+class _Stripe:
     def __init__(self):
-        self._lock = threading.Lock()
-        self._sessions: Dict[str, Session] = {}
+        self.lock = threading.Lock()
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+
+class SessionStore:
+    """Bounded in-memory session store.
+
+    Sessions are spread over ``stripes`` independently locked LRU maps, so
+    concurrent requests for different sessions rarely contend. A stripe
+    evicts sessions idle for ``ttl_seconds`` and, beyond its share of
+    ``capacity``, the least recently used ones. When a session's history
+    exceeds ``max_history`` messages, all but the newest ``keep_recent`` are
+    folded into a rolling summary kept as the first history message.
+    """
+
+    def __init__(self, capacity: int = 10000, ttl_seconds: float = 1800, max_history: int = 20,
+                 keep_recent: int = 8, summary_chars: int = 2000, stripes: int = 16):
+        self.capacity = max(1, capacity)
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max(2, max_history)
+        self.keep_recent = max(0, min(keep_recent, self.max_history - 1))
+        self.summary_chars = summary_chars
+        self._stripes: List[_Stripe] = [_Stripe() for _ in range(max(1, stripes))]
+        self._per_stripe = max(1, -(-self.capacity // len(self._stripes)))
+        self._stats = Counter()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "SessionStore":
+        return cls(
+            capacity=settings.session_capacity,
+            ttl_seconds=settings.session_ttl_seconds,
+            max_history=settings.session_max_history,
+            keep_recent=settings.session_keep_recent,
+            summary_chars=settings.session_summary_chars,
+            stripes=settings.session_lock_stripes,
+        )
 
     def get_or_create(self, session_id: str) -> Session:
-        with self._lock:
-            if session_id not in self._sessions:
-                self._sessions[session_id] = Session(id=session_id)
-            return self._sessions[session_id]
+        stripe = self._stripe(session_id)
+        now = time.monotonic()
+        with stripe.lock:
+            self._evict_expired(stripe, now)
+            session = stripe.sessions.get(session_id)
+            if session is None:
+                session = Session(id=session_id)
+                stripe.sessions[session_id] = session
+                while len(stripe.sessions) > self._per_stripe:
+                    stripe.sessions.popitem(last=False)
+                    self._stats["evicted_lru"] += 1
+            else:
+                stripe.sessions.move_to_end(session_id)
+            session.last_access = now
+            if len(session.history) > self.max_history:
+                self._compact(session)
+            return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            return stripe.sessions.get(session_id)
+
+    def delete(self, session_id: str) -> bool:
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            return stripe.sessions.pop(session_id, None) is not None
+
+    def sweep(self) -> int:
+        """Evict idle sessions from every stripe; return how many were removed."""
+        now = time.monotonic()
+        removed = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                removed += self._evict_expired(stripe, now)
+        return removed
+
+    def stats(self) -> Dict:
+        self.sweep()
+        sessions = messages = chars = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                sessions += len(stripe.sessions)
+                for s in stripe.sessions.values():
+                    messages += len(s.history)
+                    chars += sum(len(m.get("content", "")) for m in s.history)
+        return {
+            "sessions": sessions,
+            "capacity": self.capacity,
+            "messages": messages,
+            "history_chars": chars,
+            "evicted_lru": self._stats["evicted_lru"],
+            "evicted_idle": self._stats["evicted_idle"],
+            "compactions": self._stats["compactions"],
+        }
+
+    def _stripe(self, session_id: str) -> _Stripe:
+        return self._stripes[hash(session_id) % len(self._stripes)]
+
+    def _evict_expired(self, stripe: _Stripe, now: float) -> int:
+        if self.ttl_seconds <= 0:
+            return 0
+        removed = 0
+        # LRU 顺序即最近访问顺序，过期会话都在头部
+        while stripe.sessions:
+            oldest = next(iter(stripe.sessions.values()))
+            if now - oldest.last_access < self.ttl_seconds:
+                break
+            stripe.sessions.popitem(last=False)
+            removed += 1
+        self._stats["evicted_idle"] += removed
+        return removed
+
+    def _compact(self, session: Session):
+        history = [m for m in session.history if m.get("role") != SUMMARY_ROLE or not
+                   m.get("content", "").startswith(_SUMMARY_PREFIX)]
+        cut = len(history) - self.keep_recent
+        old, recent = history[:cut], history[cut:]
+        lines = [f"{m['role']}: {_snippet(m.get('content', ''))}" for m in old]
+        summary = "\n".join(filter(None, [session.summary, *lines]))
+        if len(summary) > self.summary_chars:
+            # 滚动摘要只保留最近的部分
+            summary = summary[-self.summary_chars:]
+        session.summary = summary
+        session.history[:] = [{"role": SUMMARY_ROLE, "content": _SUMMARY_PREFIX + summary}, *recent]
+        self._stats["compactions"] += 1
+
+
+def _snippet(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= _SUMMARY_SNIPPET_CHARS else text[:_SUMMARY_SNIPPET_CHARS] + "…"
 
 
-_store = SessionStore()
+_store = SessionStore.from_settings(get_settings())
 
 
 def get_session_store():
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from ..config import get_settings
+from .clients import get_client_registry, get_llm
+
+logger = logging.getLogger(__name__)
+_warmup = None
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+async def _warm_vector_store():
+    from ..rag.vector_store import get_vector_store
+    vs = await asyncio.to_thread(get_vector_store)
+    if not vs.backend.available:
+        raise RuntimeError(f"{vs.backend.name} vector backend is unavailable")
+
+
+async def _warm_pipeline():
+    from ..rag.pipeline import get_agent_pipeline
+    await asyncio.to_thread(get_agent_pipeline)
+
+
+class Warmup:
+    """Initialise the LLM, vector store and pipeline off the request path.
+
+    Steps run in order (later ones reuse the earlier singletons) in worker
+    threads, so the server keeps answering ``/livez`` while they import and
+    connect. ``/readyz`` reports ready once every step has succeeded.
+    Failed steps are retried with exponential backoff (starting at
+    ``retry_base`` seconds, capped at ``retry_max``), so dependencies that
+    come up after the API (e.g. docker compose start order) are picked up.
+    """
+
+    def __init__(self, retry_base: float = 1.0, retry_max: float = 30.0):
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.steps: List[Tuple[str, Callable[[], Awaitable]]] = [
+            ("llm", lambda: asyncio.to_thread(get_llm)),
+            ("vector_store", _warm_vector_store),
+            ("pipeline", _warm_pipeline),
+            ("connections", lambda: get_client_registry().prewarm()),
+        ]
+        self.components: Dict[str, Dict] = {name: {"state": PENDING} for name, _ in self.steps}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def skip(self):
+        # 关闭预热时组件在首个请求中按需初始化
+        for status in self.components.values():
+            status["state"] = SKIPPED
+
+    async def attempt(self) -> bool:
+        """Run every step that is not ready yet, in order; return whether all are ready."""
+        for name, step in self.steps:
+            status = self.components[name]
+            if status["state"] == READY:
+                continue
+            attempts = status.get("attempts", 0) + 1
+            start = time.perf_counter()
+            try:
+                await step()
+                status = {"state": READY}
+            except Exception as e:
+                logger.error(f"warmup step {name} failed (attempt {attempts}): {e}")
+                status = {"state": FAILED, "error": str(e)}
+            status.update(attempts=attempts, ms=round((time.perf_counter() - start) * 1000, 1))
+            self.components[name] = status
+        return self.ready
+
+    async def run(self):
+        delay = self.retry_base
+        while not await self.attempt() and self.retry_base > 0:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.retry_max)
+        logger.info(f"warmup finished: {self.report()}")
+
+    @property
+    def ready(self) -> bool:
+        return all(s["state"] in (READY, SKIPPED) for s in self.components.values())
+
+    def report(self) -> Dict:
+        return {"ready": self.ready, "components": self.components}
+
+
+def get_warmup() -> Warmup:
+    global _warmup
+    if _warmup is None:
+        settings = get_settings()
+        _warmup = Warmup(settings.warmup_retry_base_seconds, settings.warmup_retry_max_seconds)
+    return _warmup
@@ -0,0 +1,111 @@
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# 覆盖本地缓存命中（毫秒级）到慢速 LLM 调用（数十秒）
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    "agentic_rag_http_request_seconds", "HTTP request latency", ["method", "path", "status"], buckets=_BUCKETS
+)
+NODE_LATENCY = Histogram("agentic_rag_node_seconds", "LangGraph node latency", ["node"], buckets=_BUCKETS)
+LLM_LATENCY = Histogram("agentic_rag_llm_seconds", "LLM call latency by purpose", ["purpose"], buckets=_BUCKETS)
+LLM_CALLS = Counter("agentic_rag_llm_calls_total", "LLM calls by purpose and outcome", ["purpose", "outcome"])
+LLM_TOKENS = Counter("agentic_rag_llm_tokens_total", "LLM tokens by purpose", ["purpose", "kind"])
+EMBED_LATENCY = Histogram("agentic_rag_embedding_seconds", "Embedding latency", ["kind"], buckets=_BUCKETS)
+SEARCH_LATENCY = Histogram("agentic_rag_vector_search_seconds", "Vector store search latency by leg", ["leg"],
+                           buckets=_BUCKETS)
+RETRIES = Counter("agentic_rag_retries_total", "Pipeline retry loops taken", ["kind"])
+UPSTREAM_EVENTS = Counter("agentic_rag_upstream_events_total",
+                          "Upstream call resilience events (retry, hedge, hedge_won, timeout, breaker_open)",
+                          ["upstream", "event"])
+
+
+@contextmanager
+def observe(histogram: Histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def timed_node(name: str, fn):
+    """Wrap an async graph node so its latency lands in ``NODE_LATENCY``."""
+    @functools.wraps(fn)
+    async def wrapped(state):
+        with observe(NODE_LATENCY, node=name):
+            return await fn(state)
+
+    return wrapped
+
+
+def record_llm_tokens(purpose: str, prompt_tokens: int, completion_tokens: int):
+    LLM_TOKENS.labels(purpose=purpose, kind="prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(purpose=purpose, kind="completion").inc(completion_tokens)
+
+
+class _RuntimeCollector:
+    """Scrape-time gauges for state owned by other modules (breakers, caches)."""
+
+    def describe(self):
+        # 注册时不调用 collect，避免在导入期间反向导入 pipeline
+        return []
+
+    def collect(self):
+        from .retry import breakers
+        from ..rag.answer_cache import get_answer_cache
+        from ..rag.embedding_cache import get_embedding_cache
+        from ..rag.pipeline import pipeline_stats
+
+        state = GaugeMetricFamily("agentic_rag_circuit_breaker_state", "Circuit breaker state (1 = current)",
+                                  labels=["upstream", "state"])
+        failures = GaugeMetricFamily("agentic_rag_circuit_breaker_failures", "Consecutive breaker failures",
+                                     labels=["upstream"])
+        for upstream, breaker in breakers.items():
+            for name in ("closed", "open", "half-open"):
+                state.add_metric([upstream, name], 1.0 if breaker.current_state == name else 0.0)
+            failures.add_metric([upstream], breaker.fail_counter)
+        yield state
+        yield failures
+
+        hit_rate = GaugeMetricFamily("agentic_rag_cache_hit_rate", "Cache hit rate", labels=["cache"])
+        try:
+            embedding_cache = get_embedding_cache()
+            if embedding_cache:
+                hit_rate.add_metric(["embedding"], embedding_cache.stats()["hit_rate"])
+            answer_cache = get_answer_cache()
+            if answer_cache:
+                hit_rate.add_metric(["answer"], answer_cache.stats()["hit_rate"])
+            stats = pipeline_stats() or {}
+            router = stats.get("local_router")
+            if router:
+                total = router["llm_calls_avoided"] + router.get("llm_decisions", 0)
+                if total:
+                    # 本地组件直接给出结论、无需调用 LLM 的比例
+                    hit_rate.add_metric(["local_router"], router["llm_calls_avoided"] / total)
+            gate = stats.get("relevance_gate")
+            if gate:
+                total = gate["relevant"] + gate["irrelevant"] + gate["uncertain"]
+                if total:
+                    hit_rate.add_metric(["relevance_gate"], gate["llm_calls_avoided"] / total)
+            screen = stats.get("compliance_screen")
+            if screen:
+                total = screen["clean"] + screen["redacted"] + screen["suspicious"]
+                if total:
+                    hit_rate.add_metric(["compliance_screen"], screen["llm_calls_avoided"] / total)
+        except Exception as e:
+            logger.warning(f"failed to collect cache metrics: {e}")
+        yield hit_rate
+
+
+REGISTRY.register(_RuntimeCollector())
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,12 +1,246 @@
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
-from pybreaker import CircuitBreaker
+import asyncio
+import functools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from pybreaker import STATE_OPEN, CircuitBreaker, CircuitBreakerError, CircuitBreakerListener
+from ..config import get_settings
+from .metrics import UPSTREAM_EVENTS
 
-breaker = CircuitBreaker(fail_max=3, reset_timeout=30)
+logger = logging.getLogger(__name__)
+_settings = get_settings()
+T = TypeVar("T")
 
+UPSTREAMS = ("chat", "embeddings", "weaviate")
 
-def with_retry_circuit(fn):
-    @retry(stop=stop_after_attempt(2), wait=wait_fixed(0.2))
-    def wrapped(*args, **kwargs):
-        return breaker.call(fn, *args, **kwargs)
+
+class _OpenedAt(CircuitBreakerListener):
+    """Remember when each breaker last opened, to admit calls without running them through it."""
+
+    def __init__(self):
+        self.opened: Dict[str, float] = {}
+
+    def state_change(self, cb, old_state, new_state):
+        if new_state.name == STATE_OPEN:
+            self.opened[cb.name] = time.monotonic()
+
+
+_opened_at = _OpenedAt()
+# 每个上游独立熔断，某一依赖故障不会拖垮其他调用
+breakers: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(fail_max=_settings.breaker_fail_max, reset_timeout=_settings.breaker_reset_seconds,
+                         listeners=[_opened_at], name=name)
+    for name in UPSTREAMS
+}
+_deadline: ContextVar[Optional[float]] = ContextVar("upstream_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request budget ran out before an upstream call could be made."""
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Bound upstream calls inside the block to ``seconds``; nested scopes only shrink it."""
+    deadline = None if seconds is None else time.monotonic() + max(0.0, seconds)
+    outer = _deadline.get()
+    if outer is not None and (deadline is None or outer < deadline):
+        deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget, or ``None`` when unbounded."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def budgeted_node(fn, share: float):
+    """Give an async graph node at most ``share`` of the request budget left when it starts."""
+    @functools.wraps(fn)
+    async def wrapped(state):
+        left = remaining()
+        with deadline_scope(None if left is None else left * share):
+            return await fn(state)
 
     return wrapped
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, used to pick the hedge delay."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# 按 上游 + 调用类别 分别统计：同一上游的短分类调用与长生成调用延迟相差数倍，混在一起会让生成调用几乎总被对冲
+_latency: Dict[str, LatencyTracker] = {}
+_latency_lock = threading.Lock()
+
+
+def _tracker(upstream: str, kind: str = "") -> LatencyTracker:
+    key = f"{upstream}:{kind}" if kind else upstream
+    with _latency_lock:
+        tracker = _latency.get(key)
+        if tracker is None:
+            tracker = _latency[key] = LatencyTracker()
+        return tracker
+
+
+def hedge_delay(upstream: str, kind: str = "") -> Optional[float]:
+    if not _settings.hedge_enabled:
+        return None
+    q = _tracker(upstream, kind).quantile(_settings.hedge_quantile, _settings.hedge_min_samples)
+    return None if q is None else max(q, _settings.hedge_min_delay_ms / 1000)
+
+
+def backoff(attempt: int) -> float:
+    # full jitter：在指数上限内均匀取值，避免重试同步成峰
+    cap = min(_settings.retry_backoff_max_ms, _settings.retry_backoff_base_ms * 2 ** attempt) / 1000
+    return random.uniform(0, cap)
+
+
+def _call_timeout(timeout: float) -> float:
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("request budget exhausted")
+    return min(timeout, left)
+
+
+async def _hedged(fn: Callable[[], Awaitable[T]], timeout: float, delay: Optional[float], upstream: str) -> T:
+    """Run ``fn``; if it is still pending after ``delay``, start one duplicate and keep the first success."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + timeout
+    pending = {asyncio.ensure_future(fn())}
+    hedge = None
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            now = loop.time()
+            if now >= deadline:
+                raise asyncio.TimeoutError()
+            until = deadline if delay is None or hedge is not None else min(deadline, start + delay)
+            done, pending = await asyncio.wait(pending, timeout=until - now, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        UPSTREAM_EVENTS.labels(upstream=upstream, event="hedge_won").inc()
+                    return task.result()
+                error = task.exception()
+            if not done and delay is not None and hedge is None and loop.time() >= start + delay:
+                UPSTREAM_EVENTS.labels(upstream=upstream, event="hedge").inc()
+                hedge = asyncio.ensure_future(fn())
+                pending.add(hedge)
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _rejecting(breaker: CircuitBreaker) -> bool:
+    """True while ``breaker`` is open and its reset timeout has not elapsed."""
+    if breaker.current_state != STATE_OPEN:
+        return False
+    opened = _opened_at.opened.get(breaker.name)
+    return opened is not None and time.monotonic() < opened + breaker.reset_timeout
+
+
+def _raise(error: Optional[BaseException]):
+    if error is not None:
+        raise error
+
+
+def _settle(breaker: CircuitBreaker, error: Optional[BaseException] = None):
+    """Record a finished call on ``breaker``; raises ``error`` (or ``CircuitBreakerError`` if it trips)."""
+    if _rejecting(breaker):
+        # 其他调用已让熔断器打开，迟到的结果不再计入
+        _raise(error)
+        return
+    breaker.call(_raise, error)
+
+
+async def call_upstream(upstream: str, fn: Callable[[], Awaitable[T]], timeout: float,
+                        retries: Optional[int] = None, hedge: bool = True, kind: str = "") -> T:
+    """Call one upstream with its breaker, a budget-capped timeout, jittered retries and hedging.
+
+    ``fn`` must be idempotent: it may run more than once, concurrently when hedged.
+    ``kind`` separates the latency statistics (and so the hedge delay) of
+    calls with different typical durations on the same upstream.
+    The outcome is recorded on the breaker only after the call finishes, so a
+    cancelled call (discarded speculation, client disconnect) counts neither as
+    a failure nor as a success that would close a half-open breaker.
+    """
+    retries = _settings.upstream_retries if retries is None else retries
+    breaker = breakers[upstream]
+    for attempt in range(retries + 1):
+        call_timeout = _call_timeout(timeout)
+        start = time.perf_counter()
+        try:
+            if _rejecting(breaker):
+                raise CircuitBreakerError(f"{upstream} circuit breaker is open")
+            try:
+                result = await _hedged(fn, call_timeout, hedge_delay(upstream, kind) if hedge else None, upstream)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _settle(breaker, e)
+            _settle(breaker)
+            _tracker(upstream, kind).record(time.perf_counter() - start)
+            return result
+        except CircuitBreakerError:
+            UPSTREAM_EVENTS.labels(upstream=upstream, event="breaker_open").inc()
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                UPSTREAM_EVENTS.labels(upstream=upstream, event="timeout").inc()
+            pause = backoff(attempt)
+            left = remaining()
+            if attempt >= retries or (left is not None and left <= pause):
+                raise
+            logger.info(f"{upstream} call failed ({type(e).__name__}: {e}), retrying in {pause * 1000:.0f}ms")
+            UPSTREAM_EVENTS.labels(upstream=upstream, event="retry").inc()
+            await asyncio.sleep(pause)
+
+
+def call_upstream_sync(upstream: str, fn: Callable[[], T], retries: Optional[int] = None) -> T:
+    """Blocking variant for thread-pool callers: breaker plus jittered retries, no hedging."""
+    retries = _settings.upstream_retries if retries is None else retries
+    breaker = breakers[upstream]
+    for attempt in range(retries + 1):
+        try:
+            # 批量入库的耗时不计入对冲延迟统计
+            return breaker.call(fn)
+        except CircuitBreakerError:
+            UPSTREAM_EVENTS.labels(upstream=upstream, event="breaker_open").inc()
+            raise
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            pause = backoff(attempt)
+            logger.info(f"{upstream} call failed ({type(e).__name__}: {e}), retrying in {pause * 1000:.0f}ms")
+            UPSTREAM_EVENTS.labels(upstream=upstream, event="retry").inc()
+            time.sleep(pause)
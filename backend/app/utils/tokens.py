@@ -0,0 +1,47 @@
+import logging
+import re
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# CJK 字符大致按 1 token 计，其余连续字符按约 4 字符 1 token 估算
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]")
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+
+
+@lru_cache(maxsize=4)
+def _get_encoding(name: str):
+    if not name:
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"tokenizer '{name}' unavailable, using heuristic token count: {e}")
+        return None
+
+
+def tokenizer_available(encoding: str) -> bool:
+    """Load ``encoding`` ahead of time (it may download its BPE file); ``False`` means heuristic counts."""
+    return _get_encoding(encoding) is not None
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used when no tokenizer is available."""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    rest = _CJK_RE.sub(" ", text)
+    count = cjk
+    for m in _WORD_RE.finditer(rest):
+        count += max(1, (len(m.group(0)) + 3) // 4)
+    return count
+
+
+def count_tokens(text: str, encoding: str = "") -> int:
+    if not text:
+        return 0
+    enc = _get_encoding(encoding)
+    if enc is None:
+        return estimate_tokens(text)
+    return len(enc.encode(text, disallowed_special=()))
@@ -0,0 +1,154 @@
+"""Deterministic OpenAI-compatible stand-in for chat completions and embeddings.
+
+Replies are chosen from the prompt (router -> ``rewrite``, relevance ->
+``relevant``, compliance -> ``compliant``, rewrites echo the query) so the
+agent graph takes its normal retrieval path. Latencies are drawn from a
+seeded distribution given as ``fixed:MS``, ``uniform:LO,HI`` or
+``lognormal:MEDIAN,SIGMA``.
+
+    python -m bench.fake_openai --port 9100 --chat-latency lognormal:300,0.4
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from typing import Callable, List
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+EMBED_DIM = 256
+_QUERY_RE = re.compile(r"(?:用户查询|原始查询|用户问题)：(.+)")
+
+
+def parse_latency(spec: str, seed: int = 0) -> Callable[[], float]:
+    """Return a sampler of latencies in seconds for ``spec``."""
+    rng = random.Random(seed)
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+        return lambda: rng.lognormvariate(math.log(median), sigma) / 1000
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+def fake_embedding(text: str) -> List[float]:
+    """Hashed character-bigram vector: similar texts get similar embeddings."""
+    vec = np.zeros(EMBED_DIM, dtype=np.float32)
+    text = text.lower()
+    for gram in (text[i:i + 2] for i in range(max(1, len(text) - 1))):
+        h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little")
+        vec[h % EMBED_DIM] += 1.0 if h & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(vec))
+    return (vec / norm if norm else vec).tolist()
+
+
+def fake_reply(prompt: str, answer_tokens: int) -> str:
+    m = _QUERY_RE.search(prompt)
+    query = m.group(1).strip() if m else ""
+    if "查询路由助手" in prompt:
+        return "rewrite"
+    if "文档相关性评估专家" in prompt:
+        return "relevant"
+    if "内容合规审核员" in prompt:
+        return "compliant"
+    if "查询重写专家" in prompt or "搜索专家" in prompt:
+        return query or "冰雪经济"
+    body = "根据检索到的资料，" + "冰雪经济持续发展，" * max(1, answer_tokens // 8)
+    return body[:max(1, answer_tokens)] + "。"
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+def create_app(chat_latency: str = "lognormal:300,0.4", embed_latency: str = "lognormal:40,0.3",
+               answer_tokens: int = 120, seed: int = 0) -> FastAPI:
+    app = FastAPI(title="fake-openai")
+    chat_sampler = parse_latency(chat_latency, seed)
+    embed_sampler = parse_latency(embed_latency, seed + 1)
+    app.state.calls = {"chat": 0, "embeddings": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        reply = fake_reply(prompt, answer_tokens)
+        latency = chat_sampler()
+        app.state.calls["chat"] += 1
+        base = {"id": f"chatcmpl-{app.state.calls['chat']}", "created": int(time.time()),
+                "model": body.get("model", "fake")}
+        usage = {"prompt_tokens": _tokens(prompt), "completion_tokens": _tokens(reply),
+                 "total_tokens": _tokens(prompt) + _tokens(reply)}
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {**base, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}]}
+
+        pieces = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+
+        async def stream():
+            # 首个 token 占总延迟的 30%，其余均匀分布在各片段之间
+            await asyncio.sleep(latency * 0.3)
+            for piece in pieces:
+                chunk = {**base, "object": "chat.completion.chunk", "choices": [
+                    {"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(latency * 0.7 / len(pieces))
+            done = {**base, "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        app.state.calls["embeddings"] += 1
+        await asyncio.sleep(embed_sampler())
+        data = []
+        for i, text in enumerate(inputs):
+            vec = fake_embedding(str(text))
+            if body.get("encoding_format") == "base64":
+                vec = base64.b64encode(np.asarray(vec, dtype="<f4").tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vec})
+        tokens = sum(_tokens(str(t)) for t in inputs)
+        return {"object": "list", "model": body.get("model", "fake"), "data": data,
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    @app.get("/v1/models")
+    def models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model"}]}
+
+    return app
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--chat-latency", default="lognormal:300,0.4")
+    parser.add_argument("--embed-latency", default="lognormal:40,0.3")
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    app = create_app(args.chat_latency, args.embed_latency, args.answer_tokens, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
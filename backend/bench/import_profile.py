@@ -0,0 +1,71 @@
+"""Report what importing the API costs at startup.
+
+Runs ``python -X importtime -c "import app.main"`` in a fresh interpreter
+and aggregates the self time by top-level package, plus the slowest
+individual modules by cumulative time.
+
+    cd backend && python -m bench.import_profile --top 15 --out bench/results/imports.json
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+from .loadgen import save_report
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def parse_importtime(text: str) -> List[Dict]:
+    """``[{"module", "self_us", "cumulative_us", "depth"}]`` from ``-X importtime`` output."""
+    rows = []
+    for line in text.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            rows.append({"module": m.group(4), "self_us": int(m.group(1)), "cumulative_us": int(m.group(2)),
+                         "depth": (len(m.group(3)) - 1) // 2})
+    return rows
+
+
+def summarize(rows: List[Dict], top: int = 15) -> Dict:
+    by_package: Dict[str, int] = defaultdict(int)
+    for r in rows:
+        by_package[r["module"].split(".")[0]] += r["self_us"]
+    total = sum(r["cumulative_us"] for r in rows if r["depth"] == 0)
+    return {
+        "total_ms": round(total / 1000, 1),
+        "modules": len(rows),
+        "packages": [{"package": p, "ms": round(us / 1000, 1)}
+                     for p, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]],
+        "slowest_modules": [{"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1)}
+                            for r in sorted(rows, key=lambda r: -r["cumulative_us"])[:top]],
+    }
+
+
+def profile(target: str = "app.main") -> List[Dict]:
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"], cwd=_BACKEND_DIR,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {target} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--out", help="also write the report as JSON")
+    args = parser.parse_args()
+    report = summarize(profile(args.target), args.top)
+    print(f"import {args.target}: {report['total_ms']} ms across {report['modules']} modules")
+    for row in report["packages"]:
+        print(f"  {row['ms']:>9.1f} ms  {row['package']}")
+    if args.out:
+        save_report(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
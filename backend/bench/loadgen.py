@@ -0,0 +1,187 @@
+"""Replay a query set against ``/api/chat`` at a fixed concurrency.
+
+Reports throughput, p50/p95/p99 latency and per-node / per-LLM-purpose
+breakdowns (from the server's ``/metrics`` deltas), writes the report as
+JSON and optionally fails when it regresses against a baseline report.
+
+    python -m bench.loadgen --url http://127.0.0.1:8000 --queries bench/queries.txt \\
+        --concurrency 8 --requests 200 --out bench/results/latest.json --baseline bench/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+# 回归检查比较的指标及方向（越大越差 / 越小越差）
+_REGRESSION_KEYS = {"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "throughput_rps": -1}
+
+
+def load_queries(path: str) -> List[str]:
+    """Read queries from a text file (one per line) or JSON lines (``query`` or ``title``)."""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                row = json.loads(line)
+                line = row.get("query") or row.get("title") or ""
+            if line:
+                queries.append(line)
+    if not queries:
+        raise ValueError(f"no queries in {path}")
+    return queries
+
+
+def percentiles(latencies_ms: List[float]) -> Dict[str, float]:
+    if not latencies_ms:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "max_ms": 0.0}
+    arr = np.asarray(latencies_ms)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2),
+            "mean_ms": round(float(arr.mean()), 2), "max_ms": round(float(arr.max()), 2)}
+
+
+def scrape_histograms(text: str) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """``{metric: {label: {"sum", "count"}}}`` for the node and LLM histograms."""
+    wanted = {"agentic_rag_node_seconds": "node", "agentic_rag_llm_seconds": "purpose"}
+    out: Dict[str, Dict[str, Dict[str, float]]] = {m: defaultdict(dict) for m in wanted}
+    for family in text_string_to_metric_families(text):
+        label = wanted.get(family.name)
+        if label is None:
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_sum"):
+                out[family.name][sample.labels[label]]["sum"] = sample.value
+            elif sample.name.endswith("_count"):
+                out[family.name][sample.labels[label]]["count"] = sample.value
+    return out
+
+
+def breakdown(before: Dict, after: Dict) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Per-label call counts and mean latency between two scrapes."""
+    result = {}
+    for metric, short in (("agentic_rag_node_seconds", "nodes"), ("agentic_rag_llm_seconds", "llm")):
+        rows = {}
+        for key, cur in after.get(metric, {}).items():
+            prev = before.get(metric, {}).get(key, {})
+            count = cur.get("count", 0) - prev.get("count", 0)
+            total = cur.get("sum", 0) - prev.get("sum", 0)
+            if count > 0:
+                rows[key] = {"count": int(count), "mean_ms": round(total / count * 1000, 2),
+                             "total_s": round(total, 3)}
+        result[short] = dict(sorted(rows.items(), key=lambda kv: -kv[1]["total_s"]))
+    return result
+
+
+async def run_load(url: str, queries: List[str], concurrency: int, total: int,
+                   timeout: float = 120.0, retrieval_mode: Optional[str] = None) -> Dict:
+    url = url.rstrip("/")
+    latencies: List[float] = []
+    errors: Dict[str, int] = defaultdict(int)
+    counter = iter(range(total))
+    run_id = uuid.uuid4().hex[:8]
+
+    async def worker(client: httpx.AsyncClient, wid: int):
+        for i in counter:
+            payload = {"session_id": f"bench-{run_id}-{wid}-{i}", "query": queries[i % len(queries)]}
+            if retrieval_mode:
+                payload["retrieval_mode"] = retrieval_mode
+            start = time.perf_counter()
+            try:
+                resp = await client.post(f"{url}/api/chat", json=payload)
+                if resp.status_code != 200:
+                    errors[f"http_{resp.status_code}"] += 1
+                    continue
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        before = scrape_histograms((await client.get(f"{url}/metrics")).text)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, w) for w in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        after = scrape_histograms((await client.get(f"{url}/metrics")).text)
+
+    return {
+        "config": {"url": url, "concurrency": concurrency, "requests": total, "queries": len(queries),
+                   "retrieval_mode": retrieval_mode},
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsed_s": round(elapsed, 3),
+        "completed": len(latencies),
+        "errors": dict(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        **percentiles(latencies),
+        "breakdown": breakdown(before, after),
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return human-readable regressions beyond ``tolerance`` (fractional)."""
+    problems = []
+    for key, direction in _REGRESSION_KEYS.items():
+        old, new = baseline.get(key), report.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * direction
+        if change > tolerance:
+            problems.append(f"{key}: {old} -> {new} ({change:+.1%} worse)")
+    if report.get("errors") and not baseline.get("errors"):
+        problems.append(f"errors: {report['errors']}")
+    return problems
+
+
+def save_report(report: Dict, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def add_load_arguments(parser: argparse.ArgumentParser):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument("--queries", default=os.path.join(here, "queries.txt"))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--retrieval-mode", choices=["vector", "bm25", "hybrid"])
+    parser.add_argument("--out", default=os.path.join(here, "results", "latest.json"))
+    parser.add_argument("--baseline", help="compare against this report and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed fractional regression")
+
+
+def finish(report: Dict, args) -> int:
+    save_report(report, args.out)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"report written to {args.out}")
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        problems = compare(report, json.load(f), args.tolerance)
+    for p in problems:
+        print(f"REGRESSION {p}")
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    add_load_arguments(parser)
+    args = parser.parse_args()
+    report = asyncio.run(run_load(args.url, load_queries(args.queries), args.concurrency, args.requests,
+                                  retrieval_mode=args.retrieval_mode))
+    sys.exit(finish(report, args))
+
+
+if __name__ == "__main__":
+    main()
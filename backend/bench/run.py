@@ -0,0 +1,115 @@
+"""End-to-end offline benchmark.
+
+Starts the fake OpenAI-compatible server and the API (embedded vector
+backend, throwaway data directory) as subprocesses, ingests a corpus via
+``/api/upload``, then runs the load generator against ``/api/chat``.
+
+    cd backend && python -m bench.run --concurrency 8 --requests 200 \\
+        --chat-latency lognormal:300,0.4 --baseline bench/results/baseline.json
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from .loadgen import add_load_arguments, finish, load_queries, run_load
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_DEFAULT_CORPUS = os.path.join(os.path.dirname(_BACKEND_DIR), "data", "content.txt")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def _ingest(api: str, corpus: list):
+    files = [("files", (os.path.basename(p), open(p, "rb"))) for p in corpus]
+    try:
+        resp = httpx.post(f"{api}/api/upload", files=files, timeout=60)
+        resp.raise_for_status()
+    finally:
+        for _, (_, f) in files:
+            f.close()
+    job_id = resp.json()["job_id"]
+    while True:
+        job = httpx.get(f"{api}/api/upload/jobs/{job_id}", timeout=10).json()
+        if job["status"] in ("done", "failed"):
+            print(f"ingested corpus: {job['status']} {job['progress']['chunks']}")
+            return
+        time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", nargs="+", default=[_DEFAULT_CORPUS], help="md/txt/pdf/docx files to ingest")
+    parser.add_argument("--chat-latency", default="lognormal:300,0.4")
+    parser.add_argument("--embed-latency", default="lognormal:40,0.3")
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--answer-cache", action="store_true", help="keep the answer cache enabled")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra settings for the API process")
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    fake_port, api_port = _free_port(), _free_port()
+    fake_url, api = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{api_port}"
+    data_dir = tempfile.mkdtemp(prefix="agenticrag-bench-")
+    env = {
+        **os.environ,
+        "SILICONCLOUD_API_KEY": "bench",
+        "SILICONCLOUD_BASE_URL": f"{fake_url}/v1",
+        "VECTOR_BACKEND": "embedded",
+        "EMBEDDED_INDEX_PATH": os.path.join(data_dir, "index"),
+        "EMBEDDING_CACHE_PATH": os.path.join(data_dir, "embedding_cache.sqlite3"),
+        "LOCAL_ROUTER_LOG_PATH": os.path.join(data_dir, "router.jsonl"),
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "LOG_LEVEL": "WARNING",
+    }
+    env.update(kv.split("=", 1) for kv in args.env)
+
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "bench.fake_openai", "--port", str(fake_port),
+                          "--chat-latency", args.chat_latency, "--embed-latency", args.embed_latency,
+                          "--answer-tokens", str(args.answer_tokens), "--seed", str(args.seed)],
+                         cwd=_BACKEND_DIR, env=env),
+        subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(api_port),
+                          "--log-level", "warning"], cwd=_BACKEND_DIR, env=env),
+    ]
+    try:
+        _wait_http(f"{fake_url}/v1/models")
+        _wait_http(f"{api}/readyz")
+        _ingest(api, args.corpus)
+        report = asyncio.run(run_load(api, load_queries(args.queries), args.concurrency, args.requests,
+                                      retrieval_mode=args.retrieval_mode))
+        report["config"].update({"chat_latency": args.chat_latency, "embed_latency": args.embed_latency,
+                                 "answer_cache": args.answer_cache, "corpus": args.corpus})
+        code = finish(report, args)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=10)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# 测试不能写入真实的路由训练日志：在导入 app 配置之前指向临时目录
+os.environ.setdefault(
+    "LOCAL_ROUTER_LOG_PATH", os.path.join(tempfile.mkdtemp(prefix="router-log-"), "router_decisions.jsonl")
+)
@@ -0,0 +1,73 @@
+import time
+from app.rag.answer_cache import AnswerCache
+
+
+def test_exact_match_ignores_case_and_trailing_punctuation():
+    cache = AnswerCache()
+    cache.put("如何推动冰雪经济？", "答案", ["a.md"])
+    hit = cache.get("如何推动冰雪经济")
+    assert hit["answer"] == "答案" and hit["match"] == "exact"
+
+
+def test_semantic_match_threshold():
+    cache = AnswerCache(similarity=0.9)
+    cache.put("冰雪经济政策", "答案", [], vector=[1.0, 0.0, 0.0])
+    assert cache.get("冰雪产业政策", vector=[0.99, 0.05, 0.0])["match"] == "semantic"
+    assert cache.get("装备参数", vector=[0.0, 1.0, 0.0]) is None
+
+
+def test_ttl_and_capacity():
+    cache = AnswerCache(capacity=2, ttl_seconds=0.05)
+    for q in ("a", "b", "c"):
+        cache.put(q, q, [])
+    assert cache.get("a") is None
+    time.sleep(0.06)
+    assert cache.get("c") is None
+
+
+def test_invalidate_rejects_stale_writes():
+    cache = AnswerCache()
+    generation = cache.generation
+    cache.put("q", "old", [])
+    cache.invalidate()
+    assert cache.get("q") is None
+    cache.put("q", "stale", [], generation=generation)
+    assert cache.get("q") is None
+
+
+def test_entries_are_scoped_by_retrieval_mode():
+    cache = AnswerCache(similarity=0.9)
+    cache.put("冰雪经济政策", "向量", [], vector=[1.0, 0.0], scope="vector")
+    assert cache.get("冰雪经济政策", scope="hybrid") is None
+    assert cache.get("冰雪产业政策", vector=[0.99, 0.05], scope="hybrid") is None
+    assert cache.get("冰雪产业政策", vector=[0.99, 0.05], scope="vector")["answer"] == "向量"
+
+
+def test_pipeline_skips_cache_for_sessions_with_history(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from app.rag import pipeline
+
+    class FakeLLM:
+        small_purposes = set()
+
+        async def acomplete(self, prompt, purpose=None, tier=None):
+            return "direct" if purpose == "router" else "新回答"
+
+        def tier_for(self, purpose):
+            return "large"
+
+        def is_degraded(self, text):
+            return False
+
+    cache = AnswerCache(similarity=0)
+    cache.put("你好", "缓存回答", [], scope=pipeline._settings.retrieval_mode)
+    monkeypatch.setattr(pipeline, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(pipeline, "get_vector_store", lambda: SimpleNamespace())
+    agent = pipeline.AgentPipeline(FakeLLM())
+    agent.local_router = None
+    assert asyncio.run(agent.arun("你好", SimpleNamespace(history=[])))["answer"] == "缓存回答"
+    history = [{"role": "user", "content": "我在哈尔滨"}, {"role": "assistant", "content": "好的"}]
+    assert asyncio.run(agent.arun("你好", SimpleNamespace(history=history)))["answer"] == "新回答"
+    assert asyncio.run(agent.arun("你好", SimpleNamespace(history=[]), retrieval_mode="hybrid"))["answer"] == "新回答"
+    assert cache.get("你好", scope=pipeline._settings.retrieval_mode)["answer"] == "缓存回答"
@@ -1,3 +1,4 @@
+import time
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -10,6 +11,14 @@ def test_healthz():
     assert r.json()["status"] == "ok"
 
 
+def test_liveness_and_readiness():
+    assert client.get("/livez").status_code == 200
+    # TestClient 未进入上下文时不触发启动预热，就绪检查应返回 503
+    r = client.get("/readyz")
+    assert r.status_code == 503
+    assert r.json()["components"]["llm"]["state"] == "pending"
+
+
 def test_chat_latency_and_shape():
     payload = {"session_id": "test", "query": "介绍系统架构"}
     r = client.post("/api/chat", json=payload)
@@ -19,8 +28,34 @@ def test_chat_latency_and_shape():
     assert "latency_ms" in data and data["latency_ms"] < 2000
 
 
+def test_chat_stream_events():
+    payload = {"session_id": "test-stream", "query": "你好", "stream": True}
+    with client.stream("POST", "/api/chat", json=payload) as r:
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/event-stream")
+        body = "".join(r.iter_text())
+    events = [line.split(": ", 1)[1] for line in body.splitlines() if line.startswith("event: ")]
+    assert events[0] == "stage"
+    assert events[-1] == "final"
+
+
 def test_upload_md():
     files = {"files": ("a.md", "# 标题\n内容".encode("utf-8"), "text/markdown")}
     r = client.post("/api/upload", files=files)
+    assert r.status_code == 202
+    job_id = r.json()["job_id"]
+    for _ in range(100):
+        job = client.get(f"/api/upload/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "done"
+    assert job["progress"]["files"]["parsed"] == 1
+
+
+def test_metrics_endpoint():
+    client.get("/healthz")
+    r = client.get("/metrics")
     assert r.status_code == 200
-    assert r.json()["status"] == "ok"
+    assert 'agentic_rag_http_request_seconds_count{method="GET",path="/healthz",status="200"}' in r.text
+    assert "agentic_rag_circuit_breaker_state" in r.text
@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+from bench.fake_openai import create_app, parse_latency
+from bench.import_profile import parse_importtime, summarize
+from bench.loadgen import breakdown, compare, percentiles
+
+
+def test_fake_server_replies_follow_the_graph():
+    client = TestClient(create_app(chat_latency="fixed:0", embed_latency="fixed:0"))
+    reply = client.post("/v1/chat/completions", json={
+        "model": "m", "messages": [{"role": "user", "content": "你是一个智能查询路由助手。\n用户查询：你好"}]})
+    assert reply.json()["choices"][0]["message"]["content"] == "rewrite"
+    body = {"model": "m", "input": ["冰雪经济", "冰雪经济"]}
+    data = client.post("/v1/embeddings", json=body).json()["data"]
+    assert data[0]["embedding"] == data[1]["embedding"] and len(data[0]["embedding"]) == 256
+
+
+def test_latency_sampler_is_seeded():
+    a, b = parse_latency("lognormal:100,0.5", seed=3), parse_latency("lognormal:100,0.5", seed=3)
+    assert [a() for _ in range(5)] == [b() for _ in range(5)]
+
+
+def test_report_math_and_regression_check():
+    stats = percentiles([float(i) for i in range(1, 101)])
+    assert stats["p50_ms"] == 50.5 and stats["p99_ms"] > stats["p95_ms"]
+    before = {"agentic_rag_node_seconds": {"generate": {"sum": 1.0, "count": 2}}}
+    after = {"agentic_rag_node_seconds": {"generate": {"sum": 3.0, "count": 6}}}
+    assert breakdown(before, after)["nodes"]["generate"]["mean_ms"] == 500.0
+    baseline = {"p50_ms": 100.0, "p95_ms": 200.0, "p99_ms": 300.0, "throughput_rps": 10.0}
+    assert compare({**baseline, "p95_ms": 210.0}, baseline, 0.1) == []
+    assert len(compare({**baseline, "throughput_rps": 5.0}, baseline, 0.1)) == 1
+
+
+def test_import_profile_aggregates_by_package():
+    text = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:      1000 |       1000 |     langchain.schema",
+        "import time:      3000 |       4000 |   langchain",
+        "import time:       500 |       4500 | app.main",
+    ])
+    rows = parse_importtime(text)
+    assert [r["depth"] for r in rows] == [2, 1, 0]
+    report = summarize(rows, top=2)
+    assert report["total_ms"] == 4.5
+    assert report["packages"][0] == {"package": "langchain", "ms": 4.0}
@@ -0,0 +1,44 @@
+from app.rag.chunker import StreamingChunker, iter_chunks
+from app.config import Settings
+
+
+def _chunk(text, pieces=None, **kwargs):
+    chunker = StreamingChunker("doc.md", **kwargs)
+    out = []
+    for piece in pieces or [text]:
+        out.extend(chunker.feed(piece))
+    out.extend(chunker.close())
+    return out
+
+
+def test_markdown_sections_and_offsets():
+    text = "# 冰雪经济\n概述段落。\n\n## 政策\n第一条政策。第二条政策。\n\n## 装备\n装备说明。\n"
+    chunks = _chunk(text, chunk_size=64, overlap=0)
+    assert [c["section"] for c in chunks] == ["冰雪经济", "冰雪经济 > 政策", "冰雪经济 > 装备"]
+    for c in chunks:
+        assert text[c["start_offset"]:c["end_offset"]] == c["text"]
+
+
+def test_token_limit_and_overlap():
+    text = "".join(f"第{i}句话内容较长一些。" for i in range(60))
+    chunks = _chunk(text, chunk_size=40, overlap=15)
+    assert len(chunks) > 1
+    assert all(c["token_count"] <= 40 for c in chunks)
+    # 相邻分块之间存在重叠
+    assert chunks[1]["start_offset"] < chunks[0]["end_offset"]
+    assert [c["chunk_index"] for c in chunks] == list(range(len(chunks)))
+
+
+def test_streamed_pieces_match_single_pass():
+    text = "\n\n".join(f"段落{i}。" + "内容。" * 20 for i in range(10))
+    whole = _chunk(text, chunk_size=50, overlap=8)
+    pieces = [text[i:i + 37] for i in range(0, len(text), 37)]
+    streamed = _chunk(text, pieces=pieces, chunk_size=50, overlap=8)
+    assert [c["text"] for c in streamed] == [c["text"] for c in whole]
+
+
+def test_iter_chunks_uses_settings():
+    settings = Settings(chunk_size_tokens=16, chunk_overlap_tokens=0)
+    chunks = list(iter_chunks(["一二三四五六七八九十。" * 5], "a.txt", settings))
+    assert chunks and all(c["source"] == "a.txt" for c in chunks)
+    assert all(c["token_count"] <= 16 for c in chunks)
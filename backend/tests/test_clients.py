@@ -0,0 +1,19 @@
+import asyncio
+from app.config import Settings
+from app.services import clients
+from app.services.clients import ClientRegistry
+
+
+def test_registry_shares_tuned_pools():
+    registry = ClientRegistry(Settings(http_max_connections=7, http_max_keepalive_connections=3, http2_enabled=False))
+    assert registry.http_client is registry.http_client
+    assert registry.http_async_client is registry.http_async_client
+    pool = registry.http_async_client._transport._pool
+    assert pool._max_connections == 7 and pool._max_keepalive_connections == 3
+    assert asyncio.run(registry.prewarm()) == 0  # 未配置密钥时不预热
+    asyncio.run(registry.aclose())
+
+
+def test_get_llm_is_process_wide_singleton(monkeypatch):
+    monkeypatch.setattr(clients, "_llm", None)
+    assert clients.get_llm() is clients.get_llm()
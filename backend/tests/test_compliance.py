@@ -0,0 +1,88 @@
+from app.config import Settings
+from app.rag.compliance import CLEAN, REDACTED, SUSPICIOUS, AhoCorasick, ComplianceScreen
+
+
+def test_automaton_finds_overlapping_patterns():
+    matcher = AhoCorasick(["he", "she", "hers", "洗钱", "HIS"])
+    assert matcher.find_all("ushers 帮他洗钱 His") == [(1, "she"), (2, "he"), (2, "hers"), (9, "洗钱"), (12, "his")]
+    assert len(matcher) == 5
+
+
+def test_pii_is_masked_only_when_checksums_match():
+    screen = ComplianceScreen()
+    text, counts = screen.redact(
+        "电话 13812345678，邮箱 zhang.san@example.com，身份证 11010519491231002X，"
+        "卡号 4111111111111111，编号 110105194912310021"
+    )
+    assert "138****5678" in text and "z***@example.com" in text
+    assert "110105********002X" in text and "************1111" in text
+    # 校验位不符的 18 位数字不是身份证，保留原文
+    assert "110105194912310021" in text
+    assert counts == {"id_card": 1, "bank_card": 1, "phone": 1, "email": 1}
+
+
+def test_screen_escalates_only_lexicon_hits(tmp_path):
+    lexicon = tmp_path / "lexicon.txt"
+    lexicon.write_text("# 自定义词表\n内幕交易\n", encoding="utf-8")
+    screen = ComplianceScreen.from_settings(Settings(compliance_lexicon_path=str(lexicon)))
+    assert screen.screen("冰雪经济持续升温。").verdict == CLEAN
+    redacted = screen.screen("请致电 13812345678 咨询。")
+    assert redacted.verdict == REDACTED and "138****5678" in redacted.text
+    flagged = screen.screen("可以通过内幕交易获利")
+    assert flagged.verdict == SUSPICIOUS and flagged.terms == ["内幕交易"]
+    stats = screen.stats()
+    assert stats["llm_calls_avoided"] == 2 and stats[SUSPICIOUS] == 1
+    assert stats["pii_redacted"] == {"phone": 1}
+
+
+def _stream(screen, tokens):
+    stream = screen.stream()
+    return "".join(stream.feed(t) for t in tokens) + stream.flush()
+
+
+def test_stream_masks_pii_split_across_tokens():
+    screen = ComplianceScreen()
+    text = "请致电 138 1234 5678 或发邮件到 zhang.san@example.com，谢谢。"
+    streamed = _stream(screen, list(text))
+    assert streamed == screen.redact(text)[0]
+    assert "5678" in streamed and "1234" not in streamed and "zhang.san" not in streamed
+
+
+def test_stream_stops_at_lexicon_terms():
+    screen = ComplianceScreen(["内幕交易"])
+    stream = screen.stream()
+    released = "".join(stream.feed(t) for t in ["可以", "通过内", "幕交", "易获利", "。"]) + stream.flush()
+    assert released == "可以通过"
+    assert stream.held
+
+
+def test_streamed_generation_is_screened(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from app.rag import pipeline
+
+    class FakeLLM:
+        async def astream(self, prompt, purpose=None):
+            for token in ["电话 1381", "2345678", " 。"]:
+                yield token
+
+    monkeypatch.setattr(pipeline, "get_vector_store", lambda: SimpleNamespace())
+    agent = pipeline.AgentPipeline(FakeLLM())
+    agent.compliance_screen = ComplianceScreen()
+
+    async def run():
+        ctx = pipeline._RunContext(events=asyncio.Queue())
+        token = pipeline._run_ctx.set(ctx)
+        try:
+            answer = await agent._complete_streaming("p", purpose="generate")
+        finally:
+            pipeline._run_ctx.reset(token)
+        events = []
+        while not ctx.events.empty():
+            events.append(ctx.events.get_nowait())
+        return answer, events, ctx
+
+    answer, events, ctx = asyncio.run(run())
+    assert answer == "电话 13812345678 。"
+    sent = "".join(data["text"] for event, data in events if event == "token")
+    assert sent == "电话 138****5678 。" == "".join(ctx.streamed)
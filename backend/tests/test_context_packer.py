@@ -0,0 +1,54 @@
+from app.rag.context_packer import ContextPacker
+
+
+def _doc(text, source="a.md"):
+    return {"text": text, "source": source}
+
+
+def test_drops_near_duplicates_and_fits_budget():
+    packer = ContextPacker(max_tokens=120, min_passage_tokens=5)
+    base = "冰雪经济是以冰雪资源为载体的产业形态。" * 3
+    docs = [_doc(base), _doc(base + "补充"), _doc("造雪机的技术参数包括功率和射程。", "specs.md")]
+    packed = packer.pack("冰雪经济是什么", docs, [], "指令：用户问题：冰雪经济是什么")
+    assert packed.duplicates == 1
+    assert [p["source"] for p in packed.passages] == ["a.md", "specs.md"]
+    assert packed.total_tokens <= 120
+
+
+def test_trims_long_passage_to_matching_sentences():
+    packer = ContextPacker(max_tokens=60, history_share=0.0, min_passage_tokens=5)
+    filler = "这一句与问题无关，只是用于占位的填充内容。" * 4
+    doc = _doc(filler + "滑雪场安全管理需要配备救援人员。" + filler)
+    packed = packer.pack("滑雪场安全管理", [doc], [], "问题：滑雪场安全管理")
+    assert packed.trimmed == 1
+    assert "救援人员" in packed.passages[0]["text"]
+    assert packed.context_tokens <= 60 - packed.instruction_tokens
+
+
+def test_history_keeps_newest_messages_within_share():
+    packer = ContextPacker(max_tokens=100, history_share=0.3)
+    history = [{"role": "user", "content": f"第{i}个问题的内容比较长一些"} for i in range(10)]
+    packed = packer.pack("问题", [], history, "指令")
+    assert packed.history and packed.history[-1] == history[-1]
+    assert packed.history_tokens <= int((100 - packed.instruction_tokens) * 0.3)
+    assert packer.stats()["requests"] == 1
+
+
+def test_sources_only_cite_packed_passages(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from app.rag import pipeline
+    from app.rag.pipeline import AgentPipeline
+
+    class FakeLLM:
+        async def acomplete(self, prompt, purpose=None, tier=None):
+            return "回答"
+
+    monkeypatch.setattr(pipeline, "get_vector_store", lambda: SimpleNamespace())
+    agent = AgentPipeline(FakeLLM())
+    agent.packer = ContextPacker()
+    text = "滑雪场安全管理需要配备专职救援人员与急救设备。"
+    docs = [_doc(text), _doc(text + "。", "copy.md")]
+    update = asyncio.run(agent._generate({"query": "滑雪场安全管理", "context": docs, "history": []}))
+    assert update["packing"]["duplicates"] == 1
+    assert update["sources"] == ["a.md"]
@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from app.services.dispatch import MicroBatcher, SingleFlight
+
+
+def test_single_flight_coalesces_identical_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def upstream(prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.02)
+        return prompt.upper()
+
+    async def main():
+        return await asyncio.gather(*(flight.do(p, lambda p=p: upstream(p)) for p in ["a", "a", "a", "b"]))
+
+    results = asyncio.run(main())
+    assert [text for text, _ in results] == ["A", "A", "A", "B"]
+    assert [shared for _, shared in results] == [False, True, True, False]
+    assert sorted(calls) == ["a", "b"]
+    assert flight.stats()["coalesced"] == 2
+
+
+def test_single_flight_survives_leader_cancellation_and_shares_errors():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("k", failing))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("k", failing))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(RuntimeError):
+            await follower
+
+    asyncio.run(main())
+    assert flight.stats()["upstream_calls"] == 1
+
+
+def test_micro_batcher_groups_concurrent_requests():
+    batches = []
+
+    async def embed(texts):
+        batches.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    batcher = MicroBatcher(embed, window_ms=5, max_batch=3)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(t) for t in ["a", "bb", "a", "ccc", "dddd"]))
+
+    assert asyncio.run(main()) == [[1.0], [2.0], [1.0], [3.0], [4.0]]
+    # 前三个请求达到上限立即发出（重复项只发送一次），其余在窗口结束后发出
+    assert batches == [["a", "bb"], ["ccc", "dddd"]]
+    assert batcher.stats() == {"requests": 5, "batches": 2, "avg_batch_size": 2.0}
+
+
+def test_micro_batcher_propagates_errors():
+    async def embed(texts):
+        raise ValueError("bad input")
+
+    batcher = MicroBatcher(embed, window_ms=1)
+
+    async def main():
+        return await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+
+
+def test_micro_batcher_resolves_every_waiter():
+    async def short(texts):
+        return [[1.0]]
+
+    async def hang(texts):
+        await asyncio.sleep(10)
+
+    async def main():
+        batcher = MicroBatcher(short, window_ms=1)
+        with pytest.raises(ValueError):
+            await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+        batcher = MicroBatcher(hang, window_ms=1)
+        waiter = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0.01)
+        for task in list(batcher._tasks):
+            task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+import numpy as np
+from app.rag.backends import EmbeddedBackend
+
+
+def _docs():
+    return [
+        {"text": "冰雪经济发展政策", "source": "policy.md", "chunk_index": 0},
+        {"text": "SX-200 造雪机技术参数", "source": "specs.json", "chunk_index": 0},
+        {"text": "滑雪场安全管理规范", "source": "safety.md", "chunk_index": 0},
+    ]
+
+
+def test_vector_and_keyword_search_persist(tmp_path):
+    backend = EmbeddedBackend(str(tmp_path))
+    backend.insert(_docs(), [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    hits = backend.vector_search([0.1, 0.9, 0.0], top_k=2)
+    assert hits[0]["source"] == "specs.json" and hits[0]["score_type"] == "vector"
+    assert hits[0]["score"] > hits[1]["score"]
+
+    reloaded = EmbeddedBackend(str(tmp_path))
+    assert reloaded.stats()["rows"] == 3
+    assert reloaded.keyword_search("造雪机参数", top_k=1)[0]["source"] == "specs.json"
+    assert reloaded.vector_search([0.0, 0.0, 1.0], top_k=1)[0]["source"] == "safety.md"
+
+
+def test_batch_search_and_ivf(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(300, 8)).astype(np.float32)
+    backend = EmbeddedBackend(str(tmp_path), ivf_min_rows=100, ivf_nprobe=17)
+    backend.insert([{"text": f"doc {i}", "source": str(i)} for i in range(300)], vectors.tolist())
+    results = backend.batch_vector_search([vectors[5].tolist(), vectors[42].tolist()], top_k=3)
+    assert [r[0]["source"] for r in results] == ["5", "42"]
+    assert backend.stats()["ivf"]
+
+
+def test_recreate_clears_index(tmp_path):
+    backend = EmbeddedBackend(str(tmp_path))
+    backend.insert(_docs(), [])
+    assert backend.keyword_search("冰雪", top_k=3)
+    backend.recreate()
+    assert EmbeddedBackend(str(tmp_path)).stats()["rows"] == 0
+
+
+def test_delete_and_list_sources(tmp_path):
+    backend = EmbeddedBackend(str(tmp_path))
+    docs = [dict(d, id=f"id-{i}") for i, d in enumerate(_docs())]
+    backend.insert(docs, [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    assert backend.ids_for_source("specs.json") == {"id-1"}
+    assert backend.delete_source("specs.json") == 1
+    assert backend.list_sources() == {"policy.md": 1, "safety.md": 1}
+    reloaded = EmbeddedBackend(str(tmp_path))
+    assert reloaded.vector_search([0.0, 0.0, 1.0], top_k=1)[0]["source"] == "safety.md"
+    assert not reloaded.keyword_search("造雪机", top_k=1)
+    assert reloaded.vector_search([0.0, 1.0, 0.0], top_k=3)[0]["source"] != "specs.json"
+
+
+def test_delete_records_tombstones_and_compacts_in_background(tmp_path):
+    backend = EmbeddedBackend(str(tmp_path))
+    vectors = np.eye(8, dtype=np.float32)
+    backend.insert([{"id": f"id-{i}", "text": f"doc {i}", "source": str(i)} for i in range(8)], vectors.tolist())
+    segment = tmp_path / "vectors" / "seg-00000001.npy"
+    mtime = segment.stat().st_mtime_ns
+    # 删除少量行只写删除记录，不重写向量与对象文件
+    assert backend.delete_ids({"id-3"}) == 1
+    backend.wait_for_compaction()
+    assert segment.stat().st_mtime_ns == mtime
+    assert backend.stats()["deleted"] == 1
+    assert sorted(h["source"] for h in backend.vector_search(vectors[3].tolist(), top_k=8)) == \
+        [str(i) for i in range(8) if i != 3]
+    assert EmbeddedBackend(str(tmp_path)).list_sources() == {str(i): 1 for i in range(8) if i != 3}
+
+    # 删除行达到四分之一后在后台合并，之后的行号重新编排
+    assert backend.delete_ids({"id-0"}) == 1
+    backend.wait_for_compaction()
+    assert backend.stats() == dict(backend.stats(), rows=6, deleted=0, segments=0)
+    assert not segment.exists()
+    assert backend.delete_ids({"id-7"}) == 1
+    backend.insert([{"id": "id-8", "text": "doc 8", "source": "8"}], [vectors[7].tolist()])
+    reloaded = EmbeddedBackend(str(tmp_path))
+    assert reloaded.list_sources() == {"1": 1, "2": 1, "4": 1, "5": 1, "6": 1, "8": 1}
+    assert reloaded.vector_search(vectors[7].tolist(), top_k=1)[0]["source"] == "8"
+    assert len(reloaded.keyword_search("doc", top_k=10)) == 6
+
+
+def test_inserts_append_segments_and_compact(tmp_path, monkeypatch):
+    from app.rag.backends import embedded
+    monkeypatch.setattr(embedded, "_COMPACT_MIN_ROWS", 4)
+    backend = EmbeddedBackend(str(tmp_path))
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(9, 4)).astype(np.float32)
+    for i in range(0, 9, 3):
+        backend.insert([{"text": f"doc {j}", "source": str(j)} for j in range(i, i + 3)], vectors[i:i + 3].tolist())
+        backend.wait_for_compaction()
+    # 3 + 3 行后在后台合并为基础段（预留序号 3），最后一批仍是追加段
+    assert backend.stats()["segments"] == 1
+    assert sorted(p.name for p in (tmp_path / "vectors").iterdir()) == ["base-00000003.npy", "seg-00000004.npy"]
+    reloaded = EmbeddedBackend(str(tmp_path))
+    assert [reloaded.vector_search(v.tolist(), top_k=1)[0]["source"] for v in vectors] == [str(j) for j in range(9)]
+
+
+def test_recovery_truncates_to_the_shorter_side(tmp_path):
+    backend = EmbeddedBackend(str(tmp_path))
+    backend.insert(_docs(), [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    # 模拟写入向量段后、追加对象前崩溃
+    np.save(tmp_path / "vectors" / "seg-00000002.npy", np.ones((2, 3), dtype=np.float32))
+    reloaded = EmbeddedBackend(str(tmp_path))
+    assert reloaded.stats()["rows"] == 3
+    assert reloaded.vector_search([0.0, 0.0, 1.0], top_k=1)[0]["source"] == "safety.md"
+
+    # 对象多于向量时截掉多出的对象，保留已有向量
+    with open(tmp_path / "objects.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"id": "orphan", "text": "孤立对象", "source": "x.md"}\n')
+    again = EmbeddedBackend(str(tmp_path))
+    assert again.list_sources() == {"policy.md": 1, "specs.json": 1, "safety.md": 1}
+    assert again.vector_search([0.0, 1.0, 0.0], top_k=1)[0]["source"] == "specs.json"
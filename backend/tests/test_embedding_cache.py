@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from app.rag.embedding_cache import EmbeddingCache
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+
+def test_memory_hits_and_dedup(tmp_path):
+    cache = EmbeddingCache("m", path=str(tmp_path / "emb.sqlite3"), capacity=16)
+    embed = CountingEmbedder()
+    first = cache.embed_texts(["冰雪 经济", "装备", "冰雪  经济"], embed)
+    assert embed.calls == [["冰雪 经济", "装备"]]
+    assert first[0] == first[2]
+    cache.embed_texts(["装备"], embed)
+    assert len(embed.calls) == 1
+    assert cache.stats()["memory_hits"] >= 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "emb.sqlite3")
+    embed = CountingEmbedder()
+    EmbeddingCache("m", path=path).embed_texts(["政策"], embed)
+    reopened = EmbeddingCache("m", path=path)
+    assert reopened.embed_texts(["政策"], embed) == [[2.0, 1.0, 0.5]]
+    assert len(embed.calls) == 1
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_model_and_kind_are_part_of_key(tmp_path):
+    path = str(tmp_path / "emb.sqlite3")
+    embed = CountingEmbedder()
+    EmbeddingCache("m1", path=path).embed_texts(["政策"], embed)
+    EmbeddingCache("m2", path=path).embed_texts(["政策"], embed)
+    EmbeddingCache("m1", path=path).embed_query("政策", lambda t: embed([t])[0])
+    assert len(embed.calls) == 3
+
+
+def test_async_queries_keep_sqlite_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "emb.sqlite3")
+    EmbeddingCache("m", path=path).embed_query("滑雪", lambda q: [1.0, 0.0])
+    cache = EmbeddingCache("m", path=path)
+    threads = []
+    for name in ("_fetch", "_write"):
+        original = getattr(cache, name)
+        def traced(*args, original=original):
+            threads.append(threading.current_thread())
+            return original(*args)
+        setattr(cache, name, traced)
+
+    async def embed(q):
+        return [0.0, 1.0]
+
+    async def main():
+        return [await cache.aembed_query(q, embed) for q in ("滑雪", "冰雪", "冰雪")]
+
+    assert asyncio.run(main()) == [[1.0, 0.0], [0.0, 1.0], [0.0, 1.0]]
+    # 磁盘命中与新向量写入各一次，第三次查询命中内存
+    assert len(threads) == 3 and threading.main_thread() not in threads
+    assert cache.stats()["memory_hits"] == 1
@@ -0,0 +1,22 @@
+from app.rag.fusion import fuse_results
+
+
+def _item(oid, score, score_type):
+    return {"id": oid, "text": oid, "score": score, "score_type": score_type}
+
+
+def test_rrf_dedupes_and_prefers_shared_results():
+    vector = [_item("a", 0.9, "vector"), _item("b", 0.8, "vector")]
+    keyword = [_item("c", 7.0, "bm25"), _item("b", 5.0, "bm25")]
+    fused = fuse_results([vector, keyword], top_k=3)
+    assert [r["id"] for r in fused][0] == "b"
+    assert len({r["id"] for r in fused}) == 3
+    # 重复结果保留向量分数，供相关性判断使用
+    assert fused[0]["score_type"] == "vector"
+
+
+def test_weighted_fusion_respects_weights():
+    vector = [_item("a", 0.9, "vector"), _item("b", 0.1, "vector")]
+    keyword = [_item("b", 9.0, "bm25"), _item("a", 1.0, "bm25")]
+    assert fuse_results([vector, keyword], 1, method="weighted", weights=[0.8, 0.2])[0]["id"] == "a"
+    assert fuse_results([vector, keyword], 1, method="weighted", weights=[0.2, 0.8])[0]["id"] == "b"
@@ -0,0 +1,56 @@
+import pytest
+from app.rag.backends import EmbeddedBackend
+from app.rag.vector_store import VectorStore, chunk_id
+
+
+def _chunks(source, texts):
+    return [{"text": t, "source": source, "chunk_index": i} for i, t in enumerate(texts)]
+
+
+def test_chunk_ids_are_deterministic():
+    assert chunk_id("a.md", "内容") == chunk_id("a.md", "内容")
+    assert chunk_id("a.md", "内容") != chunk_id("b.md", "内容")
+
+
+def test_reingest_skips_unchanged_and_deletes_stale(tmp_path):
+    vs = VectorStore(EmbeddedBackend(str(tmp_path)))
+    first = vs.upsert_documents(_chunks("a.md", ["冰雪经济", "造雪机参数", "安全规范"]))
+    assert first == {"inserted": 3, "skipped": 0, "deleted": 0, "sources": 1}
+
+    second = vs.upsert_documents(_chunks("a.md", ["冰雪经济", "造雪机参数（修订）", "安全规范"]))
+    assert second == {"inserted": 1, "skipped": 2, "deleted": 1, "sources": 1}
+    assert vs.list_sources() == {"a.md": 3}
+
+    vs.upsert_documents(_chunks("b.md", ["滑雪场"]))
+    assert vs.delete_source("a.md") == 3
+    assert vs.list_sources() == {"b.md": 1}
+
+
+class _Model:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def get_text_embedding_batch(self, texts):
+        if self.fail:
+            raise ConnectionError("embeddings down")
+        return [[1.0, float(len(t))] for t in texts]
+
+
+def test_vectorless_chunks_are_reembedded_once_a_model_is_configured(tmp_path, monkeypatch):
+    from app.rag import vector_store
+    from app.utils import retry
+    monkeypatch.setattr(vector_store, "get_embedding_cache", lambda: None)
+    monkeypatch.setattr(retry, "backoff", lambda attempt: 0.0)
+    vs = VectorStore(EmbeddedBackend(str(tmp_path)))
+    chunks = _chunks("a.md", ["冰雪经济", "安全规范"])
+    assert vs.upsert_documents(chunks)["inserted"] == 2
+
+    monkeypatch.setattr(vector_store, "_embed_model", lambda: _Model(fail=True))
+    with pytest.raises(vector_store.EmbeddingError):
+        vs.upsert_documents(chunks)
+    retry.breakers["embeddings"].close()
+    assert vs.list_sources() == {"a.md": 2}
+
+    monkeypatch.setattr(vector_store, "_embed_model", lambda: _Model())
+    assert vs.upsert_documents(chunks) == {"inserted": 2, "skipped": 0, "deleted": 2, "sources": 1}
+    assert vs.backend.ids_for_source("a.md") == {chunk_id("a.md", "冰雪经济"), chunk_id("a.md", "安全规范")}
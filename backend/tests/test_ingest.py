@@ -0,0 +1,98 @@
+import time
+import pytest
+from app.rag.backends import EmbeddedBackend
+from app.rag.vector_store import VectorStore
+from app.services import ingest
+from app.services.ingest import IngestionQueue
+
+
+def _wait(queue, job_id):
+    job = queue.wait(job_id, timeout=60)
+    assert job.finished.is_set(), "job did not finish"
+    return job.to_dict()
+
+
+def test_job_runs_stages_and_reports_progress(tmp_path, monkeypatch):
+    vs = VectorStore(EmbeddedBackend(str(tmp_path)))
+    monkeypatch.setattr(ingest, "get_vector_store", lambda: vs)
+    queue = IngestionQueue(workers=1, stage_queue_size=2)
+    text = "\n\n".join(f"第{i}段：冰雪经济相关内容。" for i in range(20))
+
+    def spool(name, content):
+        path = tmp_path / f"spool-{time.monotonic_ns()}-{name}"
+        path.write_bytes(content)
+        return name, str(path)
+
+    job = _wait(queue, queue.submit([spool("a.md", text.encode("utf-8")), spool("b.pdf", b"not a pdf")]).id)
+    assert job["status"] == "done"
+    assert job["progress"]["files"] == {"total": 2, "parsed": 1}
+    assert [(e["stage"], e["file"]) for e in job["errors"]] == [("parse", "b.pdf")]
+    assert job["progress"]["chunks"]["inserted"] == vs.list_sources()["a.md"]
+    # 落盘的上传文件在任务结束后被清理
+    assert not list(tmp_path.glob("spool-*"))
+
+    again = _wait(queue, queue.submit([spool("a.md", text.encode("utf-8"))]).id)
+    assert again["progress"]["chunks"]["inserted"] == 0
+    assert again["progress"]["chunks"]["skipped"] == job["progress"]["chunks"]["inserted"]
+
+    # 空文件重新上传时不删除该来源已有的分块
+    empty = _wait(queue, queue.submit([spool("a.md", b"")]).id)
+    assert empty["progress"]["chunks"]["deleted"] == 0
+    assert empty["errors"] == [{"stage": "parse", "file": "a.md", "error": "no text extracted"}]
+    assert vs.list_sources()["a.md"] == job["progress"]["chunks"]["inserted"]
+
+
+def test_embed_failure_keeps_previous_chunks(tmp_path, monkeypatch):
+    from app.rag.vector_store import EmbeddingError
+
+    vs = VectorStore(EmbeddedBackend(str(tmp_path)))
+    monkeypatch.setattr(ingest, "get_vector_store", lambda: vs)
+    queue = IngestionQueue(workers=1)
+
+    def spool(content):
+        path = tmp_path / f"spool-{time.monotonic_ns()}.md"
+        path.write_text(content, encoding="utf-8")
+        return "a.md", str(path)
+
+    first = _wait(queue, queue.submit([spool("冰雪经济相关内容。")]).id)
+    stored = vs.list_sources()["a.md"]
+    assert first["status"] == "done" and stored
+
+    def fail(texts):
+        raise EmbeddingError("embeddings down")
+
+    monkeypatch.setattr(vs, "embed_texts", fail)
+    # 修改后的内容嵌入失败：旧分块不能被当作过期分块删除
+    failed = _wait(queue, queue.submit([spool("冰雪经济修订后的内容。")]).id)
+    assert failed["progress"]["chunks"]["deleted"] == 0
+    assert [(e["stage"], e["sources"]) for e in failed["errors"]] == [("embed", ["a.md"])]
+    assert vs.list_sources()["a.md"] == stored
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_parser_pool_extracts_docx_and_enforces_timeout(tmp_path):
+    import asyncio
+    from docx import Document
+    from app.rag.document_loader import ParserPool, iter_text_file
+
+    path = str(tmp_path / "a.docx")
+    doc = Document()
+    for text in ("第一段", "第二段"):
+        doc.add_paragraph(text)
+    doc.save(path)
+
+    pool = ParserPool(workers=1, timeout=1.0)
+    try:
+        text_path = asyncio.run(pool.extract("a.docx", path))
+        assert "".join(iter_text_file(text_path)) == "第一段\n第二段\n"
+        with pytest.raises(TimeoutError):
+            asyncio.run(pool.run(_sleep, 5))
+        assert pool.timeouts == 1
+        # 超时后进程池被重建，后续任务仍可执行
+        assert asyncio.run(pool.run(_sleep, 0)) == 0
+    finally:
+        pool.shutdown()
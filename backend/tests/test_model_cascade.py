@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+from app.config import Settings
+from app.rag import pipeline
+from app.rag.pipeline import AgentPipeline, parse_compliance, parse_relevance, parse_route
+from app.services.llm_siliconcloud import LARGE, SMALL, SiliconCloudLLM
+
+
+class FakeAdapter:
+    def __init__(self, name, reply):
+        self.name = name
+        self.reply = reply
+        self.prompts = []
+
+    async def acomplete(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text=self.reply, raw=None)
+
+
+def _llm(small_reply, large_reply):
+    llm = SiliconCloudLLM(Settings(siliconcloud_api_key=""))
+    llm._adapter = FakeAdapter(LARGE, large_reply)
+    llm._adapters = {LARGE: llm._adapter, SMALL: FakeAdapter(SMALL, small_reply)}
+    return llm
+
+
+def _pipeline(monkeypatch, llm):
+    monkeypatch.setattr(pipeline, "get_vector_store", lambda: SimpleNamespace())
+    return AgentPipeline(llm)
+
+
+def test_parsers_reject_ambiguous_replies():
+    assert parse_route("Rewrite.") == "rewrite"
+    assert parse_route("direct or rewrite") is None
+    assert parse_relevance("irrelevant") is False
+    assert parse_relevance("Relevant") is True
+    assert parse_relevance("不确定") is None
+    assert parse_compliance("compliant") == []
+    assert parse_compliance("violation: 包含暴力内容; 事实错误") == ["包含暴力内容", "事实错误"]
+    assert parse_compliance("无法判断") is None
+
+
+def test_classification_purposes_use_small_model():
+    llm = _llm("relevant", "unused")
+    assert llm.tier_for("relevance") == SMALL
+    assert llm.tier_for("generate") == LARGE
+    assert asyncio.run(llm.acomplete("q", purpose="relevance")) == "relevant"
+    assert asyncio.run(llm.acomplete("q", purpose="generate")) == "unused"
+    assert len(llm._adapters[SMALL].prompts) == 1 and len(llm._adapter.prompts) == 1
+
+
+def test_small_model_disabled_routes_everything_to_large():
+    llm = SiliconCloudLLM(Settings(siliconcloud_api_key="", siliconcloud_small_model=""))
+    llm._adapter = FakeAdapter(LARGE, "ok")
+    llm._adapters = {LARGE: llm._adapter}
+    assert llm.tier_for("router") == LARGE
+    assert asyncio.run(llm.acomplete("q", purpose="router")) == "ok"
+
+
+def test_unparseable_small_reply_escalates_once(monkeypatch):
+    llm = _llm("我认为可能有关", "relevant")
+    agent = _pipeline(monkeypatch, llm)
+    value, raw = asyncio.run(agent._classify("q", "relevance", parse_relevance))
+    assert value is True and raw == "relevant"
+    assert len(llm._adapter.prompts) == 1
+    assert agent.cascade_report()["relevance"] == {"small_calls": 1, "escalated": 1, "escalation_rate": 1.0}
+
+
+def test_parseable_small_reply_is_not_escalated(monkeypatch):
+    llm = _llm("direct", "rewrite")
+    agent = _pipeline(monkeypatch, llm)
+    agent.local_router = None
+    update = asyncio.run(agent._router({"query": "帮我查一下冰雪经济"}))
+    assert update["decision"] == "direct"
+    assert llm._adapter.prompts == []
+    assert agent.cascade_report()["router"]["escalated"] == 0
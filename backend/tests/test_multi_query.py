@@ -0,0 +1,76 @@
+import asyncio
+import time
+from app.rag import pipeline
+from app.rag.pipeline import AgentPipeline, parse_query_variants
+
+
+class FakeLLM:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    async def acomplete(self, prompt, purpose=None):
+        self.calls += 1
+        return self.reply
+
+    def is_degraded(self, text):
+        return False
+
+
+class FakeStore:
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+
+    async def aquery_with_stats(self, query, top_k, mode=None):
+        self.queries.append(query)
+        await asyncio.sleep(0.05)
+        return [dict(d) for d in self.results[query]][:top_k], {"mode": "vector"}
+
+
+def _doc(doc_id, source="a.md"):
+    return {"id": doc_id, "text": f"冰雪经济 {doc_id}", "source": source, "score": 0.8, "score_type": "vector"}
+
+
+def _pipeline(monkeypatch, llm, store):
+    monkeypatch.setattr(pipeline, "get_vector_store", lambda: store)
+    agent = AgentPipeline(llm)
+    agent.reranker = None
+    agent.multi_query = True
+    return agent
+
+
+def test_parse_query_variants_strips_numbering_and_duplicates():
+    reply = "1. 冰雪经济 消费\n2、冰雪旅游\n- 冰雪旅游\n\n冰雪经济\n“冰雪产业政策”\n滑雪场"
+    assert parse_query_variants(reply, "冰雪经济", 3) == ["冰雪经济 消费", "冰雪旅游", "冰雪产业政策"]
+
+
+def test_expansion_keeps_query_and_returns_variants(monkeypatch):
+    llm = FakeLLM("冰雪旅游\n冰雪产业政策\n滑雪消费")
+    agent = _pipeline(monkeypatch, llm, FakeStore({}))
+    update = asyncio.run(agent._rewrite_relevance({"query": "冰雪经济", "retrieve_count": 0}))
+    assert llm.calls == 1
+    assert "query" not in update
+    assert update["retrieve_count"] == 1
+    assert update["query_variants"] == ["冰雪旅游", "冰雪产业政策", "滑雪消费"]
+
+
+def test_variants_are_retrieved_concurrently_and_fused(monkeypatch):
+    store = FakeStore({
+        "冰雪经济": [_doc("a"), _doc("b")],
+        "冰雪旅游": [_doc("b"), _doc("c", "b.md")],
+        "冰雪产业政策": [_doc("d", "c.md"), _doc("a")],
+    })
+    agent = _pipeline(monkeypatch, FakeLLM(""), store)
+    state = {"query": "冰雪经济", "retrieve_count": 1, "query_variants": ["冰雪旅游", "冰雪产业政策"]}
+    start = time.perf_counter()
+    context = asyncio.run(agent._retrieve(state))["context"]
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.12
+    assert sorted(store.queries) == sorted(["冰雪经济", "冰雪旅游", "冰雪产业政策"])
+    ids = [d["id"] for d in context]
+    assert len(ids) == len(set(ids))
+    assert ids[:2] == ["a", "b"]
+    report = agent.multi_query_report()
+    assert report["fanouts"] == 1 and report["avg_queries"] == 3.0
+    assert report["dedup_ratio"] > 0
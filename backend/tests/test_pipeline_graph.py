@@ -1,13 +1,12 @@
 
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from app.rag.pipeline import AgentPipeline, AgentState
 
 class TestAgentPipeline(unittest.TestCase):
     @patch('app.rag.pipeline.SiliconCloudLLM')
     @patch('app.rag.pipeline.get_vector_store')
-    @patch('app.rag.pipeline.Settings')
-    def test_graph_structure(self, MockSettings, MockGetVS, MockLLM):
+    def test_graph_structure(self, MockGetVS, MockLLM):
         # Setup mocks
         mock_llm = MockLLM.return_value
         mock_vs = MockGetVS.return_value
@@ -21,8 +20,10 @@ class TestAgentPipeline(unittest.TestCase):
         # Verify graph structure (implicitly by checking it compiles)
         # We can also run a dummy invocation
         
-        mock_vs.query.return_value = [{"text": "doc1", "source": "src1"}]
-        mock_llm.complete.return_value = "Generated answer"
+        mock_vs.aquery_with_stats = AsyncMock(return_value=([{"text": "doc1 about the test query", "source": "src1"}], {}))
+        replies = {"router": "rewrite", "rewrite": "test query", "relevance": "relevant", "compliance": "compliant"}
+        mock_llm.acomplete = AsyncMock(side_effect=lambda prompt, purpose=None, **kw: replies.get(purpose, "Generated answer"))
+        mock_llm.is_degraded.return_value = False
         
         session_mock = MagicMock()
         session_mock.history = []
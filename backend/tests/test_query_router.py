@@ -0,0 +1,53 @@
+from app.rag.query_router import LocalQueryRouter
+
+
+def test_rules_short_circuit():
+    router = LocalQueryRouter()
+    assert router.classify("你好！")[0] == "direct"
+    assert router.classify("1+1等于几？")[0] == "direct"
+    assert router.classify("冰雪装备的技术参数是什么")[0] == "rewrite"
+    assert router.classify("北京冬奥会之后滑雪场怎么样了")[0] is None
+
+
+def test_model_learns_from_logged_decisions(tmp_path):
+    log = tmp_path / "decisions.jsonl"
+    router = LocalQueryRouter(threshold=0.8, log_path=str(log), min_samples=3)
+    for q in ("冰雪旅游发展现状", "冰雪产业发展趋势", "冰雪经济发展路径", "冰雪运动发展情况"):
+        router.record(q, "rewrite")
+    for q in ("讲个笑话", "讲个故事吧", "讲个冷笑话", "随便聊聊"):
+        router.record(q, "direct")
+    assert router.classify("冰雪场馆发展")[0] == "rewrite"
+    assert router.classify("讲个段子")[0] == "direct"
+
+    reloaded = LocalQueryRouter(threshold=0.8, log_path=str(log), min_samples=3)
+    report = reloaded.evaluate([{"query": "冰雪装备发展", "decision": "rewrite"},
+                                {"query": "讲个谜语", "decision": "direct"}])
+    assert report["samples"] == 2 and report["accuracy"] == 1.0
+    assert router.stats()["llm_calls_avoided"] == 2
+
+
+def test_decision_log_is_capped(tmp_path):
+    log = tmp_path / "decisions.jsonl"
+    router = LocalQueryRouter(log_path=str(log), log_max_lines=10)
+    for i in range(25):
+        router.record(f"问题{i}", "rewrite")
+    lines = log.read_text(encoding="utf-8").splitlines()
+    assert len(lines) <= 10 and "问题24" in lines[-1]
+    assert router.stats()["training_samples"] == 25
+    assert LocalQueryRouter(log_path=str(log), log_max_lines=4).stats()["training_samples"] == len(lines)
+    assert len(log.read_text(encoding="utf-8").splitlines()) == 2
+
+
+def test_async_record_writes_the_log_off_the_event_loop(tmp_path):
+    import asyncio
+    import threading
+
+    log = tmp_path / "decisions.jsonl"
+    router = LocalQueryRouter(log_path=str(log))
+    threads = []
+    append = router._append
+    router._append = lambda *args: (threads.append(threading.current_thread()), append(*args))
+    asyncio.run(router.arecord("冰雪旅游", "rewrite"))
+    assert threads and threading.main_thread() not in threads
+    assert "冰雪旅游" in log.read_text(encoding="utf-8")
+    assert router.stats()["training_samples"] == 1
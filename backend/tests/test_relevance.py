@@ -0,0 +1,31 @@
+from app.rag.relevance import IRRELEVANT, RELEVANT, UNCERTAIN, RelevanceGate, calibrate
+
+
+def _doc(text, score=None, score_type="vector"):
+    return {"text": text, "source": "s", "score": score, "score_type": score_type}
+
+
+def test_score_bands():
+    gate = RelevanceGate()
+    assert gate.decide("冰雪经济政策", [_doc("冰雪经济相关政策解读", 0.82)])[0] == RELEVANT
+    assert gate.decide("冰雪经济政策", [_doc("菜谱：红烧肉做法", 0.2)])[0] == IRRELEVANT
+    assert gate.decide("冰雪经济政策", [_doc("冬季旅游", 0.6), _doc("滑雪", 0.58)])[0] == UNCERTAIN
+    assert gate.decide("冰雪经济政策", [])[0] == IRRELEVANT
+
+
+def test_keyword_results_use_lexical_overlap():
+    gate = RelevanceGate()
+    assert gate.decide("SX-200 造雪机参数", [_doc("SX-200 造雪机参数表", 7.1, "bm25")])[0] == RELEVANT
+    assert gate.decide("SX-200 造雪机参数", [_doc("会议纪要", 1.2, "bm25")])[0] == IRRELEVANT
+
+
+def test_judge_counts_and_calibrate():
+    gate = RelevanceGate()
+    gate.judge("冰雪经济政策", [_doc("冰雪经济相关政策解读", 0.9)])
+    assert gate.stats()["llm_calls_avoided"] == 1
+    samples = [
+        {"query": "冰雪", "docs": [_doc("无关", 0.3)], "relevant": False},
+        {"query": "冰雪", "docs": [_doc("冰雪", 0.7)], "relevant": True},
+    ]
+    best = calibrate(samples)
+    assert best is not None and best["decided_accuracy"] == 1.0
@@ -0,0 +1,37 @@
+from app.rag.reranker import LexicalReranker
+
+
+def _doc(text, source, score):
+    return {"text": text, "source": source, "score": score, "score_type": "vector"}
+
+
+def test_lexical_evidence_promotes_better_candidates():
+    docs = [
+        _doc("冬季旅游市场整体平稳。", "a.md", 0.82),
+        _doc("会议纪要与日程安排。", "b.md", 0.81),
+        _doc("冰雪经济带动滑雪场与冰雪旅游消费增长。", "c.md", 0.80),
+        _doc("冰雪经济政策：支持冰雪装备制造。", "d.md", 0.79),
+    ]
+    reranker = LexicalReranker()
+    ranked = reranker.rerank("冰雪经济如何带动消费", docs, 2)
+    assert [d["source"] for d in ranked] == ["c.md", "d.md"]
+    assert all("rerank_score" in d for d in ranked)
+    assert reranker.stats()["top1_changed"] == 1
+
+
+def test_source_diversity_breaks_near_ties():
+    docs = [
+        _doc("冰雪经济发展报告第一部分。", "report.pdf", 0.9),
+        _doc("冰雪经济发展报告第二部分。", "report.pdf", 0.89),
+        _doc("冰雪经济发展的地方实践。", "local.md", 0.88),
+    ]
+    reranker = LexicalReranker(diversity_penalty=0.5)
+    ranked = reranker.rerank("冰雪经济发展", docs, 2)
+    assert {d["source"] for d in ranked} == {"report.pdf", "local.md"}
+    assert reranker.stats()["promoted"] == 1
+
+
+def test_short_candidate_lists_pass_through():
+    docs = [_doc("冰雪", "a.md", 0.5)]
+    assert LexicalReranker().rerank("", docs, 4) == docs
+    assert LexicalReranker().rerank("冰雪", docs + [_doc("滑雪", "b.md", 0.4)], 0) == []
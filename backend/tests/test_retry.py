@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+from pybreaker import CircuitBreakerError
+from app.utils import retry
+from app.utils.retry import DeadlineExceeded, call_upstream, deadline_scope, remaining
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(retry, "backoff", lambda attempt: 0.001)
+    monkeypatch.setattr(retry, "_latency", {})
+    for breaker in retry.breakers.values():
+        breaker.close()
+
+
+def test_nested_deadlines_only_shrink():
+    assert remaining() is None
+    with deadline_scope(10):
+        with deadline_scope(60):
+            assert remaining() <= 10
+        with deadline_scope(1):
+            assert remaining() <= 1
+    assert remaining() is None
+
+
+def test_retries_transient_failures_with_backoff():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert asyncio.run(call_upstream("chat", flaky, timeout=1, retries=2)) == "ok"
+    assert len(calls) == 3
+
+
+def test_exhausted_budget_fails_fast():
+    async def main():
+        with deadline_scope(0):
+            await call_upstream("chat", lambda: asyncio.sleep(0), timeout=1)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+
+
+def test_hedge_wins_over_slow_primary():
+    tracker = retry._tracker("embeddings")
+    for _ in range(30):
+        tracker.record(0.01)
+    delays = iter([1.0, 0.0])
+    started = []
+
+    async def call():
+        delay = next(delays)
+        started.append(delay)
+        await asyncio.sleep(delay)
+        return delay
+
+    result = asyncio.run(call_upstream("embeddings", call, timeout=2, retries=0))
+    assert result == 0.0
+    assert started == [1.0, 0.0]
+
+
+def test_hedge_delay_is_tracked_per_call_kind():
+    for _ in range(30):
+        retry._tracker("chat", "small:router").record(0.05)
+    assert retry.hedge_delay("chat", "small:router") is not None
+    # 分类调用的延迟不影响生成调用：样本不足时不对冲
+    assert retry.hedge_delay("chat", "large:generate") is None
+
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    assert asyncio.run(call_upstream("chat", generate, timeout=2, retries=0, kind="large:generate")) == "ok"
+    assert len(calls) == 1
+
+
+def test_breakers_are_isolated_per_upstream():
+    async def down():
+        raise ConnectionError("down")
+
+    async def fail_until_open():
+        for _ in range(retry.breakers["weaviate"].fail_max + 1):
+            try:
+                await call_upstream("weaviate", down, timeout=1, retries=0)
+            except CircuitBreakerError:
+                return True
+            except ConnectionError:
+                pass
+        return False
+
+    assert asyncio.run(fail_until_open())
+    assert retry.breakers["weaviate"].current_state == "open"
+    assert retry.breakers["chat"].current_state == "closed"
+    assert asyncio.run(call_upstream("chat", lambda: asyncio.sleep(0, "ok"), timeout=1)) == "ok"
+
+
+def test_cancelled_calls_do_not_trip_the_breaker():
+    async def main():
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        for _ in range(retry.breakers["embeddings"].fail_max + 1):
+            started.clear()
+            task = asyncio.ensure_future(call_upstream("embeddings", slow, timeout=5, hedge=False))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        return await call_upstream("embeddings", lambda: asyncio.sleep(0, "ok"), timeout=1)
+
+    assert asyncio.run(main()) == "ok"
+    assert retry.breakers["embeddings"].current_state == "closed"
+
+
+def test_cancelled_probe_does_not_close_a_half_open_breaker():
+    breaker = retry.breakers["embeddings"]
+
+    async def main():
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        breaker.half_open()
+        task = asyncio.ensure_future(call_upstream("embeddings", slow, timeout=5, hedge=False))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert breaker.current_state == "half-open"
@@ -0,0 +1,34 @@
+import time
+from app.services.session import SUMMARY_ROLE, SessionStore
+
+
+def test_lru_capacity_and_idle_ttl():
+    store = SessionStore(capacity=2, ttl_seconds=0.05, stripes=1)
+    store.get_or_create("a")
+    store.get_or_create("b")
+    store.get_or_create("a")
+    store.get_or_create("c")
+    assert store.get("b") is None and store.get("a") is not None
+    time.sleep(0.06)
+    assert store.sweep() == 2
+    assert store.stats()["sessions"] == 0
+
+
+def test_history_compacts_into_rolling_summary():
+    store = SessionStore(max_history=6, keep_recent=2)
+    session = store.get_or_create("s")
+    for turn in range(4):
+        session.history.append({"role": "user", "content": f"问题{turn}"})
+        session.history.append({"role": "assistant", "content": f"回答{turn}"})
+    session = store.get_or_create("s")
+    assert len(session.history) == 3
+    assert session.history[0]["role"] == SUMMARY_ROLE and "问题0" in session.history[0]["content"]
+    assert session.history[-1]["content"] == "回答3"
+
+    for turn in range(4, 7):
+        session.history.append({"role": "user", "content": f"问题{turn}"})
+        session.history.append({"role": "assistant", "content": f"回答{turn}"})
+    session = store.get_or_create("s")
+    summaries = [m for m in session.history if m["role"] == SUMMARY_ROLE]
+    assert len(summaries) == 1 and "问题0" in summaries[0]["content"] and "问题5" in summaries[0]["content"]
+    assert store.stats()["compactions"] == 2
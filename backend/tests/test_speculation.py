@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+from app.rag import pipeline
+from app.rag.pipeline import AgentPipeline
+
+
+class FakeLLM:
+    small_purposes = set()
+
+    async def acomplete(self, prompt, purpose=None, tier=None):
+        return "direct" if purpose == "router" else "回答"
+
+    def tier_for(self, purpose):
+        return "large"
+
+    def is_degraded(self, text):
+        return False
+
+
+class FakeStore:
+    def __init__(self, vectors, results, fail=()):
+        self.vectors = vectors
+        self.results = results
+        self.fail = set(fail)
+        self.searched = []
+
+    async def aembed_query(self, query):
+        return self.vectors[query]
+
+    async def aquery_with_stats(self, query, top_k, mode=None):
+        self.searched.append(query)
+        if query in self.fail:
+            raise ConnectionError("weaviate down")
+        return [{"text": t, "source": "a.md"} for t in self.results[query]], {"mode": "vector"}
+
+
+def _pipeline(monkeypatch, store):
+    monkeypatch.setattr(pipeline, "get_vector_store", lambda: store)
+    agent = AgentPipeline(FakeLLM())
+    agent.reranker = None
+    return agent
+
+
+async def _retrieve(agent, raw, rewritten):
+    ctx = pipeline._RunContext()
+    token = pipeline._run_ctx.set(ctx)
+    try:
+        ctx.speculative = asyncio.ensure_future(agent._speculate(raw))
+        return (await agent._retrieve({"query": rewritten, "retrieve_count": 0}))["context"]
+    finally:
+        pipeline._run_ctx.reset(token)
+
+
+def test_similar_rewrite_reuses_speculative_results(monkeypatch):
+    store = FakeStore({"冰雪": [1.0, 0.0], "冰雪经济": [0.99, 0.05]}, {"冰雪": ["甲", "乙"]})
+    agent = _pipeline(monkeypatch, store)
+    assert [d["text"] for d in asyncio.run(_retrieve(agent, "冰雪", "冰雪经济"))] == ["甲", "乙"]
+    assert store.searched == ["冰雪"]
+    assert agent.speculation_stats["reused"] == 1
+
+
+def test_different_rewrite_merges_fresh_results_first(monkeypatch):
+    store = FakeStore({"冰雪": [1.0, 0.0], "滑雪装备": [0.0, 1.0]}, {"冰雪": ["甲", "乙"], "滑雪装备": ["丙", "甲"]})
+    agent = _pipeline(monkeypatch, store)
+    assert [d["text"] for d in asyncio.run(_retrieve(agent, "冰雪", "滑雪装备"))] == ["丙", "甲", "乙"]
+    assert agent.speculation_stats["merged"] == 1
+
+
+def test_failed_fresh_search_falls_back_to_speculative_results(monkeypatch):
+    store = FakeStore({"冰雪": [1.0, 0.0], "滑雪装备": [0.0, 1.0]}, {"冰雪": ["甲"]}, fail={"滑雪装备"})
+    agent = _pipeline(monkeypatch, store)
+    assert [d["text"] for d in asyncio.run(_retrieve(agent, "冰雪", "滑雪装备"))] == ["甲"]
+    assert agent.speculation_stats["fallback"] == 1
+
+
+def test_failed_speculation_retrieves_normally(monkeypatch):
+    store = FakeStore({"冰雪": [1.0, 0.0]}, {"滑雪装备": ["丙"]}, fail={"冰雪"})
+    agent = _pipeline(monkeypatch, store)
+    assert [d["text"] for d in asyncio.run(_retrieve(agent, "冰雪", "滑雪装备"))] == ["丙"]
+    assert agent.speculation_stats["failed"] == 1
+
+
+def test_direct_route_discards_speculation(monkeypatch):
+    store = FakeStore({"你好": [1.0, 0.0]}, {"你好": ["甲"]})
+    agent = _pipeline(monkeypatch, store)
+    agent.local_router = None
+    monkeypatch.setattr(pipeline, "get_answer_cache", lambda: None)
+    monkeypatch.setattr(pipeline._settings, "speculative_retrieval_enabled", True)
+    result = asyncio.run(agent.arun("你好", SimpleNamespace(history=[])))
+    assert result["answer"] == "回答"
+    assert agent.speculation_stats["launched"] == 1
+    assert agent.speculation_stats["discarded"] == 1
@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+from app.rag import vector_store
+from app.services.warmup import FAILED, READY, Warmup
+
+
+def test_warmup_reports_each_step_and_gates_readiness():
+    warmup = Warmup()
+
+    async def ok():
+        return None
+
+    async def broken():
+        raise RuntimeError("weaviate down")
+
+    warmup.steps = [("llm", ok), ("vector_store", broken)]
+    warmup.components = {"llm": {"state": "pending"}, "vector_store": {"state": "pending"}}
+    assert not warmup.ready
+    assert not asyncio.run(warmup.attempt())
+    assert warmup.components["llm"]["state"] == READY
+    assert warmup.components["vector_store"] == {"state": FAILED, "error": "weaviate down", "attempts": 1,
+                                                 "ms": warmup.components["vector_store"]["ms"]}
+    assert not warmup.report()["ready"]
+
+
+def test_failed_steps_are_retried_until_ready():
+    warmup = Warmup(retry_base=0.001, retry_max=0.002)
+    calls = {"llm": 0, "vector_store": 0}
+
+    async def ok():
+        calls["llm"] += 1
+
+    async def flaky():
+        calls["vector_store"] += 1
+        if calls["vector_store"] < 3:
+            raise RuntimeError("weaviate starting")
+
+    warmup.steps = [("llm", ok), ("vector_store", flaky)]
+    warmup.components = {"llm": {"state": "pending"}, "vector_store": {"state": "pending"}}
+    asyncio.run(warmup.run())
+    assert warmup.ready
+    assert calls == {"llm": 1, "vector_store": 3}
+    assert warmup.components["vector_store"]["attempts"] == 3
+
+
+def test_unavailable_vector_backend_is_not_cached(monkeypatch):
+    closed = []
+
+    def backend(available):
+        return SimpleNamespace(name="weaviate", available=available, close=lambda: closed.append(available))
+
+    backends = iter([backend(False), backend(False), backend(True)])
+    monkeypatch.setattr(vector_store, "_vs", None)
+    monkeypatch.setattr(vector_store, "_create_backend", lambda settings: next(backends))
+    monkeypatch.setattr(vector_store._settings, "vector_backend_retry_seconds", 0)
+    down = vector_store.get_vector_store()
+    assert not down.backend.available
+    for _ in range(2):
+        # 重新连接在后台线程进行，调用方立即拿到当前实例
+        assert vector_store.get_vector_store() is down
+        vector_store._reconnect_thread.join(5)
+    recovered = vector_store.get_vector_store()
+    assert recovered is not down and recovered.backend.available
+    assert vector_store.get_vector_store() is recovered
+    # 失败的重连尝试与被替换的实例都已关闭
+    assert closed == [False, False]
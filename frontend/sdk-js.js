@@ -11,7 +11,8 @@ export class AgenticRAGClient {
     if (!resp.ok) throw new Error(await resp.text());
     return resp.json();
   }
-  async upload(files) {
+  // 上传后立即返回排队的任务 (job_id)；wait 为 true 时轮询到任务结束并返回最终状态
+  async upload(files, { wait = false, pollInterval = 1000, timeout, onProgress } = {}) {
     const fd = new FormData();
     files.forEach((f) => fd.append("files", f, f.name));
     const resp = await fetch(`${this.baseUrl}/api/upload`, {
@@ -19,6 +20,25 @@ export class AgenticRAGClient {
       body: fd,
     });
     if (!resp.ok) throw new Error(await resp.text());
+    const job = await resp.json();
+    if (!wait) return job;
+    return this.waitForJob(job.job_id, { pollInterval, timeout, onProgress });
+  }
+  async uploadJob(jobId) {
+    const resp = await fetch(`${this.baseUrl}/api/upload/jobs/${encodeURIComponent(jobId)}`);
+    if (!resp.ok) throw new Error(await resp.text());
     return resp.json();
   }
+  async waitForJob(jobId, { pollInterval = 1000, timeout, onProgress } = {}) {
+    const deadline = timeout == null ? null : Date.now() + timeout;
+    while (true) {
+      const job = await this.uploadJob(jobId);
+      if (onProgress) onProgress(job);
+      if (job.status === "done" || job.status === "failed") return job;
+      if (deadline !== null && Date.now() >= deadline) {
+        throw new Error(`ingestion job ${jobId} still ${job.status} after ${timeout}ms`);
+      }
+      await new Promise((resolve) => setTimeout(resolve, pollInterval));
+    }
+  }
 }
@@ -1,3 +1,20 @@
+export interface IngestJob {
+  job_id: string;
+  status: "queued" | "running" | "done" | "failed" | string;
+  progress?: {
+    files: { total: number; parsed: number };
+    chunks: { admitted: number; embedded: number; inserted: number; skipped: number; deleted: number; sources: number };
+  };
+  errors?: Array<Record<string, unknown>>;
+  [key: string]: unknown;
+}
+
+export interface WaitOptions {
+  pollInterval?: number;
+  timeout?: number;
+  onProgress?: (job: IngestJob) => void;
+}
+
 export class AgenticRAGClient {
   baseUrl: string;
   constructor(baseUrl: string) {
@@ -12,7 +29,8 @@ export class AgenticRAGClient {
     if (!resp.ok) throw new Error(await resp.text());
     return resp.json();
   }
-  async upload(files: File[]) {
+  /** Queue files for ingestion; with `wait` poll until the job finishes and return its final status. */
+  async upload(files: File[], { wait = false, ...options }: WaitOptions & { wait?: boolean } = {}): Promise<IngestJob> {
     const fd = new FormData();
     files.forEach((f) => fd.append("files", f, f.name));
     const resp = await fetch(`${this.baseUrl}/api/upload`, {
@@ -20,6 +38,25 @@ export class AgenticRAGClient {
       body: fd,
     });
     if (!resp.ok) throw new Error(await resp.text());
+    const job: IngestJob = await resp.json();
+    if (!wait) return job;
+    return this.waitForJob(job.job_id, options);
+  }
+  async uploadJob(jobId: string): Promise<IngestJob> {
+    const resp = await fetch(`${this.baseUrl}/api/upload/jobs/${encodeURIComponent(jobId)}`);
+    if (!resp.ok) throw new Error(await resp.text());
     return resp.json();
   }
+  async waitForJob(jobId: string, { pollInterval = 1000, timeout, onProgress }: WaitOptions = {}): Promise<IngestJob> {
+    const deadline = timeout == null ? null : Date.now() + timeout;
+    while (true) {
+      const job = await this.uploadJob(jobId);
+      if (onProgress) onProgress(job);
+      if (job.status === "done" || job.status === "failed") return job;
+      if (deadline !== null && Date.now() >= deadline) {
+        throw new Error(`ingestion job ${jobId} still ${job.status} after ${timeout}ms`);
+      }
+      await new Promise((resolve) => setTimeout(resolve, pollInterval));
+    }
+  }
 }
@@ -1,6 +1,8 @@
+import json
 import os
+import time
 import requests
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
 
 class AgenticRAGClient:
@@ -13,13 +15,61 @@ class AgenticRAGClient:
         resp.raise_for_status()
         return resp.json()
 
-    def upload(self, file_paths: List[str]) -> dict:
+    def chat_stream(self, session_id: str, query: str) -> Iterator[Tuple[str, dict]]:
+        """Yield ``(event, data)`` pairs from the SSE chat stream."""
+        url = f"{self.base_url}/api/chat"
+        payload = {"session_id": session_id, "query": query, "stream": True}
+        with requests.post(url, json=payload, stream=True) as resp:
+            resp.raise_for_status()
+            event = "message"
+            for line in resp.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    yield event, json.loads(line[len("data: "):])
+                    event = "message"
+
+    def upload(self, file_paths: List[str], wait: bool = False, poll_interval: float = 1.0,
+               timeout: Optional[float] = None) -> dict:
+        """Queue files for ingestion.
+
+        Returns the queued job (``job_id``) immediately, or with ``wait=True``
+        polls until the job finishes and returns its final status.
+        """
         url = f"{self.base_url}/api/upload"
         files = [("files", (os.path.basename(p), open(p, "rb"))) for p in file_paths]
         try:
             resp = requests.post(url, files=files)
             resp.raise_for_status()
-            return resp.json()
+            job = resp.json()
         finally:
             for _, (_, f) in files:
                 f.close()
+        if not wait:
+            return job
+        return self.wait_for_job(job["job_id"], poll_interval=poll_interval, timeout=timeout)
+
+    def upload_job(self, job_id: str) -> dict:
+        resp = requests.get(f"{self.base_url}/api/upload/jobs/{job_id}")
+        resp.raise_for_status()
+        return resp.json()
+
+    def wait_for_job(self, job_id: str, poll_interval: float = 1.0, timeout: Optional[float] = None) -> dict:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.upload_job(job_id)
+            if job["status"] in ("done", "failed"):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"ingestion job {job_id} still {job['status']} after {timeout}s")
+            time.sleep(poll_interval)
+
+    def list_documents(self) -> List[dict]:
+        resp = requests.get(f"{self.base_url}/api/documents")
+        resp.raise_for_status()
+        return resp.json()["documents"]
+
+    def delete_document(self, source: str) -> dict:
+        resp = requests.delete(f"{self.base_url}/api/documents", params={"source": source})
+        resp.raise_for_status()
+        return resp.json()